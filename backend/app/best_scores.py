@@ -0,0 +1,125 @@
+"""Maintenance of the ``user_best_scores`` table.
+
+``record_best_scores`` runs in the same transaction as every leaderboard
+insert and upserts each player's best per mode, so ``GET /leaderboard
+?distinct_players=true`` is a plain indexed top-N. ``backfill_best_scores``
+rebuilds the table from existing entries (``python -m app.cli
+backfill-best-scores``).
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .database import LeaderboardEntry, UserBestScore
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+_COPIED = ("username", "score", "entry_id", "date")
+
+
+def _upsert(db: Session, source=None):
+    """``INSERT ... ON CONFLICT`` keeping whichever score is higher, for
+    executemany values or rows selected by ``source``"""
+    stmt = _UPSERT_INSERTS[db.get_bind().dialect.name](UserBestScore)
+    if source is not None:
+        stmt = stmt.from_select(["user_id", "mode", *_COPIED], source)
+    return stmt.on_conflict_do_update(
+        index_elements=[UserBestScore.user_id, UserBestScore.mode],
+        set_={name: stmt.excluded[name] for name in _COPIED},
+        where=stmt.excluded.score > UserBestScore.score,
+    )
+
+
+def record_best_scores(db: Session, entries: Iterable[dict]) -> None:
+    """Raise stored bests for new entries (``LeaderboardEntry`` column dicts
+    including ``id`` and ``date``), without committing"""
+    best: dict[tuple[str, str], dict] = {}
+    for entry in entries:
+        key = (entry["user_id"], entry["mode"])
+        # Earliest entry wins ties, within the batch as against the table
+        if key not in best or entry["score"] > best[key]["score"]:
+            best[key] = entry
+    if not best:
+        return
+    values = [
+        {
+            "user_id": entry["user_id"],
+            "mode": entry["mode"],
+            "username": entry["username"],
+            "score": entry["score"],
+            "entry_id": entry["id"],
+            "date": entry["date"],
+        }
+        for entry in best.values()
+    ]
+
+    if db.get_bind().dialect.name in _UPSERT_INSERTS:
+        db.execute(_upsert(db), values)
+        return
+
+    # No upsert: read the current bests and insert or update row by row
+    current = {
+        (user_id, mode): score
+        for user_id, mode, score in db.execute(
+            select(UserBestScore.user_id, UserBestScore.mode, UserBestScore.score)
+            .where(tuple_(UserBestScore.user_id, UserBestScore.mode).in_(list(best)))
+        )
+    }
+    for row in values:
+        key = (row["user_id"], row["mode"])
+        if key not in current:
+            db.add(UserBestScore(**row))
+        elif row["score"] > current[key]:
+            db.query(UserBestScore).filter(
+                UserBestScore.user_id == row["user_id"],
+                UserBestScore.mode == row["mode"],
+                UserBestScore.score < row["score"],
+            ).update({name: row[name] for name in _COPIED}, synchronize_session=False)
+
+
+def backfill_best_scores(db: Session, mode: Optional[str] = None) -> int:
+    """Upsert every player's best entry (per mode, or for ``mode``) from
+    ``leaderboard_entries`` and commit; returns the rows written.
+
+    Existing rows are only ever raised, so this is safe to run while
+    scores are being submitted.
+    """
+    position = func.row_number().over(
+        partition_by=(LeaderboardEntry.user_id, LeaderboardEntry.mode),
+        order_by=(LeaderboardEntry.score.desc(), LeaderboardEntry.date.asc()),
+    ).label("position")
+    ranked = select(
+        LeaderboardEntry.user_id,
+        LeaderboardEntry.mode,
+        LeaderboardEntry.username,
+        LeaderboardEntry.score,
+        LeaderboardEntry.id.label("entry_id"),
+        LeaderboardEntry.date,
+        position,
+    )
+    if mode is not None:
+        ranked = ranked.where(LeaderboardEntry.mode == mode)
+    ranked = ranked.subquery()
+    best = select(
+        ranked.c.user_id, ranked.c.mode, *(ranked.c[name] for name in _COPIED)
+    ).where(ranked.c.position == 1)
+
+    if db.get_bind().dialect.name in _UPSERT_INSERTS:
+        written = db.execute(_upsert(db, best)).rowcount
+    else:
+        written = 0
+        for row in db.execute(best).mappings():
+            existing = db.get(UserBestScore, (row["user_id"], row["mode"]))
+            if existing is None:
+                db.add(UserBestScore(**row))
+            elif row["score"] > existing.score:
+                for name in _COPIED:
+                    setattr(existing, name, row[name])
+            else:
+                continue
+            written += 1
+    db.commit()
+    return written
@@ -0,0 +1,211 @@
+"""Bulk loading of users and leaderboard entries from CSV or NDJSON.
+
+Input uses the column names of ``GET /users/export`` and
+``GET /leaderboard/export`` (so exports load back as they are), plus
+``password_hash`` for users. Rows are parsed and written a chunk at a time:
+``COPY ... FROM STDIN`` on PostgreSQL (psycopg2), a chunked executemany
+elsewhere. Afterwards ``users.high_score`` and ``user_best_scores`` are
+rebuilt with set-based statements rather than per row.
+"""
+import csv
+import io
+import json
+import secrets
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional, TextIO
+
+from sqlalchemy import Connection, Engine, Table, case, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .best_scores import backfill_best_scores
+from .database import LeaderboardEntry, User
+
+FORMATS = ("csv", "ndjson")
+DEFAULT_CHUNK_ROWS = 10000
+# Users whose high score one UPDATE rebuilds (bound parameters per statement)
+HIGH_SCORE_CHUNK_USERS = 1000
+
+
+class BulkImportError(ValueError):
+    """The input is malformed (reported with its line number)"""
+
+
+class _Column(NamedTuple):
+    parse: Callable[[object], object]
+    # Called for missing values; None means the column is required
+    default: Optional[Callable[[], object]]
+
+
+def _datetime(value) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def _now() -> datetime:
+    return datetime.now()
+
+
+def _uuid() -> str:
+    return str(uuid.uuid4())
+
+
+# Accounts imported without a password get one nobody knows (passwords are
+# compared as stored), so they can't be logged into until it is reset
+def _locked_password() -> str:
+    return "!" + secrets.token_urlsafe(24)
+
+
+TABLES: dict[str, tuple[Table, dict[str, _Column]]] = {
+    "users": (User.__table__, {
+        "id": _Column(str, _uuid),
+        "username": _Column(str, None),
+        "email": _Column(str, None),
+        "password_hash": _Column(str, _locked_password),
+        "high_score": _Column(int, lambda: 0),
+        "created_at": _Column(_datetime, _now),
+    }),
+    "leaderboard": (LeaderboardEntry.__table__, {
+        "id": _Column(str, _uuid),
+        "user_id": _Column(str, None),
+        "username": _Column(str, None),
+        "score": _Column(int, None),
+        "mode": _Column(str, None),
+        "date": _Column(_datetime, _now),
+        "created_at": _Column(_datetime, _now),
+    }),
+}
+
+
+class ImportResult(NamedTuple):
+    rows: int
+    seconds: float
+    method: str
+    # Users with imported leaderboard entries
+    user_ids: frozenset[str] = frozenset()
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+
+def read_records(stream: TextIO, fmt: str) -> Iterator[tuple[int, dict]]:
+    """``(line number, record)`` pairs from CSV (with a header) or NDJSON"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == "ndjson":
+        for line_number, line in enumerate(stream, 1):
+            if line.strip():
+                try:
+                    yield line_number, json.loads(line)
+                except ValueError as exc:
+                    raise BulkImportError(f"line {line_number}: {exc}")
+    else:
+        raise ValueError(f"Unknown format: {fmt!r}")
+
+
+def _rows(records: Iterable[tuple[int, dict]], columns: dict[str, _Column]) -> Iterator[dict]:
+    for line_number, record in records:
+        row = {}
+        for name, column in columns.items():
+            value = record.get(name)
+            if value is None or value == "":
+                if column.default is None:
+                    raise BulkImportError(f"line {line_number}: missing {name}")
+                row[name] = column.default()
+                continue
+            try:
+                row[name] = column.parse(value)
+            except (TypeError, ValueError):
+                raise BulkImportError(f"line {line_number}: invalid {name}: {value!r}")
+        yield row
+
+
+def _chunks(rows: Iterator[dict], size: int) -> Iterator[list[dict]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _can_copy(conn: Connection) -> bool:
+    # COPY FROM STDIN through psycopg2's copy_expert
+    return conn.dialect.name == "postgresql" and conn.dialect.driver == "psycopg2"
+
+
+def _copy(conn: Connection, table: Table, names: list[str], chunk: list[dict]) -> None:
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows([row[name] for name in names] for row in chunk)
+    buffer.seek(0)
+    with conn.connection.driver_connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table.name} ({', '.join(names)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+
+
+def import_rows(
+    engine: Engine,
+    table_name: str,
+    records: Iterable[tuple[int, dict]],
+    chunk_rows: int = DEFAULT_CHUNK_ROWS,
+    copy: Optional[bool] = None,
+) -> ImportResult:
+    """Insert ``records`` into ``table_name`` (``users`` or ``leaderboard``)
+    in one transaction; COPY is used when available unless ``copy=False``"""
+    table, columns = TABLES[table_name]
+    names = list(columns)
+    start = time.perf_counter()
+    total = 0
+    user_ids: set[str] = set()
+    with engine.begin() as conn:
+        use_copy = _can_copy(conn) if copy is None else copy
+        statement = insert(table)
+        for chunk in _chunks(_rows(records, columns), chunk_rows):
+            if use_copy:
+                _copy(conn, table, names, chunk)
+            else:
+                conn.execute(statement, chunk)
+            total += len(chunk)
+            if "user_id" in columns:
+                user_ids.update(row["user_id"] for row in chunk)
+    return ImportResult(
+        total, time.perf_counter() - start, "copy" if use_copy else "executemany", frozenset(user_ids),
+    )
+
+
+def rebuild_high_scores(engine: Engine, user_ids: Optional[Iterable[str]] = None) -> int:
+    """Raise the high scores of ``user_ids`` (every user with entries if
+    None) to their best entry, a chunk of users per UPDATE.
+
+    Users without entries, and high scores already above the best entry
+    (imported with the user, say), are left alone.
+    """
+    best = select(func.max(LeaderboardEntry.score)).where(
+        LeaderboardEntry.user_id == User.id
+    ).scalar_subquery()
+    # GREATEST, which SQLite lacks
+    higher = case((best > func.coalesce(User.high_score, 0), best), else_=User.high_score)
+    statement = update(User).values(high_score=higher)
+    with engine.begin() as conn:
+        if user_ids is None:
+            has_entries = select(LeaderboardEntry.id).where(LeaderboardEntry.user_id == User.id).exists()
+            return conn.execute(statement.where(has_entries)).rowcount
+        ids = sorted(user_ids)
+        return sum(
+            conn.execute(statement.where(User.id.in_(ids[i:i + HIGH_SCORE_CHUNK_USERS]))).rowcount
+            for i in range(0, len(ids), HIGH_SCORE_CHUNK_USERS)
+        )
+
+
+def rebuild_best_scores(engine: Engine) -> int:
+    db = Session(bind=engine)
+    try:
+        return backfill_best_scores(db)
+    finally:
+        db.close()
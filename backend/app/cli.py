@@ -0,0 +1,115 @@
+"""Maintenance commands: ``python -m app.cli <command> --help``"""
+import argparse
+import sys
+import time
+from typing import Optional, Sequence
+
+from . import database
+from .best_scores import backfill_best_scores
+from .bulk_import import (
+    DEFAULT_CHUNK_ROWS,
+    FORMATS,
+    TABLES,
+    BulkImportError,
+    import_rows,
+    read_records,
+    rebuild_best_scores,
+    rebuild_high_scores,
+)
+from .leaderboard_cache import TTL_SECONDS, LeaderboardCache
+from .shared_state import SHARED_STATE_URL, create_state
+
+
+def _backfill_best_scores(args: argparse.Namespace) -> None:
+    db = database.SessionLocal()
+    try:
+        written = backfill_best_scores(db, args.mode)
+    finally:
+        db.close()
+    print(f"user_best_scores: {written} rows written")
+
+
+def _import(args: argparse.Namespace) -> None:
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    stream = sys.stdin if args.path == "-" else open(args.path, newline="", encoding="utf-8")
+    try:
+        result = import_rows(
+            database.engine,
+            args.table,
+            read_records(stream, fmt),
+            chunk_rows=args.chunk_rows,
+            copy=False if args.no_copy else None,
+        )
+    except BulkImportError as exc:
+        sys.exit(f"{args.path}: {exc} (nothing was imported)")
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+    print(
+        f"{args.table}: {result.rows} rows in {result.seconds:.1f}s "
+        f"({result.rows_per_second:,.0f} rows/s, {result.method})"
+    )
+
+    if args.table == "leaderboard" and not args.no_rebuild:
+        start = time.perf_counter()
+        users = rebuild_high_scores(database.engine, result.user_ids)
+        bests = rebuild_best_scores(database.engine)
+        print(
+            f"rebuilt high scores of {users} users and {bests} best scores "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        _invalidate_leaderboards()
+
+
+def _invalidate_leaderboards() -> None:
+    """Make the running servers drop their cached boards"""
+    state = create_state(SHARED_STATE_URL)
+    if not state.shared:
+        print(
+            f"no SHARED_STATE_URL: servers serve cached leaderboards for up to "
+            f"{TTL_SECONDS:g}s longer"
+        )
+        return
+    cache = LeaderboardCache()
+    cache.attach(state)
+    try:
+        cache.invalidate_all()
+        state.flush()
+    finally:
+        cache.detach()
+        state.close()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description=__doc__)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    backfill = commands.add_parser(
+        "backfill-best-scores",
+        help="populate user_best_scores from leaderboard_entries",
+    )
+    backfill.add_argument("--mode", help="only this mode (default: all)")
+    backfill.set_defaults(handler=_backfill_best_scores)
+
+    load = commands.add_parser(
+        "import",
+        help="bulk load users or leaderboard entries from CSV or NDJSON",
+    )
+    load.add_argument("table", choices=list(TABLES))
+    load.add_argument("path", help="input file, or - for stdin")
+    load.add_argument("--format", choices=FORMATS, help="default: from the file extension (.csv, else ndjson)")
+    load.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="rows parsed and written per batch")
+    load.add_argument("--no-copy", action="store_true", help="use executemany even on PostgreSQL")
+    load.add_argument(
+        "--no-rebuild", action="store_true",
+        help="skip rebuilding users.high_score and user_best_scores after a leaderboard import",
+    )
+    load.set_defaults(handler=_import)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Authoritative server-side snake engine.
+
+Mirrors the rules in ``frontend/src/lib/game-logic.ts`` (movement, walls vs
+passthrough, self-collision excluding the tail, food, score and speed) on
+compact array-backed state so the server can validate and spectate games.
+``batch.BatchGames`` steps many games at once on NumPy arrays (``numpy``
+extra; not imported here).
+"""
+from .food import PLACEMENTS, FreeCells, place_food
+from .game import Game
+from .replay import Mulberry32, ReplayError, ReplayResult, simulate_replay
+from .rules import (
+    DIRECTIONS,
+    DOWN,
+    INITIAL_SNAKE_LENGTH,
+    INITIAL_SPEED,
+    LEFT,
+    MIN_SPEED,
+    MODES,
+    RIGHT,
+    SCORE_PER_FOOD,
+    SPEED_INCREMENT,
+    UP,
+    opposite,
+    parse_direction,
+)
+from .scheduler import TickScheduler
+
+__all__ = [
+    "DIRECTIONS",
+    "DOWN",
+    "FreeCells",
+    "Game",
+    "INITIAL_SNAKE_LENGTH",
+    "INITIAL_SPEED",
+    "LEFT",
+    "MIN_SPEED",
+    "MODES",
+    "Mulberry32",
+    "PLACEMENTS",
+    "ReplayError",
+    "ReplayResult",
+    "RIGHT",
+    "SCORE_PER_FOOD",
+    "SPEED_INCREMENT",
+    "TickScheduler",
+    "UP",
+    "opposite",
+    "parse_direction",
+    "place_food",
+    "simulate_replay",
+]
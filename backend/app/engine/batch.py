@@ -0,0 +1,236 @@
+"""Vectorized stepping of many games at once (needs the ``numpy`` extra).
+
+``BatchGames`` holds N games of one grid size as NumPy arrays: ring-buffer
+bodies ``(N, capacity)``, head indices, lengths, direction codes, occupancy
+counts ``(N, grid_size, grid_size)``, food cells, scores and speeds. ``step``
+advances every live game with a fixed number of array operations, with the
+same rules as ``Game`` (and so ``moveSnake``) in both modes.
+
+Food is placed exactly like ``generateFood``: each game has its own
+``mulberry32`` stream (the replay RNG), advanced in lockstep for every game
+still looking, so a seeded game eats, grows and places food exactly like
+``Game(random=Mulberry32(seed), placement="client")``. Games that ended
+stay in the batch, frozen, until ``restart``.
+"""
+from typing import Optional, Sequence, Union
+
+import numpy as np
+
+from .rules import (
+    DIRECTIONS,
+    DX,
+    DY,
+    INITIAL_SNAKE_LENGTH,
+    INITIAL_SPEED,
+    MIN_SPEED,
+    MODES,
+    RIGHT,
+    SCORE_PER_FOOD,
+    SPEED_INCREMENT,
+)
+
+_DX = np.array(DX, dtype=np.int32)
+_DY = np.array(DY, dtype=np.int32)
+
+
+def _mulberry32(state: np.ndarray) -> np.ndarray:
+    """Advance ``state`` (uint32, in place) and return the floats in [0, 1)
+    ``Mulberry32`` would return for each entry"""
+    state += np.uint32(0x6D2B79F5)
+    a = state
+    t = (a ^ (a >> np.uint32(15))) * (a | np.uint32(1))
+    t = (t + (t ^ (t >> np.uint32(7))) * (t | np.uint32(61))) ^ t
+    return (t ^ (t >> np.uint32(14))).astype(np.float64) / 4294967296.0
+
+
+class BatchGames:
+    """N games of snake on ``grid_size`` boards, advanced together"""
+
+    def __init__(
+        self,
+        count: int,
+        grid_size: int = 20,
+        mode: Union[str, Sequence[str]] = "passthrough",
+        seeds: Optional[Sequence[int]] = None,
+    ):
+        from .game import MAX_GRID_SIZE, MIN_GRID_SIZE
+
+        if not MIN_GRID_SIZE <= grid_size <= MAX_GRID_SIZE:
+            raise ValueError(f"Grid size must be between {MIN_GRID_SIZE} and {MAX_GRID_SIZE}")
+        modes = [mode] * count if isinstance(mode, str) else list(mode)
+        if len(modes) != count:
+            raise ValueError("Need one mode per game")
+        for name in modes:
+            if name not in MODES:
+                raise ValueError(f"Unknown mode: {name!r}")
+
+        self.count = count
+        self.grid_size = grid_size
+        n = grid_size
+        # A snake outgrows the board only when food lands under its tail
+        # on a full board; _grow handles that
+        self.capacity = n * n + 1
+        self.wrap = np.array([name == "passthrough" for name in modes], dtype=bool)
+        self.occupancy = np.zeros((count, n, n), dtype=np.uint8)
+        self.body = np.zeros((count, self.capacity), dtype=np.int32)
+        self.head = np.zeros(count, dtype=np.int64)
+        self.length = np.zeros(count, dtype=np.int64)
+        self.direction = np.zeros(count, dtype=np.int8)
+        self.next_direction = np.zeros(count, dtype=np.int8)
+        self.food = np.zeros(count, dtype=np.int64)
+        self.score = np.zeros(count, dtype=np.int64)
+        self.speed = np.zeros(count, dtype=np.int64)
+        self.ticks = np.zeros(count, dtype=np.int64)
+        self.game_over = np.zeros(count, dtype=bool)
+        self.rng_state = np.zeros(count, dtype=np.uint32)
+        self._rows = np.arange(count)
+        self.restart(self._rows, seeds)
+
+    @property
+    def _cells(self) -> np.ndarray:
+        """Occupancy as ``(N, grid_size ** 2)`` counts (a view)"""
+        return self.occupancy.reshape(self.count, -1)
+
+    def restart(self, games: np.ndarray, seeds: Optional[Sequence[int]] = None) -> None:
+        """Start ``games`` (indices) over, from ``seeds`` or random ones"""
+        games = np.asarray(games, dtype=np.int64)
+        if seeds is None:
+            seeds = np.random.default_rng().integers(0, 2**32, size=len(games), dtype=np.uint64)
+        if len(seeds) != len(games):
+            raise ValueError("Need one seed per game")
+        n = self.grid_size
+        self.rng_state[games] = np.asarray(seeds, dtype=np.uint64).astype(np.uint32)
+        self._cells[games] = 0
+        # Same starting snake as Game: centre row heading right, tail first in the ring
+        center = n // 2
+        start = center * n + center - np.arange(INITIAL_SNAKE_LENGTH - 1, -1, -1)
+        self.body[games, :INITIAL_SNAKE_LENGTH] = start
+        self._cells[games[:, None], start[None, :]] = 1
+        self.head[games] = INITIAL_SNAKE_LENGTH - 1
+        self.length[games] = INITIAL_SNAKE_LENGTH
+        self.direction[games] = RIGHT
+        self.next_direction[games] = RIGHT
+        self.score[games] = 0
+        self.speed[games] = INITIAL_SPEED
+        self.ticks[games] = 0
+        self.game_over[games] = False
+        self._place_food(games)
+
+    def _place_food(self, games: np.ndarray) -> None:
+        """``place_food`` for each of ``games``, sampling all of them together"""
+        n = self.grid_size
+        cells = self._cells
+        max_attempts = n * n
+        attempts = 0
+        pending = games
+        while pending.size:
+            state = self.rng_state[pending]
+            x = (_mulberry32(state) * n).astype(np.int64)
+            y = (_mulberry32(state) * n).astype(np.int64)
+            self.rng_state[pending] = state
+            cell = y * n + x
+            attempts += 1
+            done = cells[pending, cell] == 0
+            if attempts >= max_attempts:
+                done[:] = True
+            self.food[pending[done]] = cell[done]
+            pending = pending[~done]
+
+    def set_directions(self, games: np.ndarray, directions: np.ndarray) -> np.ndarray:
+        """Queue turns for the next step (``setDirection``); returns which
+        were accepted (reversals and ended games are ignored)"""
+        games = np.asarray(games, dtype=np.int64)
+        directions = np.asarray(directions, dtype=np.int8)
+        accepted = ~self.game_over[games] & (directions != (self.direction[games] ^ 2))
+        self.next_direction[games[accepted]] = directions[accepted]
+        return accepted
+
+    def step(self) -> np.ndarray:
+        """Advance every live game one move (``moveSnake``); returns which moved"""
+        n = self.grid_size
+        cells = self._cells
+        live = np.flatnonzero(~self.game_over)
+        direction = self.next_direction[live]
+        self.direction[live] = direction
+
+        head_cell = self.body[live, self.head[live]]
+        x = head_cell % n + _DX[direction]
+        y = head_cell // n + _DY[direction]
+        wrap = self.wrap[live]
+        x = np.where(wrap, x % n, x)
+        y = np.where(wrap, y % n, y)
+        outside = (x < 0) | (x >= n) | (y < 0) | (y >= n)
+        cell = np.where(outside, 0, y * n + x)
+
+        tail_slot = (self.head[live] - self.length[live] + 1) % self.capacity
+        tail = self.body[live, tail_slot]
+        # The tail moves out of the way this move, so running into it is fine
+        hit = cells[live, cell] > (cell == tail)
+        dies = outside | hit
+        self.game_over[live[dies]] = True
+
+        moving = ~dies
+        games, cell, tail, tail_slot = live[moving], cell[moving], tail[moving], tail_slot[moving]
+        self.ticks[games] += 1
+        eats = cell == self.food[games]
+
+        # Everyone else's tail moves on before the head moves in
+        trims = games[~eats]
+        cells[trims, tail[~eats]] -= 1
+        self.length[trims] -= 1
+
+        if eats.any() and (self.length[games[eats]] >= self.capacity).any():
+            self._grow()
+        head = (self.head[games] + 1) % self.capacity
+        self.head[games] = head
+        self.body[games, head] = cell
+        cells[games, cell] += 1
+        self.length[games] += 1
+
+        eaters = games[eats]
+        if eaters.size:
+            self.score[eaters] += SCORE_PER_FOOD
+            self.speed[eaters] = np.maximum(MIN_SPEED, self.speed[eaters] - SPEED_INCREMENT)
+            self._place_food(eaters)
+
+        moved = np.zeros(self.count, dtype=bool)
+        moved[games] = True
+        return moved
+
+    def _grow(self) -> None:
+        """Unwrap every ring into a larger buffer (only reachable on a full board)"""
+        capacity = self.capacity * 2
+        offsets = np.arange(self.capacity)
+        # Oldest segment first, so heads end up at length - 1
+        slots = (self.head[:, None] - self.length[:, None] + 1 + offsets[None, :]) % self.capacity
+        body = np.zeros((self.count, capacity), dtype=np.int32)
+        body[:, :self.capacity] = np.take_along_axis(self.body, slots, axis=1)
+        self.body = body
+        self.head = self.length - 1
+        self.capacity = capacity
+
+    def cells(self, game: int) -> list[int]:
+        """Body cells of ``game``, head first"""
+        slots = (self.head[game] - np.arange(self.length[game])) % self.capacity
+        return self.body[game, slots].tolist()
+
+    def snake(self, game: int) -> list[tuple[int, int]]:
+        """Body of ``game`` as ``(x, y)`` pairs, head first"""
+        n = self.grid_size
+        return [(cell % n, cell // n) for cell in self.cells(game)]
+
+    def food_position(self, game: int) -> tuple[int, int]:
+        food = int(self.food[game])
+        return food % self.grid_size, food // self.grid_size
+
+    def to_dict(self, game: int) -> dict:
+        """State of ``game`` in the watch-mode player shape, like ``Game.to_dict``"""
+        food_x, food_y = self.food_position(game)
+        return {
+            "current_score": int(self.score[game]),
+            "mode": "passthrough" if self.wrap[game] else "walls",
+            "snake": [{"x": x, "y": y} for x, y in self.snake(game)],
+            "food": {"x": food_x, "y": food_y},
+            "direction": DIRECTIONS[self.direction[game]],
+            "is_playing": not self.game_over[game],
+        }
@@ -0,0 +1,86 @@
+"""Food placement"""
+from array import array
+from typing import Callable
+
+# Source of floats in [0, 1), like ``Math.random``
+RandomSource = Callable[[], float]
+
+# "free" samples the free-cell index; "client" rejection-samples like
+# ``generateFood``, which replays and client parity need
+PLACEMENTS = ("free", "client")
+
+
+def place_food(occupied: bytearray, grid_size: int, random: RandomSource) -> int:
+    """Pick a free cell the way ``generateFood`` does.
+
+    Rejection-samples ``x`` then ``y`` from ``random`` and gives up after
+    ``grid_size ** 2`` attempts, returning the last sample even if it is on
+    the snake. Consuming the random stream identically is what keeps seeded
+    games in step with the client.
+    """
+    attempts = 0
+    max_attempts = grid_size * grid_size
+    while True:
+        x = int(random() * grid_size)
+        y = int(random() * grid_size)
+        cell = y * grid_size + x
+        attempts += 1
+        if not occupied[cell] or attempts >= max_attempts:
+            return cell
+
+
+class FreeCells:
+    """The unoccupied cells of a board, for uniform sampling in O(1).
+
+    The first ``len(self)`` entries of ``_cells`` are the free cells in no
+    particular order and ``_slots`` maps each cell to its entry (-1 when
+    occupied). Removing a cell moves the last free cell into its entry, so
+    both updates are O(1) however full the board is, and the order (hence
+    what a seeded ``sample`` returns) depends only on the moves made.
+    """
+
+    __slots__ = ("_cells", "_slots", "_count")
+
+    # Every cell free, per board size; new boards copy it rather than fill one
+    _all_free: dict[int, array] = {}
+
+    def __init__(self, cell_count: int):
+        all_free = self._all_free.get(cell_count)
+        if all_free is None:
+            all_free = self._all_free[cell_count] = array("i", range(cell_count))
+        self._cells = all_free[:]
+        self._slots = all_free[:]
+        self._count = cell_count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, cell: int) -> bool:
+        return self._slots[cell] >= 0
+
+    def remove(self, cell: int) -> None:
+        """Mark ``cell`` occupied (it must be free)"""
+        slot = self._slots[cell]
+        self._count -= 1
+        last = self._cells[self._count]
+        self._cells[slot] = last
+        self._slots[last] = slot
+        self._slots[cell] = -1
+
+    def add(self, cell: int) -> None:
+        """Mark ``cell`` free (it must be occupied)"""
+        self._cells[self._count] = cell
+        self._slots[cell] = self._count
+        self._count += 1
+
+    def replace(self, cell: int, freed: int) -> None:
+        """Mark ``cell`` occupied and ``freed`` free in one step, ``freed``
+        taking ``cell``'s entry (a move that doesn't eat)"""
+        slot = self._slots[cell]
+        self._cells[slot] = freed
+        self._slots[freed] = slot
+        self._slots[cell] = -1
+
+    def sample(self, random: RandomSource) -> int:
+        """A uniformly chosen free cell, using one draw from ``random``"""
+        return self._cells[int(random() * self._count)]
@@ -0,0 +1,196 @@
+"""Single-game simulation on compact state"""
+import random as _random
+from array import array
+from typing import Optional
+
+from .food import PLACEMENTS, FreeCells, RandomSource, place_food
+from .rules import (
+    DIRECTIONS,
+    DX,
+    DY,
+    INITIAL_SNAKE_LENGTH,
+    INITIAL_SPEED,
+    MIN_SPEED,
+    MODES,
+    RIGHT,
+    SCORE_PER_FOOD,
+    SPEED_INCREMENT,
+)
+
+# Largest grid whose coordinates still fit the packed snake encoding
+MAX_GRID_SIZE = 256
+MIN_GRID_SIZE = INITIAL_SNAKE_LENGTH + 1
+
+
+class Game:
+    """One game of snake, equivalent to a ``GameState`` driven by ``moveSnake``.
+
+    Cells are ``y * grid_size + x``. The body is a ring buffer of cells
+    (head at ``_head``, tail ``length - 1`` slots behind it) and
+    ``occupied`` counts the segments on each cell, so a tick is O(1)
+    regardless of the snake's length. (Counts rather than flags because a
+    full board lets food spawn under the tail, exactly as in the client.)
+    By default food goes on a uniformly chosen cell of the ``free`` index,
+    one draw per placement at any fill; ``placement="client"`` rejection-
+    samples like ``generateFood`` instead, consuming ``random`` exactly as
+    the client does, which seeded replays and parity checks rely on.
+    Pausing is a client concern and is not modelled: the server simply
+    doesn't call ``tick``.
+    """
+
+    __slots__ = (
+        "grid_size", "mode", "wrap", "random",
+        "occupied", "free", "_cells", "_head", "length",
+        "direction", "next_direction", "food",
+        "score", "speed", "ticks", "game_over",
+    )
+
+    def __init__(
+        self,
+        grid_size: int = 20,
+        mode: str = "passthrough",
+        random: Optional[RandomSource] = None,
+        placement: str = "free",
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode!r}")
+        if placement not in PLACEMENTS:
+            raise ValueError(f"Unknown food placement: {placement!r}")
+        if not MIN_GRID_SIZE <= grid_size <= MAX_GRID_SIZE:
+            raise ValueError(f"Grid size must be between {MIN_GRID_SIZE} and {MAX_GRID_SIZE}")
+        self.grid_size = grid_size
+        self.mode = mode
+        self.wrap = mode == "passthrough"
+        self.random = random if random is not None else _random.random
+
+        cell_count = grid_size * grid_size
+        self.occupied = bytearray(cell_count)
+        self.free = FreeCells(cell_count) if placement == "free" else None
+        self._cells = array("H", bytes(2 * cell_count))
+        self._head = -1
+        self.length = 0
+
+        # Same starting snake as createInitialState: centre row, heading right
+        center = grid_size // 2
+        for i in reversed(range(INITIAL_SNAKE_LENGTH)):
+            self._push(center * grid_size + center - i)
+
+        self.direction = RIGHT
+        self.next_direction = RIGHT
+        self.score = 0
+        self.speed = INITIAL_SPEED
+        self.ticks = 0
+        self.game_over = False
+        self.food = self._place_food()
+
+    def _place_food(self) -> int:
+        free = self.free
+        # A full board has nowhere free; the client's fallback then puts food on the snake
+        if free is None or not free:
+            return place_food(self.occupied, self.grid_size, self.random)
+        return free.sample(self.random)
+
+    def _push(self, cell: int) -> None:
+        if self.length == len(self._cells):
+            self._grow()
+        self._head = (self._head + 1) % len(self._cells)
+        self._cells[self._head] = cell
+        if not self.occupied[cell] and self.free is not None:
+            self.free.remove(cell)
+        self.occupied[cell] += 1
+        self.length += 1
+
+    def _grow(self) -> None:
+        """Unwrap the ring into a larger buffer (only reachable on a full board)"""
+        body = self.cells()
+        body.reverse()
+        self._cells = array("H", body) + array("H", bytes(2 * len(body)))
+        self._head = len(body) - 1
+
+    def set_direction(self, direction: int) -> bool:
+        """Queue a turn for the next tick, ignoring reversals (``setDirection``)"""
+        if self.game_over or direction == self.direction ^ 2:
+            return False
+        self.next_direction = direction
+        return True
+
+    def tick(self) -> bool:
+        """Advance one step (``moveSnake``); returns False once the game is over"""
+        if self.game_over:
+            return False
+        n = self.grid_size
+        cells = self._cells
+        direction = self.direction = self.next_direction
+        head = cells[self._head]
+        x = head % n + DX[direction]
+        y = head // n + DY[direction]
+        if self.wrap:
+            x %= n
+            y %= n
+        elif not (0 <= x < n and 0 <= y < n):
+            self.game_over = True
+            return False
+
+        cell = y * n + x
+        tail_slot = (self._head - self.length + 1) % len(cells)
+        tail = cells[tail_slot]
+        # The tail moves out of the way this tick, so running into it is fine
+        if self.occupied[cell] > (cell == tail):
+            self.game_over = True
+            return False
+
+        self.ticks += 1
+        if cell == self.food:
+            self._push(cell)
+            self.score += SCORE_PER_FOOD
+            self.speed = max(MIN_SPEED, self.speed - SPEED_INCREMENT)
+            self.food = self._place_food()
+        else:
+            # The head takes the tail's slot in the ring and, when the tail's
+            # cell comes free, the head's entry in the free-cell index
+            occupied = self.occupied
+            occupied[tail] -= 1
+            free = self.free
+            if free is not None and cell != tail:
+                if occupied[tail]:
+                    free.remove(cell)
+                else:
+                    free.replace(cell, tail)
+            occupied[cell] += 1
+            self._head = (self._head + 1) % len(cells)
+            cells[self._head] = cell
+        return True
+
+    def cells(self) -> list[int]:
+        """Body cells, head first"""
+        size = len(self._cells)
+        return [self._cells[(self._head - i) % size] for i in range(self.length)]
+
+    def snake(self) -> list[tuple[int, int]]:
+        """Body as ``(x, y)`` pairs, head first"""
+        n = self.grid_size
+        return [(cell % n, cell // n) for cell in self.cells()]
+
+    def snake_data(self) -> bytes:
+        """Body in the packed ``snake_codec`` format"""
+        n = self.grid_size
+        return bytes(v for cell in self.cells() for v in (cell % n, cell // n))
+
+    def head_position(self) -> tuple[int, int]:
+        head = self._cells[self._head]
+        return head % self.grid_size, head // self.grid_size
+
+    def food_position(self) -> tuple[int, int]:
+        return self.food % self.grid_size, self.food // self.grid_size
+
+    def to_dict(self) -> dict:
+        """State in the watch-mode player shape (minus identity fields)"""
+        food_x, food_y = self.food_position()
+        return {
+            "current_score": self.score,
+            "mode": self.mode,
+            "snake": [{"x": x, "y": y} for x, y in self.snake()],
+            "food": {"x": food_x, "y": food_y},
+            "direction": DIRECTIONS[self.direction],
+            "is_playing": not self.game_over,
+        }
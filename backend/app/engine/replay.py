@@ -0,0 +1,164 @@
+"""Deterministic re-simulation of recorded games.
+
+A replay is the seed of the client's food RNG (``mulberry32`` in
+``game-logic.ts``), the number of moves the snake made, and the accepted
+direction changes as ``(tick, direction)`` pairs, where ``tick`` is the
+number of moves made before the change. ``simulate_replay`` re-runs the game
+under the same rules as ``Game`` and returns the score it actually reached.
+
+The loop is specialised for speed rather than built on ``Game``: moves are
+lookups in precomputed per-direction neighbour tables, and occupancy is the
+tick each cell was last entered, since the body is always the last
+``length`` head positions. Moving into a cell at ``tick`` is fatal iff
+``tick - entered[cell] < length`` (the tail, entered exactly ``length``
+ticks ago, moves away in time), so nothing is removed from the tail and a
+move costs one comparison. Walls lead to a sentinel cell entered "in the
+future", which fails the same check, and so does the food cell, whose real
+entry tick is kept aside: eating is sorted out on that slow path instead
+of costing every move a second comparison. Turns are applied as the moves
+reach them, without building a list of runs first.
+"""
+from functools import lru_cache
+from itertools import chain
+from typing import Iterable, NamedTuple
+
+from .rules import DX, DY, INITIAL_SNAKE_LENGTH, MODES, RIGHT, SCORE_PER_FOOD
+
+_MASK = 0xFFFFFFFF
+
+# Entry tick of cells never visited, and (negated) of the wall sentinel; kept
+# below 2**30 so the hot loop stays on CPython's small-int fast paths
+_FAR = 1 << 29
+MAX_TICKS = _FAR >> 1
+# Largest board replays are accepted for; the neighbour tables of every
+# size up to it stay cached (about 6 MB if all sizes are used)
+MIN_GRID_SIZE = 4
+MAX_GRID_SIZE = 64
+
+
+class ReplayError(ValueError):
+    """The replay is malformed or does not play out as claimed"""
+
+
+class ReplayResult(NamedTuple):
+    score: int
+    ticks: int
+    length: int
+
+
+class Mulberry32:
+    """Seeded PRNG identical to ``mulberry32`` in ``game-logic.ts``"""
+
+    __slots__ = ("state",)
+
+    def __init__(self, seed: int):
+        self.state = seed & _MASK
+
+    def __call__(self) -> float:
+        a = self.state = (self.state + 0x6D2B79F5) & _MASK
+        t = ((a ^ (a >> 15)) * (a | 1)) & _MASK
+        t = ((t + (((t ^ (t >> 7)) * (t | 61)) & _MASK)) & _MASK) ^ t
+        return ((t ^ (t >> 14)) & _MASK) / 4294967296
+
+
+@lru_cache(maxsize=2 * (MAX_GRID_SIZE - MIN_GRID_SIZE + 1))
+def _step_tables(grid_size: int, wrap: bool) -> tuple[list[int], ...]:
+    """Per direction, the cell reached from each cell (the sentinel past the
+    last cell for a wall)"""
+    n = grid_size
+    wall = n * n
+    # The four tables share one int object per cell
+    cells = list(range(n * n + 1))
+    tables = []
+    for dx, dy in zip(DX, DY):
+        table = []
+        for cell in range(n * n):
+            x, y = cell % n + dx, cell // n + dy
+            if wrap:
+                table.append(cells[(y % n) * n + x % n])
+            else:
+                table.append(cells[y * n + x] if 0 <= x < n and 0 <= y < n else wall)
+        tables.append(table)
+    return tuple(tables)
+
+
+def _place_food(entered: list[int], floor: int, grid_size: int, random: Mulberry32) -> int:
+    """``place_food`` against entry ticks: cells entered before ``floor`` are free"""
+    attempts = 0
+    max_attempts = grid_size * grid_size
+    while True:
+        x = int(random() * grid_size)
+        y = int(random() * grid_size)
+        cell = y * grid_size + x
+        attempts += 1
+        if entered[cell] < floor or attempts >= max_attempts:
+            return cell
+
+
+def simulate_replay(
+    seed: int,
+    inputs: Iterable[tuple[int, int]],
+    ticks: int,
+    mode: str,
+    grid_size: int = 20,
+) -> ReplayResult:
+    """Play ``ticks`` moves from ``seed`` applying ``inputs``.
+
+    Raises ReplayError if the inputs are out of order or out of range, or
+    if the snake dies before making ``ticks`` moves.
+    """
+    if mode not in MODES:
+        raise ReplayError(f"Unknown mode: {mode!r}")
+    if not 0 <= ticks <= MAX_TICKS:
+        raise ReplayError(f"Tick count must be between 0 and {MAX_TICKS}")
+    if not MIN_GRID_SIZE <= grid_size <= MAX_GRID_SIZE:
+        raise ReplayError(f"Grid size must be between {MIN_GRID_SIZE} and {MAX_GRID_SIZE}")
+
+    n = grid_size
+    steps = _step_tables(n, mode == "passthrough")
+    random = Mulberry32(seed)
+
+    # Starting snake as in Game: head at the centre entered at tick 0, the
+    # rest of the body "entered" at ticks -1, -2, ...
+    entered = [-_FAR] * (n * n) + [_FAR]
+    center = n // 2
+    cell = center * n + center
+    for i in range(INITIAL_SNAKE_LENGTH):
+        entered[cell - i] = -i
+    length = INITIAL_SNAKE_LENGTH
+    food = _place_food(entered, 1 - length, n, random)
+    food_entered, entered[food] = entered[food], _FAR
+
+    # Whether a turn is accepted only depends on the direction of the moves
+    # before it (``setDirection`` ignores reversals); the moves up to each
+    # input's tick are made first, and a last entry finishes the game
+    direction = next_direction = RIGHT
+    at = 0
+    for until, turn in chain(inputs, ((ticks, None),)):
+        if until != at:
+            if not at < until <= ticks:
+                raise ReplayError("Inputs must be in tick order and within the game")
+            direction = next_direction
+            step = steps[direction]
+            for tick in range(at + 1, until + 1):
+                cell = step[cell]
+                if tick - entered[cell] < length:
+                    # A wall, the body or (if it's not on the body) the food
+                    if cell != food or tick - food_entered < length:
+                        raise ReplayError(f"Snake dies on move {tick} of {ticks}")
+                    length += 1
+                    entered[cell] = tick
+                    food = _place_food(entered, tick - length + 1, n, random)
+                    food_entered, entered[food] = entered[food], _FAR
+                else:
+                    entered[cell] = tick
+            at = until
+        if turn is None:
+            break
+        if not 0 <= turn < 4:
+            raise ReplayError("Unknown direction")
+        if turn != direction ^ 2:
+            next_direction = turn
+
+    score = (length - INITIAL_SNAKE_LENGTH) * SCORE_PER_FOOD
+    return ReplayResult(score, ticks, length)
@@ -0,0 +1,29 @@
+"""Game constants and directions, matching ``game-logic.ts``"""
+
+INITIAL_SNAKE_LENGTH = 3
+INITIAL_SPEED = 150  # ms per tick
+SPEED_INCREMENT = 5
+MIN_SPEED = 50
+SCORE_PER_FOOD = 10
+
+MODES = ("passthrough", "walls")
+
+# Directions are small ints ordered clockwise, so the opposite is ``d ^ 2``
+UP, RIGHT, DOWN, LEFT = range(4)
+DIRECTIONS = ("UP", "RIGHT", "DOWN", "LEFT")
+DX = (0, 1, 0, -1)
+DY = (-1, 0, 1, 0)
+
+_DIRECTION_CODES = {name: code for code, name in enumerate(DIRECTIONS)}
+
+
+def opposite(direction: int) -> int:
+    return direction ^ 2
+
+
+def parse_direction(name: str) -> int:
+    """``"UP"`` -> ``UP``; raises ValueError for anything else"""
+    try:
+        return _DIRECTION_CODES[name]
+    except KeyError:
+        raise ValueError(f"Unknown direction: {name!r}") from None
@@ -0,0 +1,198 @@
+"""Batched tick scheduling for many concurrent games.
+
+Every game moves once per ``speed`` ms (150, dropping by 5 to 50 as it
+eats), so rather than a timer per game the scheduler keeps a timing wheel
+of ``RESOLUTION_MS`` slots: each slot lists the games due in it, and when
+it comes due all of them are stepped together and rescheduled ``speed`` ms
+after the slot. Speeds are multiples of the resolution, so a game keeps its
+exact period however its neighbours' speeds change. How late a slot was
+stepped is its lag.
+
+``serve`` runs a scheduler as one shard of a game host: commands come in
+over a ``multiprocessing`` connection and every stepped slot goes back out
+as one message with the serialized watch-mode updates of its games. It
+only needs this package, so it is cheap to start in a spawned process.
+"""
+import heapq
+import json
+import math
+import random as _random
+import time
+from typing import Callable, NamedTuple, Optional
+
+from .game import Game
+from .replay import Mulberry32
+from .rules import DIRECTIONS
+
+# Width of a timing wheel slot; divides every game speed
+RESOLUTION_MS = 5
+
+
+class TickBatch(NamedTuple):
+    """The games stepped for one slot"""
+    due: float
+    lag: float
+    # (game id, changes in the watch-mode ``update`` shape)
+    updates: list[tuple[str, dict]]
+    # (game id, final score) of the games that ended on this tick
+    ended: list[tuple[str, int]]
+
+
+def step(game: Game) -> dict:
+    """Tick ``game`` and describe what changed as watch-mode ``changes``
+    (a one-cell ``snake_delta`` plus whichever fields moved)"""
+    length, direction, score = game.length, game.direction, game.score
+    if not game.tick():
+        return {"direction": DIRECTIONS[game.direction], "is_playing": False}
+    x, y = game.head_position()
+    changes: dict = {"snake_delta": {"heads": [{"x": x, "y": y}], "trim": 0 if game.length > length else 1}}
+    if game.direction != direction:
+        changes["direction"] = DIRECTIONS[game.direction]
+    if game.score != score:
+        food_x, food_y = game.food_position()
+        changes["current_score"] = game.score
+        changes["food"] = {"x": food_x, "y": food_y}
+    return changes
+
+
+class TickScheduler:
+    """Timing wheel of games keyed by id; times are ``time.monotonic`` seconds"""
+
+    def __init__(self, resolution_ms: int = RESOLUTION_MS):
+        self.resolution_ms = resolution_ms
+        self.resolution = resolution_ms / 1000
+        self.games: dict[str, Game] = {}
+        # Slot number -> games due in it; the heap holds the slot numbers
+        self._slots: dict[int, list[tuple[str, Game]]] = {}
+        self._heap: list[int] = []
+
+    def __len__(self) -> int:
+        return len(self.games)
+
+    def _period(self, game: Game) -> int:
+        """The game's speed in slots"""
+        return max(1, round(game.speed / self.resolution_ms))
+
+    def _schedule(self, game_id: str, game: Game, slot: int) -> None:
+        bucket = self._slots.get(slot)
+        if bucket is None:
+            bucket = self._slots[slot] = []
+            heapq.heappush(self._heap, slot)
+        bucket.append((game_id, game))
+
+    def add(self, game_id: str, game: Game, now: float) -> None:
+        """Host ``game``; its first move is due one period after ``now``
+        (rounded up to a slot, so games started together share slots)"""
+        if game_id in self.games:
+            raise ValueError(f"Game {game_id!r} is already scheduled")
+        self.games[game_id] = game
+        self._schedule(game_id, game, math.ceil(now / self.resolution) + self._period(game))
+
+    def remove(self, game_id: str) -> Optional[Game]:
+        # Its slot entry is skipped when the slot comes due
+        return self.games.pop(game_id, None)
+
+    def next_due(self) -> Optional[float]:
+        """When the earliest slot with games in it is due"""
+        return self._heap[0] * self.resolution if self._heap else None
+
+    def run_due(self, now: float) -> list[TickBatch]:
+        """Step every slot due by ``now``, oldest first"""
+        batches = []
+        current = math.floor(now / self.resolution + 1e-9)
+        while self._heap and self._heap[0] <= current:
+            slot = heapq.heappop(self._heap)
+            due = slot * self.resolution
+            updates, ended = [], []
+            for game_id, game in self._slots.pop(slot):
+                if self.games.get(game_id) is not game:
+                    continue  # removed (or replaced) since it was scheduled
+                updates.append((game_id, step(game)))
+                if game.game_over:
+                    del self.games[game_id]
+                    ended.append((game_id, game.score))
+                else:
+                    # Keep the period from the due slot, but a scheduler that
+                    # fell more than a period behind slows games down rather
+                    # than bursting through the backlog
+                    self._schedule(game_id, game, max(slot + self._period(game), current + 1))
+            if updates:
+                batches.append(TickBatch(due, now - due, updates, ended))
+        return batches
+
+
+def encode_update(game_id: str, changes: dict) -> str:
+    """``step``'s changes as a watch-mode ``update`` message.
+
+    Most moves change nothing but the snake, so that case is formatted
+    directly rather than through ``json.dumps``.
+    """
+    if len(changes) == 1 and "snake_delta" in changes:
+        delta = changes["snake_delta"]
+        head = delta["heads"][0]
+        body = '{"snake_delta":{"heads":[{"x":%d,"y":%d}],"trim":%d}}' % (head["x"], head["y"], delta["trim"])
+    else:
+        body = json.dumps(changes, separators=(",", ":"))
+    return '{"type":"update","id":%s,"changes":%s}' % (json.dumps(game_id), body)
+
+
+def _new_game(grid_size: int, mode: str, seed: Optional[int]) -> Game:
+    random = Mulberry32(seed) if seed is not None else _random.Random().random
+    return Game(grid_size, mode, random=random)
+
+
+def serve(conn, resolution_ms: int = RESOLUTION_MS, clock: Callable[[], float] = time.monotonic) -> None:
+    """Run one shard until ``("close",)`` arrives or the other end goes away.
+
+    Commands (``rid`` is echoed in a ``("reply", rid, result)`` message, or
+    ``("error", rid, message)`` if it was invalid):
+
+    - ``("start", rid, game_id, grid_size, mode, seed)`` -> the game's state
+    - ``("snapshot", rid, game_id)`` -> its state, or None
+    - ``("turn", game_id, direction)`` and ``("stop", game_id)``
+
+    Each stepped slot is sent as ``("tick", lag, stepped, updates, ended,
+    scored)`` with ``updates`` as ``(game id, JSON update message)`` pairs
+    and ``scored`` as ``(game id, new score)`` pairs.
+    """
+    scheduler = TickScheduler(resolution_ms)
+    try:
+        while True:
+            due = scheduler.next_due()
+            if conn.poll(None if due is None else max(0.0, due - clock())):
+                while True:
+                    command = conn.recv()
+                    kind = command[0]
+                    if kind == "close":
+                        return
+                    if kind == "turn":
+                        game = scheduler.games.get(command[1])
+                        if game is not None:
+                            game.set_direction(command[2])
+                    elif kind == "stop":
+                        scheduler.remove(command[1])
+                    elif kind == "start":
+                        _, rid, game_id, grid_size, mode, seed = command
+                        try:
+                            game = _new_game(grid_size, mode, seed)
+                            scheduler.add(game_id, game, clock())
+                        except ValueError as exc:
+                            conn.send(("error", rid, str(exc)))
+                        else:
+                            conn.send(("reply", rid, game.to_dict()))
+                    elif kind == "snapshot":
+                        game = scheduler.games.get(command[2])
+                        conn.send(("reply", command[1], game.to_dict() if game is not None else None))
+                    if not conn.poll():
+                        break
+            for batch in scheduler.run_due(clock()):
+                updates = [(game_id, encode_update(game_id, changes)) for game_id, changes in batch.updates]
+                scored = [
+                    (game_id, changes["current_score"]) for game_id, changes in batch.updates
+                    if "current_score" in changes
+                ]
+                conn.send(("tick", batch.lag, len(updates), updates, batch.ended, scored))
+    except (EOFError, OSError):
+        pass  # the host went away
+    finally:
+        conn.close()
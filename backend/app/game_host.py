@@ -0,0 +1,474 @@
+"""Server-hosted games, ticked in batches by a sharded scheduler.
+
+Each game belongs to one shard, picked by a hash of its id. A shard is an
+``app.engine.scheduler.serve`` loop: it keeps its games on a timing wheel,
+steps every game due in the same 5 ms slot together and sends back one
+message per slot with the games' serialized watch updates. With
+``GAME_HOST_PROCESSES`` set, shards run in that many spawned processes;
+with 0 (the default) a single shard runs on a thread of this worker. A
+reader thread per shard publishes the updates to each game's topic; the
+lobby only hears of game starts, score changes and ends, so spectators pay
+for the games they watch. ``lobby()`` lists the live games for lobby
+snapshots, with their first state, current score and status.
+
+Each user may host ``GAME_HOST_MAX_GAMES_PER_USER`` games at a time. A
+game is stopped when the session that started it is revoked (logout, or
+the per-user session cap) and when it goes ``GAME_HOST_IDLE_SECONDS``
+without a turn, so abandoned games don't keep their shard busy forever.
+
+How late each slot was stepped (its lag) goes to ``/metrics`` and
+``GET /games/stats``. Games live in the worker that started them, so turns
+and stops must reach that worker; spectators can watch from any worker
+when ``SHARED_STATE_URL`` is shared.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Callable, NamedTuple, Optional
+
+from .engine.scheduler import RESOLUTION_MS, serve
+from .metrics import METRICS_ENABLED, metrics
+from .pubsub import LOBBY_TOPIC, PubSubHub, Subscription, hub, player_topic
+from .session_cache import session_cache
+
+logger = logging.getLogger(__name__)
+
+# Shard processes; 0 runs one shard on a thread of this worker
+GAME_HOST_PROCESSES = int(os.getenv("GAME_HOST_PROCESSES", "0"))
+# Concurrent games this worker hosts before refusing new ones
+GAME_HOST_MAX_GAMES = int(os.getenv("GAME_HOST_MAX_GAMES", "10000"))
+# Concurrent games one user may host
+GAME_HOST_MAX_GAMES_PER_USER = int(os.getenv("GAME_HOST_MAX_GAMES_PER_USER", "3"))
+# Seconds a game may go without a turn before it is stopped (0 never stops it)
+GAME_HOST_IDLE_SECONDS = float(os.getenv("GAME_HOST_IDLE_SECONDS", "300"))
+# Seconds between sweeps for idle games
+IDLE_SWEEP_SECONDS = 5.0
+# Seconds to wait for a shard to answer
+REPLY_TIMEOUT = 5.0
+# Recent slots whose lag is kept for the percentiles in stats()
+LAG_WINDOW = 1000
+
+
+class GameHostError(Exception):
+    """Games can't be hosted right now (not running, full, or a shard is stuck)"""
+
+
+class GameLimitError(GameHostError):
+    """The user already hosts as many games as they may"""
+
+
+class HostedGame(NamedTuple):
+    user_id: str
+    username: str
+    shard: int
+    # Token of the session that started the game
+    session: Optional[str] = None
+
+
+def shard_of(game_id: str, shards: int) -> int:
+    return zlib.crc32(game_id.encode()) % shards
+
+
+class _Shard:
+    """This side of one shard: its connection, runner and lag figures"""
+
+    def __init__(self, index: int, conn, runner):
+        self.index = index
+        self.conn = conn
+        self.runner = runner
+        self.reader: Optional[threading.Thread] = None
+        self._send_lock = threading.Lock()
+        self.ticks = 0
+        self.moves = 0
+        self.lags: deque[float] = deque(maxlen=LAG_WINDOW)
+        self.max_lag = 0.0
+
+    def send(self, *command) -> None:
+        with self._send_lock:
+            self.conn.send(command)
+
+    def record(self, lag: float, moves: int) -> None:
+        self.ticks += 1
+        self.moves += moves
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+
+    def stats(self, games: int) -> dict:
+        lags = sorted(self.lags)
+
+        def percentile(p: float) -> float:
+            return lags[min(len(lags) - 1, int(p * len(lags)))] * 1000 if lags else 0.0
+
+        return {
+            "shard": self.index,
+            "games": games,
+            "ticks": self.ticks,
+            "moves": self.moves,
+            "lag_ms_p50": round(percentile(0.5), 3),
+            "lag_ms_p99": round(percentile(0.99), 3),
+            "lag_ms_max": round(self.max_lag * 1000, 3),
+        }
+
+
+class GameHost:
+    """Starts, steers and stops hosted games across the shards"""
+
+    def __init__(
+        self,
+        hub: PubSubHub,
+        processes: int = GAME_HOST_PROCESSES,
+        max_games: int = GAME_HOST_MAX_GAMES,
+        resolution_ms: int = RESOLUTION_MS,
+        max_games_per_user: int = GAME_HOST_MAX_GAMES_PER_USER,
+        idle_seconds: float = GAME_HOST_IDLE_SECONDS,
+    ):
+        self.hub = hub
+        self.processes = processes
+        self.max_games = max_games
+        self.max_games_per_user = max_games_per_user
+        self.idle_seconds = idle_seconds
+        self.resolution_ms = resolution_ms
+        self._lock = threading.Lock()
+        self._shards: list[_Shard] = []
+        self._games: dict[str, HostedGame] = {}
+        self._per_user: Counter[str] = Counter()
+        self._last_turn: dict[str, float] = {}  # game id -> monotonic time
+        self._lobby: dict[str, dict] = {}  # game id -> lobby row, once the shard has it
+        self._pending: dict[int, Future] = {}
+        self._request_ids = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._games)
+
+    @property
+    def running(self) -> bool:
+        return bool(self._shards)
+
+    def start(self) -> None:
+        if self._shards:
+            return
+        # Spawned rather than forked: the API worker has threads (and maybe
+        # an event loop) that a forked child must not inherit
+        context = multiprocessing.get_context("spawn")
+        for index in range(max(1, self.processes)):
+            conn, child = context.Pipe()
+            if self.processes:
+                runner = context.Process(
+                    target=serve, args=(child, self.resolution_ms), name=f"game-shard-{index}", daemon=True
+                )
+                runner.start()
+                child.close()  # the process has its own copy
+            else:
+                runner = threading.Thread(
+                    target=serve, args=(child, self.resolution_ms), name="game-shard", daemon=True
+                )
+                runner.start()
+            shard = _Shard(index, conn, runner)
+            shard.reader = threading.Thread(
+                target=self._read, args=(shard,), name=f"game-shard-{index}-reader", daemon=True
+            )
+            shard.reader.start()
+            self._shards.append(shard)
+
+    def close(self) -> None:
+        """Stop every shard; their games end without a score"""
+        shards, self._shards = self._shards, []
+        for shard in shards:
+            try:
+                shard.send("close")
+            except OSError:
+                pass
+        for shard in shards:
+            shard.runner.join(timeout=REPLY_TIMEOUT)
+            if isinstance(shard.runner, multiprocessing.process.BaseProcess) and shard.runner.is_alive():
+                shard.runner.terminate()
+            # The shard closing its end ends the reader
+            shard.reader.join(timeout=REPLY_TIMEOUT)
+            shard.conn.close()
+        with self._lock:
+            pending = list(self._pending.values())
+            self._pending.clear()
+            self._games.clear()
+            self._per_user.clear()
+            self._last_turn.clear()
+            self._lobby.clear()
+        for future in pending:
+            future.set_exception(GameHostError("Game host closed"))
+
+    def reset(self) -> None:
+        self.close()
+
+    def _read(self, shard: _Shard) -> None:
+        while True:
+            try:
+                message = shard.conn.recv()
+            except (EOFError, OSError):
+                return
+            if message[0] == "tick":
+                _, lag, moves, updates, ended, scored = message
+                shard.record(lag, moves)
+                if METRICS_ENABLED:
+                    metrics.record_tick(shard.index, lag, moves)
+                self.hub.publish_many([(player_topic(game_id), text) for game_id, text in updates])
+                if scored:
+                    self._publish_scores(scored)
+                for game_id, score in ended:
+                    self._finish(game_id, score)
+            else:
+                kind, rid, result = message
+                with self._lock:
+                    future = self._pending.pop(rid, None)
+                if future is None:
+                    continue
+                if kind == "error":
+                    future.set_exception(ValueError(result))
+                else:
+                    # Done callbacks run here, in order with the shard's ticks
+                    future.set_result(result)
+
+    def _request(self, shard: _Shard, kind: str, *args, on_reply: Optional[Callable[[Future], None]] = None) -> Future:
+        future: Future = Future()
+        if on_reply is not None:
+            # Added before sending, so it runs on the reader thread
+            future.add_done_callback(on_reply)
+        with self._lock:
+            rid = next(self._request_ids)
+            self._pending[rid] = future
+        try:
+            shard.send(kind, rid, *args)
+        except OSError as exc:
+            with self._lock:
+                self._pending.pop(rid, None)
+            raise GameHostError("Game shard is not running") from exc
+        return future
+
+    @staticmethod
+    async def _wait(future: Future):
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), REPLY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise GameHostError("Game shard did not answer") from None
+
+    def _forget(self, game_id: str) -> Optional[HostedGame]:
+        """Drop a game from the books (lock held)"""
+        game = self._games.pop(game_id, None)
+        if game is not None:
+            self._per_user[game.user_id] -= 1
+            if not self._per_user[game.user_id]:
+                del self._per_user[game.user_id]
+            self._last_turn.pop(game_id, None)
+            self._lobby.pop(game_id, None)
+        return game
+
+    def _publish_scores(self, scored: list[tuple[str, int]]) -> None:
+        """Tell the lobby about new scores (the games' topics have them already)"""
+        messages = []
+        with self._lock:
+            for game_id, score in scored:
+                row = self._lobby.get(game_id)
+                if row is not None:
+                    row["current_score"] = score
+                    message = {"type": "update", "id": game_id, "changes": {"current_score": score}}
+                    messages.append((LOBBY_TOPIC, json.dumps(message, separators=(",", ":"))))
+        self.hub.publish_many(messages)
+
+    def _finish(self, game_id: str, score: Optional[int] = None) -> None:
+        """Drop a game that ended (with its final ``score``) or was stopped"""
+        with self._lock:
+            game = self._forget(game_id)
+        if game is not None:
+            if score is not None:
+                self.hub.publish(LOBBY_TOPIC, {
+                    "type": "update", "id": game_id, "changes": {"current_score": score, "is_playing": False},
+                })
+            message = {"type": "removed", "id": game_id}
+            self.hub.publish(player_topic(game_id), message)
+            self.hub.publish(LOBBY_TOPIC, message)
+
+    def start_game(
+        self, user_id: str, username: str, mode: str, grid_size: int = 20, seed: Optional[int] = None,
+        session: Optional[str] = None,
+    ) -> tuple[str, Future]:
+        """Host a new game; returns its id and a future of its first state.
+
+        The lobby hears about it once the shard has it. The game is stopped
+        when ``session`` is revoked.
+        """
+        game_id = str(uuid.uuid4())
+        with self._lock:
+            if not self._shards:
+                raise GameHostError("Game hosting is not running")
+            if len(self._games) >= self.max_games:
+                raise GameHostError("Game host is full")
+            if self._per_user[user_id] >= self.max_games_per_user:
+                raise GameLimitError(f"At most {self.max_games_per_user} games at a time")
+            hosted = self._games[game_id] = HostedGame(
+                user_id, username, shard_of(game_id, len(self._shards)), session
+            )
+            self._per_user[user_id] += 1
+            self._last_turn[game_id] = time.monotonic()
+
+        def announce(future: Future) -> None:
+            if future.exception() is not None:
+                with self._lock:
+                    self._forget(game_id)
+                return
+            changes = {"username": username, **future.result()}
+            with self._lock:
+                if game_id not in self._games:
+                    return  # stopped before the shard answered
+                self._lobby[game_id] = {"id": game_id, **changes}
+            self.hub.publish(LOBBY_TOPIC, {"type": "update", "id": game_id, "changes": changes})
+
+        try:
+            future = self._request(
+                self._shards[hosted.shard], "start", game_id, grid_size, mode, seed, on_reply=announce
+            )
+        except GameHostError:
+            with self._lock:
+                self._forget(game_id)
+            raise
+        return game_id, future
+
+    async def create_game(
+        self, user_id: str, username: str, mode: str, grid_size: int = 20, seed: Optional[int] = None,
+        session: Optional[str] = None,
+    ) -> dict:
+        """Host a new game and return its state (ActivePlayerSchema JSON)"""
+        game_id, future = self.start_game(user_id, username, mode, grid_size, seed, session)
+        try:
+            state = await self._wait(future)
+        except GameHostError:
+            self.stop_game(game_id)
+            raise
+        return {"id": game_id, "username": username, **state}
+
+    def get(self, game_id: str) -> Optional[HostedGame]:
+        return self._games.get(game_id)
+
+    def lobby(self) -> list[dict]:
+        """Live games hosted here as lobby rows (ActivePlayerSchema JSON):
+        their first state with the current score"""
+        with self._lock:
+            return [dict(row) for row in self._lobby.values()]
+
+    async def snapshot(self, game_id: str) -> Optional[dict]:
+        """Current state of a game hosted here, or None"""
+        hosted = self._games.get(game_id)
+        if hosted is None or not self._shards:
+            return None
+        state = await self._wait(self._request(self._shards[hosted.shard], "snapshot", game_id))
+        return None if state is None else {"id": game_id, "username": hosted.username, **state}
+
+    async def watch(self, game_id: str) -> Optional[tuple[dict, Subscription]]:
+        """A game's state and a subscription to its updates from exactly
+        that state on, or None if it isn't hosted here.
+
+        The subscription is made on the reader thread as the snapshot
+        arrives, so no update is missed or applied twice.
+        """
+        hosted = self._games.get(game_id)
+        if hosted is None or not self._shards:
+            return None
+        loop = asyncio.get_running_loop()
+        subscriptions: list[Subscription] = []
+
+        def subscribe(future: Future) -> None:
+            if future.exception() is None and future.result() is not None:
+                subscriptions.append(self.hub.subscribe(player_topic(game_id), loop=loop))
+
+        future = self._request(self._shards[hosted.shard], "snapshot", game_id, on_reply=subscribe)
+        try:
+            state = await self._wait(future)
+        except GameHostError:
+            for subscription in subscriptions:
+                subscription.close()
+            raise
+        if state is None:
+            return None
+        return {"id": game_id, "username": hosted.username, **state}, subscriptions[0]
+
+    def turn(self, game_id: str, direction: int) -> bool:
+        """Queue a turn for the game's next move; False if it isn't hosted here"""
+        hosted = self._games.get(game_id)
+        if hosted is None or not self._shards:
+            return False
+        try:
+            self._shards[hosted.shard].send("turn", game_id, direction)
+        except OSError as exc:
+            raise GameHostError("Game shard is not running") from exc
+        with self._lock:
+            if game_id in self._last_turn:
+                self._last_turn[game_id] = time.monotonic()
+        return True
+
+    def stop_game(self, game_id: str) -> bool:
+        """End a game early; False if it isn't hosted here"""
+        hosted = self._games.get(game_id)
+        if hosted is None:
+            return False
+        if self._shards:
+            try:
+                self._shards[hosted.shard].send("stop", game_id)
+            except OSError:
+                pass
+        self._finish(game_id)
+        return True
+
+    def stop_session(self, session: str) -> int:
+        """End the games started by ``session``; returns how many"""
+        with self._lock:
+            game_ids = [game_id for game_id, game in self._games.items() if game.session == session]
+        return sum(self.stop_game(game_id) for game_id in game_ids)
+
+    def stop_idle(self, now: Optional[float] = None) -> int:
+        """End the games without a turn for ``idle_seconds``; returns how many"""
+        if self.idle_seconds <= 0:
+            return 0
+        cutoff = (time.monotonic() if now is None else now) - self.idle_seconds
+        with self._lock:
+            game_ids = [game_id for game_id, last in self._last_turn.items() if last <= cutoff]
+        return sum(self.stop_game(game_id) for game_id in game_ids)
+
+    def stats(self) -> dict:
+        with self._lock:
+            per_shard = [0] * len(self._shards)
+            for game in self._games.values():
+                if game.shard < len(per_shard):
+                    per_shard[game.shard] += 1
+            games = len(self._games)
+        return {
+            "running": self.running,
+            "processes": self.processes,
+            "games": games,
+            "max_games": self.max_games,
+            "max_games_per_user": self.max_games_per_user,
+            "shards": [shard.stats(count) for shard, count in zip(self._shards, per_shard)],
+        }
+
+
+async def stop_idle_games_periodically(host: GameHost, interval: float = IDLE_SWEEP_SECONDS) -> None:
+    """Background loop ending ``host``'s idle games every ``interval`` seconds"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stopped = host.stop_idle()
+        except Exception:
+            logger.exception("Stopping idle games failed")
+        else:
+            if stopped:
+                logger.info("Stopped %d idle games", stopped)
+
+
+game_host = GameHost(hub)
+# A revoked session's games end with it, whichever worker revoked it
+session_cache.on_evict(game_host.stop_session)
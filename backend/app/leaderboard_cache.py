@@ -0,0 +1,275 @@
+"""Read-through cache of serialized leaderboard responses.
+
+``GET /leaderboard`` is polled constantly by the landing page, so boards are
+cached per ``(mode, limit, distinct_players)`` as ready-to-send JSON bytes together with an
+ETag. A cached board is dropped when a new score could actually change
+it, i.e. when it lands inside that board's top-N, when its window buckets
+are reloaded, after a bulk import, and in any case after
+``LEADERBOARD_CACHE_TTL_SECONDS``, which bounds how long writes this worker
+never hears about (another worker's, without a shared backend) stay
+invisible.
+
+Attached to a shared backend (``SHARED_STATE_URL``), boards missing here
+are looked up there before the database, and each invalidation is
+broadcast to the other workers. Shared boards are stored under a
+generation number that every new score bumps, which retires them all at
+once: coarser than the per-board check above, but it needs no
+coordination between workers.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional, Sequence
+
+from pydantic import TypeAdapter
+
+from .schemas import LeaderboardEntrySchema
+from .shared_state import SharedState, SharedStateError
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of distinct boards (per mode, limit and distinct_players) kept in memory
+MAX_ENTRIES = int(os.getenv("LEADERBOARD_CACHE_MAX_ENTRIES", "256"))
+# Seconds a board may be served from memory
+TTL_SECONDS = float(os.getenv("LEADERBOARD_CACHE_TTL_SECONDS", "30"))
+# Seconds a board is kept in the shared backend
+SHARED_TTL_SECONDS = float(os.getenv("LEADERBOARD_SHARED_TTL_SECONDS", "60"))
+
+GENERATION_KEY = "leaderboard:generation"
+INVALIDATE_CHANNEL = "leaderboard-cache:invalidate"
+
+_entries_adapter = TypeAdapter(list[LeaderboardEntrySchema])
+
+
+@dataclass(frozen=True)
+class CachedBoard:
+    """A serialized leaderboard response"""
+    body: bytes
+    etag: str
+    limit: int
+    size: int
+    min_score: Optional[int]
+    last: Optional[LeaderboardEntrySchema] = None  # for the next page's cursor
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Whether an If-None-Match header value covers this board"""
+        if not if_none_match:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags or f"W/{self.etag}" in tags
+
+
+def serialize_board(entries: Sequence[LeaderboardEntrySchema], limit: int) -> CachedBoard:
+    body = _entries_adapter.dump_json(list(entries))
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+    return CachedBoard(
+        body=body,
+        etag=etag,
+        limit=limit,
+        size=len(entries),
+        min_score=entries[-1].score if entries else None,
+        last=entries[-1] if entries else None,
+    )
+
+
+def _dump_board(board: CachedBoard) -> bytes:
+    header = {
+        "etag": board.etag,
+        "limit": board.limit,
+        "size": board.size,
+        "min_score": board.min_score,
+        "last": board.last.model_dump(mode="json") if board.last is not None else None,
+    }
+    return json.dumps(header).encode() + b"\n" + board.body
+
+
+def _load_board(data: bytes) -> CachedBoard:
+    header, body = data.split(b"\n", 1)
+    fields = json.loads(header)
+    last = fields.pop("last")
+    return CachedBoard(
+        body=body, last=LeaderboardEntrySchema.model_validate(last) if last else None, **fields
+    )
+
+
+def _shared_key(generation: int, key: Hashable) -> str:
+    parts = key if isinstance(key, tuple) else (key,)
+    return f"leaderboard:{generation}:" + "|".join(str(part) for part in parts)
+
+
+class LeaderboardCache:
+    """Bounded TTL/LRU of serialized boards keyed by ``(mode, limit, ...)``"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._boards: "OrderedDict[Hashable, tuple[CachedBoard, float]]" = OrderedDict()
+        # Bumped on every invalidation so that a board computed from data read
+        # before a concurrent write is never stored after that write.
+        self._generation = 0
+        # Latest shared generation seen (see the module docstring)
+        self._shared_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self._state: Optional[SharedState] = None
+        self._unsubscribe: Optional[Callable[[], None]] = None
+
+    @property
+    def shared(self) -> bool:
+        """Whether ``get_shared`` can find boards stored by other workers"""
+        return self._state is not None
+
+    def attach(self, state: SharedState) -> None:
+        """Share boards and invalidations with the other workers using
+        ``state`` (a no-op for the in-process backend)"""
+        self.detach()
+        if not state.shared:
+            return
+        try:
+            current = int(state.get(GENERATION_KEY) or 0)
+        except SharedStateError as exc:
+            logger.warning("Reading the shared leaderboard generation failed: %s", exc)
+            current = 0
+        self._state = state
+        self._advance(current)
+        self._unsubscribe = state.on_broadcast(INVALIDATE_CHANNEL, self._on_invalidate)
+
+    def detach(self) -> None:
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        self._state = None
+
+    def _advance(self, shared_generation: int) -> None:
+        with self._lock:
+            if shared_generation > self._shared_generation:
+                self._shared_generation = shared_generation
+                self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._boards.clear()
+            self._generation += 1
+
+    def get(self, key: Hashable) -> Optional[CachedBoard]:
+        with self._lock:
+            entry = self._boards.get(key)
+            if entry is not None and time.monotonic() >= entry[1]:
+                del self._boards[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            board = entry[0]
+            self._boards.move_to_end(key)
+            self.hits += 1
+            return board
+
+    def get_shared(self, key: Hashable) -> Optional[CachedBoard]:
+        """Look ``key`` up in the shared backend (blocking IO: call it off
+        the event loop), caching what is found here as well"""
+        state = self._state
+        if state is None:
+            return None
+        generation = self.generation
+        try:
+            data = state.get(_shared_key(generation[1], key))
+        except SharedStateError as exc:
+            logger.warning("Shared leaderboard lookup failed: %s", exc)
+            return None
+        if data is None:
+            return None
+        board = _load_board(data)
+        self._put_local(key, board, generation)
+        with self._lock:
+            self.shared_hits += 1
+        return board
+
+    @property
+    def generation(self) -> tuple[int, int]:
+        """Token to read before loading a board and pass back to ``put``"""
+        with self._lock:
+            return self._generation, self._shared_generation
+
+    def put(self, key: Hashable, board: CachedBoard, generation: tuple[int, int]) -> None:
+        """Store ``board`` unless an invalidation happened since ``generation``"""
+        if self._put_local(key, board, generation) and self._state is not None:
+            self._state.defer(
+                self._state.set, _shared_key(generation[1], key), _dump_board(board), SHARED_TTL_SECONDS,
+            )
+
+    def _put_local(self, key: Hashable, board: CachedBoard, generation: tuple[int, int]) -> bool:
+        with self._lock:
+            if generation != (self._generation, self._shared_generation):
+                return False
+            if self.ttl <= 0:
+                return True
+            self._boards[key] = (board, time.monotonic() + self.ttl)
+            self._boards.move_to_end(key)
+            while len(self._boards) > self.max_entries:
+                self._boards.popitem(last=False)
+            return True
+
+    def invalidate_score(self, mode: str, score: int) -> None:
+        """Drop boards that a new ``score`` in ``mode`` would appear on, in
+        every worker.
+
+        Keys are tuples starting with ``(mode, ...)`` where mode may be
+        None for the all-modes board. Ties count as changes since newer entries sort
+        first among equal scores.
+        """
+        self._invalidate({"mode": mode, "score": score})
+
+    def invalidate_windows(self) -> None:
+        """Drop the day, week and month boards, in every worker (after the
+        window buckets were reloaded)"""
+        self._invalidate({"scope": "windows"})
+
+    def invalidate_all(self) -> None:
+        """Drop every board, in every worker (after writes that bypassed the
+        API, like a bulk import)"""
+        self._invalidate({"scope": "all"})
+
+    def _invalidate(self, payload: dict) -> None:
+        self._invalidate_local(payload)
+        if self._state is not None:
+            self._state.defer(self._share_invalidation, self._state, payload)
+
+    def _invalidate_local(self, payload: dict) -> None:
+        scope = payload.get("scope")
+        with self._lock:
+            self._generation += 1
+            if scope == "all":
+                self._boards.clear()
+                return
+            if scope == "windows":
+                # Window keys carry (window, period start) after the base key
+                stale = [key for key in self._boards if len(key) > 3]
+            else:
+                mode, score = payload["mode"], payload["score"]
+                stale = [
+                    key for key, (board, _) in self._boards.items()
+                    if key[0] in (None, mode)
+                    and (board.size < board.limit or score >= board.min_score)
+                ]
+            for key in stale:
+                del self._boards[key]
+
+    def _share_invalidation(self, state: SharedState, payload: dict) -> None:
+        generation = state.incr(GENERATION_KEY)
+        self._advance(generation)
+        state.broadcast(INVALIDATE_CHANNEL, {**payload, "generation": generation})
+
+    def _on_invalidate(self, payload: dict) -> None:
+        self._invalidate_local(payload)
+        self._advance(payload["generation"])
+
+
+leaderboard_cache = LeaderboardCache()
@@ -0,0 +1,265 @@
+"""In-memory ranked index of leaderboard scores.
+
+Keeps a per-mode Fenwick tree of score counts so that ``submit_score`` can
+answer "how many entries in this mode beat this score" in O(log n) instead
+of a COUNT(*) range scan over ``leaderboard_entries``. The index is warmed
+from the table (lazily per mode, or eagerly at startup) and periodically
+reconciled against it so that writes from other workers or out-of-band
+imports cannot make it drift for long.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .database import LeaderboardEntry
+
+logger = logging.getLogger(__name__)
+
+# Seconds between background reconciliations against the database (0 disables)
+RECONCILE_INTERVAL = float(os.getenv("LEADERBOARD_INDEX_RECONCILE_SECONDS", "300"))
+
+
+class ScoreCounts:
+    """Order-statistic structure over integer scores for a single mode.
+
+    Counts are kept in a Fenwick (binary indexed) tree over the distinct
+    scores seen, in order (coordinate compression), so memory and work
+    depend on how many distinct scores there are and not on their range:
+    an outlier costs one slot like any other score. Repeated scores and
+    rank queries are O(log distinct); a score not seen before is inserted
+    into the sorted keys and the tree rebuilt, O(distinct).
+    """
+
+    def __init__(self, counts: Optional[dict[int, int]] = None):
+        self.counts: Counter = Counter({score: n for score, n in (counts or {}).items() if n})
+        self.total = sum(self.counts.values())
+        self._keys = sorted(self.counts)
+        self._tree = self._build(self._keys, self.counts)
+
+    @staticmethod
+    def _build(keys: list[int], counts: Counter) -> list[int]:
+        """Fenwick tree of ``counts`` at the positions of ``keys``, in O(len(keys))"""
+        size = len(keys)
+        tree = [0] * (size + 1)
+        for i, score in enumerate(keys, 1):
+            tree[i] += counts[score]
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        return tree
+
+    def _prefix(self, size: int) -> int:
+        """Number of entries with one of the ``size`` lowest keys"""
+        tree = self._tree
+        total = 0
+        while size > 0:
+            total += tree[size]
+            size -= size & -size
+        return total
+
+    def add(self, score: int, n: int = 1) -> None:
+        """Record ``n`` entries with ``score`` (nothing changes if this raises)"""
+        keys = self._keys
+        i = bisect_left(keys, score)
+        if i == len(keys) or keys[i] != score:
+            # Build the new state aside and swap it in
+            counts = self.counts.copy()
+            counts[score] += n
+            keys = keys[:i] + [score] + keys[i:]
+            tree = self._build(keys, counts)
+            self._keys, self._tree, self.counts = keys, tree, counts
+        else:
+            tree = self._tree
+            size = len(keys)
+            i += 1
+            while i <= size:
+                tree[i] += n
+                i += i & -i
+            self.counts[score] += n
+        self.total += n
+
+    def count_greater(self, score: int) -> int:
+        """Number of recorded entries with a strictly higher score"""
+        return self.total - self._prefix(bisect_right(self._keys, score))
+
+    def rank(self, score: int) -> int:
+        """1-indexed rank a ``score`` would have among the recorded entries"""
+        return self.count_greater(score) + 1
+
+
+class LeaderboardIndex:
+    """Per-mode score index shared by all requests of a worker process.
+
+    The lock is never held across database IO (in async mode queries run on
+    the event loop thread). Instead, every write to a mode is bracketed by
+    ``writing``, and loads from the table are only installed for modes that
+    saw no write activity while the load was running.
+    """
+
+    # Attempts at a quiet load in ``ensure`` before installing regardless
+    ENSURE_ATTEMPTS = 3
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._modes: dict[str, ScoreCounts] = {}
+        self._in_flight: Counter = Counter()
+        self._write_seq: Counter = Counter()
+        self.last_reconciled: Optional[float] = None
+
+    def reset(self) -> None:
+        """Drop all cached modes (they will be re-warmed on next use)"""
+        with self._lock:
+            self._modes.clear()
+            self._in_flight.clear()
+            self._write_seq.clear()
+            self.last_reconciled = None
+
+    def is_warm(self, mode: str) -> bool:
+        return mode in self._modes
+
+    @staticmethod
+    def _load_counts(db: Session, mode: Optional[str] = None) -> dict[str, dict[int, int]]:
+        query = db.query(
+            LeaderboardEntry.mode, LeaderboardEntry.score, func.count()
+        ).group_by(LeaderboardEntry.mode, LeaderboardEntry.score)
+        if mode is not None:
+            query = query.filter(LeaderboardEntry.mode == mode)
+        counts: dict[str, dict[int, int]] = {}
+        for entry_mode, score, n in query:
+            counts.setdefault(entry_mode, {})[score] = n
+        return counts
+
+    def _write_marks(self) -> tuple[dict[str, int], set[str]]:
+        """Snapshot of per-mode write sequence numbers and busy modes"""
+        with self._lock:
+            busy = {mode for mode, n in self._in_flight.items() if n}
+            return dict(self._write_seq), busy
+
+    def _is_quiet(self, mode: str, marks: tuple[dict[str, int], set[str]]) -> bool:
+        seqs, busy = marks
+        return mode not in busy and self._write_seq[mode] == seqs.get(mode, 0)
+
+    def _refresh(self, db: Session, only_drifted: bool) -> list[str]:
+        marks = self._write_marks()
+        counts = self._load_counts(db)
+        replaced = []
+        with self._lock:
+            for mode in set(self._modes) | set(counts):
+                if not self._is_quiet(mode, marks):
+                    continue
+                fresh = counts.get(mode, {})
+                current = self._modes.get(mode)
+                # ``+`` skips scores whose entries were all taken out again
+                if only_drifted and current is not None and dict(+current.counts) == fresh:
+                    continue
+                self._modes[mode] = ScoreCounts(fresh)
+                replaced.append(mode)
+            self.last_reconciled = time.monotonic()
+        return replaced
+
+    def warm(self, db: Session) -> None:
+        """Load every mode present in the table"""
+        self._refresh(db, only_drifted=False)
+
+    def ensure(self, db: Session, mode: str) -> None:
+        """Warm ``mode`` from the table if it has not been loaded yet.
+
+        Must be called before the caller's own entry is committed, otherwise
+        that entry would be counted twice once ``add`` is called.
+        """
+        for attempt in range(self.ENSURE_ATTEMPTS):
+            if mode in self._modes:
+                return
+            marks = self._write_marks()
+            counts = self._load_counts(db, mode).get(mode, {})
+            with self._lock:
+                if mode in self._modes:
+                    return
+                # Under sustained writes, install anyway and leave any miss
+                # to the next reconciliation rather than never warming.
+                if self._is_quiet(mode, marks) or attempt == self.ENSURE_ATTEMPTS - 1:
+                    self._modes[mode] = ScoreCounts(counts)
+                    return
+
+    def begin_write(self, mode: str) -> None:
+        """Mark a write to ``mode`` as in flight until ``end_write``"""
+        with self._lock:
+            self._in_flight[mode] += 1
+            self._write_seq[mode] += 1
+
+    def end_write(self, mode: str) -> None:
+        with self._lock:
+            self._in_flight[mode] -= 1
+            self._write_seq[mode] += 1
+
+    @contextmanager
+    def writing(self, mode: str):
+        """Mark a write to ``mode`` as in flight while the caller commits it.
+
+        Loads that overlap a write skip that mode, since a row that is
+        committed but not yet ``add``-ed (or ``add``-ed but not yet
+        committed) would otherwise be miscounted.
+        """
+        self.begin_write(mode)
+        try:
+            yield
+        finally:
+            self.end_write(mode)
+
+    def add(self, mode: str, score: int, n: int = 1) -> None:
+        with self._lock:
+            counts = self._modes.get(mode)
+            if counts is not None:
+                counts.add(score, n)
+
+    def rank(self, mode: str, score: int) -> Optional[int]:
+        """1-indexed rank of ``score`` in ``mode``, or None if not warmed"""
+        with self._lock:
+            counts = self._modes.get(mode)
+            if counts is None:
+                return None
+            return counts.rank(score)
+
+    def reconcile(self, db: Session) -> list[str]:
+        """Re-read the table and replace any mode whose counts have drifted.
+
+        Returns the list of modes that were corrected.
+        """
+        drifted = self._refresh(db, only_drifted=True)
+        if drifted:
+            logger.info("Leaderboard index reconciled modes: %s", ", ".join(sorted(drifted)))
+        return drifted
+
+
+async def reconcile_periodically(
+    index: LeaderboardIndex,
+    session_factory: Callable[[], Session],
+    interval: float = RECONCILE_INTERVAL,
+) -> None:
+    """Background loop that reconciles ``index`` every ``interval`` seconds"""
+
+    def run_once():
+        db = session_factory()
+        try:
+            index.reconcile(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception:
+            logger.exception("Leaderboard index reconciliation failed")
+
+
+leaderboard_index = LeaderboardIndex()
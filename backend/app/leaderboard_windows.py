@@ -0,0 +1,206 @@
+"""Pre-aggregated top-K boards for the current day, week and month.
+
+``GET /leaderboard?window=...`` is served from an in-memory bucket per
+``(mode, window)`` holding the best ``LEADERBOARD_WINDOW_TOP_K`` entries of
+the current period, so a window board costs the same as the all-time one
+instead of a date range scan plus sort. There are buckets for each of the
+game's modes and for all modes together; any other mode is read from the
+table. Buckets are loaded from the table lazily, kept up to date by every
+score write, and reloaded by a background task at each period boundary and
+every ``LEADERBOARD_WINDOW_REFRESH_SECONDS`` (to pick up writes from other
+workers), after which the cached window boards are dropped. Periods follow
+server local time, like ``LeaderboardEntry.date``; weeks start on Monday.
+"""
+import asyncio
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from .database import LeaderboardEntry
+from .engine.rules import MODES
+from .leaderboard_cache import LeaderboardCache, leaderboard_cache
+from .schemas import LeaderboardEntrySchema
+
+logger = logging.getLogger(__name__)
+
+WINDOWS = ("day", "week", "month")
+
+# Entries kept per (mode, window); larger limits are read from the table
+TOP_K = int(os.getenv("LEADERBOARD_WINDOW_TOP_K", "100"))
+# Seconds between background reloads of all buckets (0 disables the task)
+REFRESH_INTERVAL = float(os.getenv("LEADERBOARD_WINDOW_REFRESH_SECONDS", "60"))
+
+
+def window_start(window: str, now: Optional[datetime] = None) -> datetime:
+    """Start of the period of ``window`` containing ``now``"""
+    now = now or datetime.now()
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if window == "day":
+        return day
+    if window == "week":
+        return day - timedelta(days=day.weekday())
+    if window == "month":
+        return day.replace(day=1)
+    raise ValueError(f"Unknown window: {window!r}")
+
+
+def next_rollover(now: Optional[datetime] = None) -> datetime:
+    """When the next period starts (days roll over first, always)"""
+    return window_start("day", now) + timedelta(days=1)
+
+
+def _sort_key(entry: LeaderboardEntrySchema):
+    return entry.score, entry.date, entry.id
+
+
+def load_window(db: Session, mode: Optional[str], start: datetime, limit: int) -> list[LeaderboardEntrySchema]:
+    """Top ``limit`` entries of ``mode`` (all modes if None) dated ``start`` or later"""
+    query = db.query(LeaderboardEntry).filter(LeaderboardEntry.date >= start)
+    if mode is not None:
+        query = query.filter(LeaderboardEntry.mode == mode)
+    entries = query.order_by(
+        LeaderboardEntry.score.desc(), LeaderboardEntry.date.desc(), LeaderboardEntry.id.desc()
+    ).limit(limit)
+    return [LeaderboardEntrySchema(**entry.to_dict()) for entry in entries]
+
+
+class _Bucket:
+    """Best entries of one mode (or all) since ``start``, best first"""
+
+    __slots__ = ("start", "entries", "ids")
+
+    def __init__(self, start: datetime, entries: list[LeaderboardEntrySchema]):
+        self.start = start
+        self.entries = entries
+        self.ids = {entry.id for entry in entries}
+
+    def add(self, entry: LeaderboardEntrySchema, top_k: int) -> None:
+        if entry.date < self.start or entry.id in self.ids:
+            return
+        if len(self.entries) >= top_k and _sort_key(entry) <= _sort_key(self.entries[-1]):
+            return
+        self.entries.append(entry)
+        self.entries.sort(key=_sort_key, reverse=True)
+        self.ids.add(entry.id)
+        while len(self.entries) > top_k:
+            self.ids.discard(self.entries.pop().id)
+
+
+class LeaderboardWindows:
+    """Per-(mode, window) top-K buckets shared by all requests of a worker.
+
+    Modes are the game's ``MODES`` plus None for all modes together.
+
+    As with ``LeaderboardIndex`` the lock is never held across database IO.
+    Entries added while a bucket is being loaded are collected and merged
+    into the loaded rows (deduplicated by id), so a load never misses a
+    write that raced it.
+    """
+
+    def __init__(self, top_k: int = TOP_K):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._buckets: dict[tuple[Optional[str], str], _Bucket] = {}
+        self._loading: list[tuple[Optional[str], list[LeaderboardEntrySchema]]] = []
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._loading.clear()
+
+    @staticmethod
+    def covers(mode: Optional[str]) -> bool:
+        """Whether ``mode`` has buckets (other modes are read from the table)"""
+        return mode is None or mode in MODES
+
+    def _current(self, mode: Optional[str], window: str, now: Optional[datetime]) -> Optional[_Bucket]:
+        bucket = self._buckets.get((mode, window))
+        if bucket is None or bucket.start != window_start(window, now):
+            return None
+        return bucket
+
+    def _load(self, db: Session, mode: Optional[str], window: str, now: Optional[datetime]) -> None:
+        start = window_start(window, now)
+        pending: list[LeaderboardEntrySchema] = []
+        registration = (mode, pending)
+        with self._lock:
+            self._loading.append(registration)
+        try:
+            entries = load_window(db, mode, start, self.top_k)
+        finally:
+            with self._lock:
+                self._loading.remove(registration)
+        with self._lock:
+            bucket = _Bucket(start, entries)
+            for entry in pending:
+                bucket.add(entry, self.top_k)
+            self._buckets[(mode, window)] = bucket
+
+    def ensure(self, db: Session, mode: Optional[str], window: str, now: Optional[datetime] = None) -> None:
+        """Load the current period of ``(mode, window)`` if it isn't loaded"""
+        if self.covers(mode) and self._current(mode, window, now) is None:
+            self._load(db, mode, window, now)
+
+    def refresh(self, db: Session, now: Optional[datetime] = None) -> None:
+        """Reload every bucket, rolling over to the current periods"""
+        for mode in (*MODES, None):
+            for window in WINDOWS:
+                self._load(db, mode, window, now)
+
+    def add(self, entries: Iterable[dict]) -> None:
+        """Record committed entries (``LeaderboardEntry`` column dicts)"""
+        with self._lock:
+            for entry in entries:
+                entry = LeaderboardEntrySchema(**entry)
+                for (mode, _), bucket in self._buckets.items():
+                    if mode in (None, entry.mode):
+                        bucket.add(entry, self.top_k)
+                for mode, pending in self._loading:
+                    if mode in (None, entry.mode):
+                        pending.append(entry)
+
+    def top(
+        self, mode: Optional[str], window: str, limit: int, now: Optional[datetime] = None
+    ) -> Optional[list[LeaderboardEntrySchema]]:
+        """Best ``limit`` entries of the current period (all modes if
+        ``mode`` is None), or None if that needs a load or the table"""
+        if limit > self.top_k or not self.covers(mode):
+            return None
+        with self._lock:
+            bucket = self._current(mode, window, now)
+            return bucket.entries[:limit] if bucket is not None else None
+
+
+async def refresh_windows_periodically(
+    windows: LeaderboardWindows,
+    session_factory: Callable[[], Session],
+    interval: float = REFRESH_INTERVAL,
+    cache: LeaderboardCache = leaderboard_cache,
+) -> None:
+    """Background loop reloading ``windows`` every ``interval`` seconds and
+    right after each period boundary, then dropping the window boards
+    ``cache`` built from the old buckets"""
+
+    def run_once():
+        db = session_factory()
+        try:
+            windows.refresh(db)
+        finally:
+            db.close()
+
+    while True:
+        until_rollover = (next_rollover() - datetime.now()).total_seconds()
+        await asyncio.sleep(max(0.0, min(interval, until_rollover + 0.01)))
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception:
+            logger.exception("Leaderboard window refresh failed")
+        else:
+            cache.invalidate_windows()
+
+
+leaderboard_windows = LeaderboardWindows()
@@ -0,0 +1,261 @@
+"""Per-route request metrics in the Prometheus text format.
+
+``MetricsMiddleware`` times every HTTP request and labels it with its route
+template (``/players/{playerId}``, not the concrete path), and SQLAlchemy
+cursor events attached by ``instrument_engine`` count the queries each
+request issues and the time spent in them. The request's tally lives in a
+context variable, which the threadpool and ``run_sync`` both carry over, so
+queries are attributed to the request that ran them without passing
+anything around.
+
+A request that runs the same statement ``METRICS_N_PLUS_ONE_THRESHOLD``
+times or more is counted as a likely N+1 (a lazy load or a query in a loop)
+and logged once per route and statement. The game host also records how
+late each batch of game ticks ran (``record_tick``). Everything is per
+worker process; ``GET /metrics`` exposes it for scraping.
+"""
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import Engine, event
+
+logger = logging.getLogger(__name__)
+
+# Record request metrics and serve GET /metrics
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+# Executions of one statement within a request reported as an N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "5"))
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+TICK_LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class RequestTally:
+    """Queries run on behalf of one request"""
+
+    __slots__ = ("queries", "db_seconds", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.statements: Counter[str] = Counter()
+
+
+_current: ContextVar[Optional[RequestTally]] = ContextVar("request_tally", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    tally = _current.get()
+    if tally is None:
+        return
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        tally.db_seconds += time.perf_counter() - started
+    tally.queries += 1
+    tally.statements[statement] += 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attribute ``engine``'s queries to the current request (idempotent)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class _Histogram:
+    __slots__ = ("counts", "sum")
+
+    def __init__(self, buckets: tuple):
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+
+
+class Metrics:
+    """Thread-safe registry of per-route request metrics"""
+
+    def __init__(self, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._requests: Counter[tuple[str, str, int]] = Counter()
+            self._latency: dict[tuple[str, str], _Histogram] = {}
+            self._queries: dict[tuple[str, str], _Histogram] = {}
+            self._db_seconds: Counter[tuple[str, str]] = Counter()
+            self._n_plus_one: Counter[tuple[str, str]] = Counter()
+            self._reported: set[tuple[str, str, str]] = set()
+            self._tick_lag: dict[tuple[str], _Histogram] = {}
+            self._game_ticks: Counter[tuple[str]] = Counter()
+
+    @staticmethod
+    def _observe(histograms: dict, key: tuple, buckets: tuple, value: float) -> None:
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = _Histogram(buckets)
+        histogram.counts[bisect_left(buckets, value)] += 1
+        histogram.sum += value
+
+    def record(self, method: str, route: str, status: int, seconds: float, tally: RequestTally) -> None:
+        key = (method, route)
+        repeated = [
+            (statement, count) for statement, count in tally.statements.items()
+            if count >= self.n_plus_one_threshold
+        ]
+        with self._lock:
+            self._requests[(method, route, status)] += 1
+            self._observe(self._latency, key, LATENCY_BUCKETS, seconds)
+            self._observe(self._queries, key, QUERY_BUCKETS, tally.queries)
+            self._db_seconds[key] += tally.db_seconds
+            if repeated:
+                self._n_plus_one[key] += 1
+            new = [(s, c) for s, c in repeated if (method, route, s) not in self._reported]
+            self._reported.update((method, route, s) for s, _ in new)
+        for statement, count in new:
+            logger.warning(
+                "Possible N+1 in %s %s: statement ran %d times in one request: %s",
+                method, route, count, " ".join(statement.split()),
+            )
+
+    def record_tick(self, shard: int, lag: float, games: int) -> None:
+        """One scheduler slot of ``games`` stepped ``lag`` seconds late"""
+        key = (str(shard),)
+        with self._lock:
+            self._observe(self._tick_lag, key, TICK_LAG_BUCKETS, lag)
+            self._game_ticks[key] += games
+
+    def n_plus_one(self, method: str, route: str) -> int:
+        with self._lock:
+            return self._n_plus_one[(method, route)]
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        lines: list[str] = []
+        with self._lock:
+            lines += [
+                "# HELP http_requests_total HTTP requests by route and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route, status), count in sorted(self._requests.items()):
+                lines.append(f"http_requests_total{_labels(method, route, status=status)} {count}")
+            _histogram_lines(
+                lines, "http_request_duration_seconds", "Time to serve a request, body included.",
+                self._latency, LATENCY_BUCKETS,
+            )
+            _histogram_lines(
+                lines, "http_request_db_queries", "SQL statements executed per request.",
+                self._queries, QUERY_BUCKETS,
+            )
+            lines += [
+                "# HELP http_request_db_seconds_total Time spent executing SQL, by route.",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for (method, route), seconds in sorted(self._db_seconds.items()):
+                lines.append(f"http_request_db_seconds_total{_labels(method, route)} {seconds:.6f}")
+            lines += [
+                "# HELP http_request_n_plus_one_total Requests that repeated one statement "
+                f"{self.n_plus_one_threshold} times or more.",
+                "# TYPE http_request_n_plus_one_total counter",
+            ]
+            for (method, route), count in sorted(self._n_plus_one.items()):
+                lines.append(f"http_request_n_plus_one_total{_labels(method, route)} {count}")
+            if self._tick_lag:
+                _histogram_lines(
+                    lines, "game_tick_lag_seconds", "How late each batch of game ticks ran, by shard.",
+                    self._tick_lag, TICK_LAG_BUCKETS, _shard_labels,
+                )
+                lines += [
+                    "# HELP game_ticks_total Game moves stepped, by shard.",
+                    "# TYPE game_ticks_total counter",
+                ]
+                for key, count in sorted(self._game_ticks.items()):
+                    lines.append(f"game_ticks_total{_shard_labels(*key)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(method: str, route: str, **extra) -> str:
+    pairs = [("method", method), ("route", route), *extra.items()]
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _shard_labels(shard: str, **extra) -> str:
+    pairs = [("shard", shard), *extra.items()]
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + "}"
+
+
+def _histogram_lines(
+    lines: list[str], name: str, help_text: str, histograms: dict, buckets: tuple, labels=_labels,
+) -> None:
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for key, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip([*buckets, "+Inf"], histogram.counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{labels(*key, le=bound)} {cumulative}")
+        lines.append(f"{name}_sum{labels(*key)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{labels(*key)} {cumulative}")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording every HTTP request into ``metrics``.
+
+    Written against raw ASGI rather than ``BaseHTTPMiddleware`` so the
+    request's context variable is the one the route (and its threadpool
+    work) sees, and so streamed bodies are timed to their last chunk.
+    """
+
+    def __init__(self, app, metrics: "Metrics"):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        tally = RequestTally()
+        token = _current.set(tally)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # Route templates keep the label set bounded; unmatched paths share one
+            route = scope.get("route")
+            self.metrics.record(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status,
+                time.perf_counter() - start,
+                tally,
+            )
+
+
+metrics = Metrics()
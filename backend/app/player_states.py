@@ -0,0 +1,262 @@
+"""Coalesced active-player state updates and their throttled write-back.
+
+Game servers post the state of many players at once to
+``POST /players/states:batch``. ``PlayerStates`` keeps the latest state of
+each player in memory and publishes what changed to watch mode straight
+away through ``player_feed``; reads of ``/players`` overlay these states on
+the rows. A background task started by the app lifespan writes the players
+that changed since the last flush to ``active_players`` every
+``PLAYER_STATE_FLUSH_INTERVAL_SECONDS``, with one UPDATE (a CASE on the id
+per column) for up to ``PLAYER_STATE_FLUSH_BATCH_SIZE`` players, however
+many moves arrived in between. Shutdown flushes what is left; states not
+yet flushed are lost if the process dies, and the rows keep the previous
+flush.
+
+If the database rejects a batch (a constraint or a value out of range),
+it is split in halves until the offending players are found; their states
+are dropped, so the next update reloads them from their rows, and the
+rest is written. Any other failure leaves the unwritten players dirty, to
+be retried.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Iterable, NamedTuple, Optional, Sequence
+
+from sqlalchemy import case
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import ActivePlayer
+from .pubsub import PlayerFeed, player_feed
+from .snake_codec import encode_snake
+
+logger = logging.getLogger(__name__)
+
+# The longest a changed state waits before it is written
+FLUSH_INTERVAL = float(os.getenv("PLAYER_STATE_FLUSH_INTERVAL_SECONDS", "1.0"))
+# Most players written by one UPDATE
+FLUSH_BATCH_SIZE = int(os.getenv("PLAYER_STATE_FLUSH_BATCH_SIZE", "500"))
+# How long shutdown waits for the last flush
+DRAIN_TIMEOUT = float(os.getenv("PLAYER_STATE_DRAIN_SECONDS", "10"))
+
+
+class PlayerState(NamedTuple):
+    player: dict  # ActivePlayerSchema JSON
+    snake_data: bytes
+    updated_at: datetime
+
+
+def write_states(db: Session, states: dict[str, PlayerState]) -> int:
+    """Write ``states`` (by player id) with one UPDATE, without committing;
+    returns how many rows matched"""
+
+    def column(value: Callable[[PlayerState], object]):
+        return case({player_id: value(state) for player_id, state in states.items()}, value=ActivePlayer.id)
+
+    return db.query(ActivePlayer).filter(ActivePlayer.id.in_(states)).update({
+        ActivePlayer.current_score: column(lambda s: s.player["current_score"]),
+        ActivePlayer.snake_data: column(lambda s: s.snake_data),
+        ActivePlayer.snake_json: None,
+        ActivePlayer.food_x: column(lambda s: s.player["food"]["x"]),
+        ActivePlayer.food_y: column(lambda s: s.player["food"]["y"]),
+        ActivePlayer.direction: column(lambda s: s.player["direction"]),
+        ActivePlayer.is_playing: column(lambda s: s.player["is_playing"]),
+        ActivePlayer.updated_at: column(lambda s: s.updated_at),
+    }, synchronize_session=False)
+
+
+class PlayerStates:
+    """Latest state of each player seen, and which ones are not written yet.
+
+    A player must be ``remember``-ed from its row before updates are
+    accepted for it, so partial updates have a full state to apply to and
+    updates for unknown ids are refused rather than buffered. Each change
+    bumps the player's version; a flush only marks a player clean if no
+    update arrived while it was being written.
+    """
+
+    def __init__(
+        self,
+        feed: PlayerFeed = player_feed,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        interval: float = FLUSH_INTERVAL,
+    ):
+        self.feed = feed
+        self.batch_size = batch_size
+        self.interval = interval
+        self.closed = False
+        self.flushed = 0
+        self.dropped = 0
+        self._states: dict[str, PlayerState] = {}
+        self._versions: dict[str, int] = {}
+        self._dirty: dict[str, int] = {}  # player id -> version not yet written
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        """Players with changes not written yet"""
+        return len(self._dirty)
+
+    def reset(self) -> None:
+        """Forget every state (tests and app re-creation)"""
+        self._states.clear()
+        self._versions.clear()
+        self._dirty.clear()
+        self.closed = False
+        self._task = None
+
+    def unknown(self, player_ids: Iterable[str]) -> set[str]:
+        """Which of ``player_ids`` have to be loaded before updating them"""
+        return {player_id for player_id in player_ids if player_id not in self._states}
+
+    def remember(self, player: dict, snake_data: bytes) -> None:
+        """Start from a player's row (ignored if a newer state is held)"""
+        if player["id"] not in self._states:
+            self._states[player["id"]] = PlayerState(player, snake_data, datetime.now())
+
+    def get(self, player_id: str) -> Optional[dict]:
+        state = self._states.get(player_id)
+        return state.player if state else None
+
+    def overlay(self, players: list[dict]) -> list[dict]:
+        """``players`` (as read from the table) with the latest states in place"""
+        if not self._states:
+            return players
+        return [self.get(player["id"]) or player for player in players]
+
+    def active(self, players: list[dict]) -> list[dict]:
+        """The active players read from the table, corrected for games that
+        started or ended since the last flush"""
+        if not self._states:
+            return players
+        listed = {player["id"] for player in players}
+        merged = self.overlay(players)
+        merged += [state.player for player_id, state in self._states.items() if player_id not in listed]
+        return [player for player in merged if player["is_playing"]]
+
+    def submit(self, updates: Sequence[dict]) -> int:
+        """Apply ``updates`` (partial player JSON with an ``id``) in order and
+        publish each player's resulting state once; returns how many
+        players changed. Every id must have been remembered. Raises
+        ValueError, changing nothing, if a snake can't be packed."""
+        merged: dict[str, dict] = {}
+        for update in updates:
+            player_id = update["id"]
+            merged[player_id] = {**(merged.get(player_id) or self._states[player_id].player), **update}
+        snakes = {
+            player_id: encode_snake(player["snake"])
+            for player_id, player in merged.items()
+            if player["snake"] is not self._states[player_id].player["snake"]
+        }
+
+        now = datetime.now()
+        changed = 0
+        for player_id, player in merged.items():
+            state = self._states[player_id]
+            snake_data = snakes.get(player_id, state.snake_data)
+            if player == state.player:
+                continue
+            self._states[player_id] = PlayerState(player, snake_data, now)
+            version = self._versions.get(player_id, 0) + 1
+            self._versions[player_id] = self._dirty[player_id] = version
+            self.feed.publish_state(player, snake_data=snake_data)
+            changed += 1
+        if len(self._dirty) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return changed
+
+    @staticmethod
+    def _write(session_factory: Callable[[], Session], states: dict[str, PlayerState]) -> int:
+        db = session_factory()
+        try:
+            matched = write_states(db, states)
+            db.commit()
+            return matched
+        finally:
+            db.close()
+
+    def _forget(self, player_id: str, version: int) -> None:
+        """Mark a written player clean unless it changed while being written"""
+        if self._dirty.get(player_id) == version:
+            del self._dirty[player_id]
+            # Finished games are in the table now; nothing left to overlay
+            if not self._states[player_id].player["is_playing"]:
+                del self._states[player_id]
+                del self._versions[player_id]
+
+    def _drop(self, player_id: str, version: int) -> None:
+        """Give up on a state the database rejects; the player's next update
+        starts over from its row"""
+        logger.error("Dropping player state the database rejects: %s", player_id, exc_info=True)
+        self.dropped += 1
+        if self._dirty.get(player_id) == version:
+            del self._dirty[player_id]
+            del self._states[player_id]
+            del self._versions[player_id]
+
+    async def flush(self, session_factory: Callable[[], Session]) -> int:
+        """Write up to one batch of changed players; returns how many were
+        written or dropped"""
+        batch = list(self._dirty.items())[:self.batch_size]
+        if not batch:
+            return 0
+        # Halves still to write, the next one last
+        chunks = [batch]
+        while chunks:
+            chunk = chunks.pop()
+            states = {player_id: self._states[player_id] for player_id, _ in chunk}
+            try:
+                await asyncio.to_thread(self._write, session_factory, states)
+            except (IntegrityError, DataError):
+                if len(chunk) == 1:
+                    self._drop(*chunk[0])
+                else:
+                    half = len(chunk) // 2
+                    chunks += [chunk[half:], chunk[:half]]
+            else:
+                for player_id, version in chunk:
+                    self._forget(player_id, version)
+                self.flushed += len(chunk)
+        return len(batch)
+
+    async def _run(self, session_factory: Callable[[], Session]) -> None:
+        while not (self.closed and not self._dirty):
+            if not self.closed:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+            try:
+                # Only what is dirty now, so a steady stream of moves can't
+                # keep one flush going
+                for _ in range(-(-len(self._dirty) // self.batch_size)):
+                    await self.flush(session_factory)
+            except Exception:
+                logger.exception("Writing %d player states failed; will retry", len(self._dirty))
+                await asyncio.sleep(self.interval)
+
+    def start(self, session_factory: Callable[[], Session]) -> asyncio.Task:
+        """Start the background flusher on the running loop"""
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(session_factory))
+        return self._task
+
+    async def close(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """Write out what is left and stop the flusher"""
+        self.closed = True
+        if self._task is None:
+            return
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.error("Player states not written in %.1fs; %d players keep their last flush", timeout, len(self._dirty))
+        self._task = None
+
+
+player_states = PlayerStates()
@@ -0,0 +1,256 @@
+"""In-process pub/sub hub for live watch-mode updates.
+
+Spectators subscribe to a topic (the lobby, or a single player) over a
+WebSocket and receive JSON text messages. Messages are serialized once per
+publish and fanned out to per-subscriber bounded queues. A spectator too
+slow to keep up doesn't hold up the publisher: its subscription is ended
+once its queue is full, since skipping messages would leave it patching
+snake deltas onto a body it never got, and the client resubscribes for a
+fresh snapshot.
+``publish`` is thread-safe, so sync ORM code running on the threadpool can
+publish directly.
+
+Attached to a shared backend (``SHARED_STATE_URL``), every message is also
+broadcast to the other workers, which deliver it to their own spectators,
+so a spectator sees updates whichever worker handled them. ``PlayerFeed``
+diffs against the last state published by its own worker, so each
+player's updates should keep going through one worker.
+"""
+import asyncio
+import json
+import os
+import threading
+from typing import Callable, Optional
+
+from .shared_state import SharedState
+from .snake_codec import decode_snake, diff_snake, encode_snake
+
+# Messages buffered per spectator before its subscription is ended
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("WATCH_SUBSCRIBER_QUEUE_SIZE", "256"))
+
+LOBBY_TOPIC = "players"
+WATCH_CHANNEL = "watch"
+
+
+def player_topic(player_id: str) -> str:
+    return f"players:{player_id}"
+
+
+class Subscription:
+    """A subscriber's queue of messages on one or more topics"""
+
+    def __init__(
+        self, hub: "PubSubHub", topics: tuple[str, ...], maxsize: int,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ):
+        self.hub = hub
+        self.topics = topics
+        self.loop = loop if loop is not None else asyncio.get_running_loop()
+        self.dropped = 0
+        self.closed = False
+        # Ended because the queue filled up (see the module docstring)
+        self.overflowed = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+
+    def _deliver(self, message: Optional[str]) -> None:
+        """Enqueue on the subscriber's loop, ending the subscription if full"""
+        if self.overflowed:
+            return
+        if not self._queue.full():
+            self._queue.put_nowait(message)
+            return
+        if message is not None:
+            self.overflowed = self.closed = True
+            self.hub._unsubscribe(self)
+            # What is queued can't be applied without the message lost here
+            self.dropped += self._queue.qsize() + 1
+            while not self._queue.empty():
+                self._queue.get_nowait()
+        else:
+            # The end-of-stream marker from ``close`` has to get in
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(None)
+
+    async def get(self) -> Optional[str]:
+        """Next message, or None once the subscription is closed"""
+        if self.closed and self._queue.empty():
+            return None
+        return await self._queue.get()
+
+    def close(self) -> None:
+        """Unsubscribe and wake up any pending ``get``"""
+        if self.closed:
+            return
+        self.closed = True
+        self.hub._unsubscribe(self)
+        self.hub._send(self, None)
+
+
+class PubSubHub:
+    """Topic -> subscribers registry"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._topics: dict[str, set[Subscription]] = {}
+        self._state: Optional[SharedState] = None
+        self._stop_remote: Optional[Callable[[], None]] = None
+
+    def attach(self, state: SharedState) -> None:
+        """Exchange messages with the other workers using ``state`` (a no-op
+        for the in-process backend)"""
+        self.detach()
+        if state.shared:
+            self._state = state
+            self._stop_remote = state.on_broadcast(WATCH_CHANNEL, self._on_remote)
+
+    def detach(self) -> None:
+        if self._stop_remote is not None:
+            self._stop_remote()
+            self._stop_remote = None
+        self._state = None
+
+    def subscribe(
+        self, *topics: str, maxsize: int = SUBSCRIBER_QUEUE_SIZE,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> Subscription:
+        """Subscribe the running event loop (or ``loop``, from another thread) to ``topics``"""
+        subscription = Subscription(self, topics, maxsize, loop)
+        with self._lock:
+            for topic in topics:
+                self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._topics.get(topic)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._topics[topic]
+
+    @staticmethod
+    def _send(subscription: Subscription, message: Optional[str]) -> None:
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is subscription.loop:
+            subscription._deliver(message)
+        elif not subscription.loop.is_closed():
+            subscription.loop.call_soon_threadsafe(subscription._deliver, message)
+
+    def subscriber_count(self, topic: str) -> int:
+        with self._lock:
+            return len(self._topics.get(topic, ()))
+
+    def publish(self, topic: str, message: dict) -> int:
+        """Send ``message`` to every subscriber of ``topic``; returns how
+        many subscribe in this worker"""
+        if self._state is not None:
+            text = json.dumps(message, separators=(",", ":"))
+            self._state.defer(self._state.broadcast, WATCH_CHANNEL, {"topic": topic, "text": text})
+            return self._deliver(topic, text)
+        return self._deliver(topic, message)
+
+    def publish_many(self, messages: list[tuple[str, str]]) -> None:
+        """Send already serialized ``(topic, text)`` pairs; other workers get
+        them as a single broadcast"""
+        if self._state is not None and messages:
+            self._state.defer(self._state.broadcast, WATCH_CHANNEL, {"messages": messages})
+        # One pass under the lock; most topics of a large batch have no subscriber
+        with self._lock:
+            deliveries = [
+                (list(subscribers), text) for topic, text in messages
+                if (subscribers := self._topics.get(topic))
+            ]
+        for subscribers, text in deliveries:
+            for subscription in subscribers:
+                self._send(subscription, text)
+
+    def _on_remote(self, payload: dict) -> None:
+        if "messages" in payload:
+            for topic, text in payload["messages"]:
+                self._deliver(topic, text)
+        else:
+            self._deliver(payload["topic"], payload["text"])
+
+    def _deliver(self, topic: str, message) -> int:
+        """Fan ``message`` (a dict, or already serialized) out to local subscribers"""
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        if not subscribers:
+            return 0
+        text = message if isinstance(message, str) else json.dumps(message, separators=(",", ":"))
+        for subscription in subscribers:
+            self._send(subscription, text)
+        return len(subscribers)
+
+    def clear(self) -> None:
+        with self._lock:
+            subscriptions = {s for subscribers in self._topics.values() for s in subscribers}
+        for subscription in subscriptions:
+            subscription.close()
+
+
+class PlayerFeed:
+    """Publishes active-player state changes as incremental updates.
+
+    Remembers the last state published for each player and only sends the
+    fields that changed, to both the player's topic and the lobby. The snake
+    is kept packed and sent as ``snake_delta`` (new head cells and tail
+    trim) when it just moved, or as a full ``snake`` otherwise.
+    """
+
+    def __init__(self, hub: PubSubHub):
+        self.hub = hub
+        self._lock = threading.Lock()
+        self._last: dict[str, tuple[dict, Optional[bytes]]] = {}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._last.clear()
+
+    def publish_state(self, player: dict, snake_data: Optional[bytes] = None) -> Optional[dict]:
+        """Publish ``player`` (ActivePlayerSchema JSON) if anything changed.
+
+        ``snake_data`` may be passed instead of ``player["snake"]`` to skip
+        re-encoding an already packed body.
+        """
+        player_id = player["id"]
+        fields = {field: value for field, value in player.items() if field not in ("id", "snake")}
+        if snake_data is None and "snake" in player:
+            snake_data = encode_snake(player["snake"])
+        with self._lock:
+            previous, previous_snake = self._last.get(player_id, ({}, None))
+            changes = {
+                field: value for field, value in fields.items()
+                if previous.get(field) != value
+            }
+            if snake_data is None:
+                snake_data = previous_snake
+            elif snake_data != previous_snake:
+                delta = diff_snake(previous_snake, snake_data) if previous_snake is not None else None
+                if delta is not None:
+                    changes["snake_delta"] = delta.to_json()
+                else:
+                    changes["snake"] = decode_snake(snake_data)
+            self._last[player_id] = ({**previous, **fields}, snake_data)
+        if not changes:
+            return None
+        message = {"type": "update", "id": player_id, "changes": changes}
+        self.hub.publish(player_topic(player_id), message)
+        self.hub.publish(LOBBY_TOPIC, message)
+        return message
+
+    def publish_removed(self, player_id: str) -> None:
+        with self._lock:
+            self._last.pop(player_id, None)
+        message = {"type": "removed", "id": player_id}
+        self.hub.publish(player_topic(player_id), message)
+        self.hub.publish(LOBBY_TOPIC, message)
+
+
+hub = PubSubHub()
+player_feed = PlayerFeed(hub)
@@ -1,16 +1,51 @@
 """Authentication routes using SQLAlchemy"""
 from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from typing import Optional
+from datetime import datetime
+import os
+import secrets
 import uuid
-from .database import get_db, User, Session as SessionModel
-from .schemas import LoginRequest, SignupRequest, AuthResult, UserSchema
+from . import sessions
+from .database import get_db, run_db, User, Session as SessionModel
+from .schemas import LoginRequest, SignupRequest, AuthResult, UserSchema, SessionCacheStatsSchema
+from .session_cache import CurrentUser, session_cache
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# Shared secret for service-to-service endpoints (tournament and import
+# tooling); those endpoints are disabled while it is unset
+SERVICE_TOKEN = os.getenv("SERVICE_TOKEN", "")
 
-def get_current_user(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> User:
-    """Get current authenticated user from token"""
+
+def _load_session_user(db: Session, token: str) -> Optional[tuple[CurrentUser, Optional[datetime]]]:
+    """Look up a live session and its user in a single query"""
+    row = (
+        db.query(SessionModel, User)
+        .join(User, SessionModel.user_id == User.id)
+        .filter(SessionModel.token == token)
+        .first()
+    )
+    if not row:
+        return None
+
+    session, user = row
+    now = datetime.now()
+    expires_at = sessions.expires_at(session)
+    if expires_at is not None and expires_at <= now:
+        return None
+
+    current = CurrentUser.from_model(user)
+    renewed = sessions.renew(db, session, now)
+    if renewed is not None:
+        db.commit()
+        expires_at = renewed
+    return current, expires_at
+
+
+async def get_session_token(authorization: Optional[str] = Header(None)) -> str:
+    """The bearer token of the request"""
     if not authorization:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,28 +61,53 @@ def get_current_user(authorization: Optional[str] = Header(None), db: Session =
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authorization header",
         )
+    return token
 
-    # Look up session in database
-    session = db.query(SessionModel).filter(SessionModel.token == token).first()
-    if not session:
+
+async def get_current_user(token: str = Depends(get_session_token), db: Session = Depends(get_db)) -> CurrentUser:
+    """Get current authenticated user from token"""
+    user = session_cache.get(token)
+    if user is None and session_cache.shared:
+        user = await run_in_threadpool(session_cache.get_shared, token)
+    if user is not None:
+        return user
+
+    found = await run_db(db, _load_session_user, token)
+    if not found:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
         )
 
-    user = session.user
-    if not user:
+    user, expires_at = found
+    session_cache.put(token, user, expires_at)
+    return user
+
+
+async def require_service_token(x_service_token: Optional[str] = Header(None)) -> None:
+    """Allow only callers presenting ``SERVICE_TOKEN`` in ``X-Service-Token``"""
+    if not SERVICE_TOKEN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Service endpoints are disabled",
+        )
+    if not x_service_token or not secrets.compare_digest(x_service_token, SERVICE_TOKEN):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token",
+            detail="Invalid service token",
         )
 
-    return user
 
+def _start_session(db: Session, user_id: str) -> str:
+    """Create and commit a session for ``user_id``, revoking any beyond the per-user cap"""
+    token, revoked = sessions.create_session(db, user_id)
+    db.commit()
+    for old_token in revoked:
+        session_cache.evict(old_token)
+    return token
 
-@router.post("/signup", response_model=AuthResult, status_code=201)
-def signup(request: SignupRequest, db: Session = Depends(get_db)) -> AuthResult:
-    """Sign up a new user"""
+
+def _signup(db: Session, request: SignupRequest) -> AuthResult:
     # Check if email already exists
     existing_email = db.query(User).filter(User.email == request.email).first()
     if existing_email:
@@ -69,11 +129,7 @@ def signup(request: SignupRequest, db: Session = Depends(get_db)) -> AuthResult:
     db.commit()
     db.refresh(user)
 
-    # Create session token
-    token = str(uuid.uuid4())
-    session = SessionModel(token=token, user_id=user.id)
-    db.add(session)
-    db.commit()
+    token = _start_session(db, user.id)
 
     return AuthResult(
         success=True,
@@ -88,19 +144,19 @@ def signup(request: SignupRequest, db: Session = Depends(get_db)) -> AuthResult:
     )
 
 
-@router.post("/login", response_model=AuthResult)
-def login(request: LoginRequest, db: Session = Depends(get_db)) -> AuthResult:
-    """Login with email and password"""
+@router.post("/signup", response_model=AuthResult, status_code=201)
+async def signup(request: SignupRequest, db: Session = Depends(get_db)) -> AuthResult:
+    """Sign up a new user"""
+    return await run_db(db, _signup, request)
+
+
+def _login(db: Session, request: LoginRequest) -> AuthResult:
     user = db.query(User).filter(User.email == request.email).first()
 
     if not user or user.password_hash != request.password:  # TODO: Use proper password verification
         return AuthResult(success=False, error="Invalid email or password")
 
-    # Create session token
-    token = str(uuid.uuid4())
-    session = SessionModel(token=token, user_id=user.id)
-    db.add(session)
-    db.commit()
+    token = _start_session(db, user.id)
 
     return AuthResult(
         success=True,
@@ -115,23 +171,35 @@ def login(request: LoginRequest, db: Session = Depends(get_db)) -> AuthResult:
     )
 
 
+@router.post("/login", response_model=AuthResult)
+async def login(request: LoginRequest, db: Session = Depends(get_db)) -> AuthResult:
+    """Login with email and password"""
+    return await run_db(db, _login, request)
+
+
+def _delete_session(db: Session, token: str) -> None:
+    session = db.query(SessionModel).filter(SessionModel.token == token).first()
+    if session:
+        db.delete(session)
+        db.commit()
+
+
 @router.post("/logout", status_code=204)
-def logout(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> None:
+async def logout(authorization: Optional[str] = Header(None), db: Session = Depends(get_db)) -> None:
     """Logout by deleting session token"""
     if authorization:
         try:
             scheme, token = authorization.split()
             if scheme.lower() == "bearer":
-                session = db.query(SessionModel).filter(SessionModel.token == token).first()
-                if session:
-                    db.delete(session)
-                    db.commit()
+                await run_db(db, _delete_session, token)
+                # Once the row is gone; lookups already in flight can't re-cache it
+                session_cache.evict(token)
         except ValueError:
             pass
 
 
 @router.get("/me", response_model=UserSchema)
-def get_current_user_info(user: User = Depends(get_current_user)) -> UserSchema:
+async def get_current_user_info(user: CurrentUser = Depends(get_current_user)) -> UserSchema:
     """Get current user information"""
     return UserSchema(
         id=user.id,
@@ -140,3 +208,13 @@ def get_current_user_info(user: User = Depends(get_current_user)) -> UserSchema:
         created_at=user.created_at,
         high_score=user.high_score,
     )
+
+
+@router.get(
+    "/session-cache",
+    response_model=SessionCacheStatsSchema,
+    dependencies=[Depends(require_service_token)],
+)
+async def get_session_cache_stats() -> SessionCacheStatsSchema:
+    """Get hit/miss counters of the token lookup cache"""
+    return SessionCacheStatsSchema(**session_cache.stats())
@@ -0,0 +1,147 @@
+"""Bulk export routes streaming NDJSON or CSV.
+
+Rows are read as plain tuples through a server-side cursor (``yield_per``)
+and encoded one partition at a time, so memory stays flat however many rows
+are exported: no ORM objects, no Pydantic models, no full result list.
+"""
+import csv
+import io
+import json
+import os
+from typing import AsyncIterator, Iterable, Iterator, Literal, Optional, Sequence
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import ColumnElement, DateTime, Select, select
+from sqlalchemy.orm import Session
+
+from .database import LeaderboardEntry, User, get_db
+from .routes_auth import require_service_token
+
+router = APIRouter(tags=["export"], dependencies=[Depends(require_service_token)])
+
+# Rows fetched from the cursor and encoded per chunk of the response
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+
+class _Encoder:
+    """Encodes partitions of result rows as NDJSON lines or CSV records"""
+
+    def __init__(self, fmt: ExportFormat, columns: Sequence[ColumnElement]):
+        self.fmt = fmt
+        self.names = [column.name for column in columns]
+        # Only datetime columns need converting (to ISO 8601, in both formats)
+        self._datetimes = [i for i, column in enumerate(columns) if isinstance(column.type, DateTime)]
+        self._dumps = json.JSONEncoder().encode
+
+    def _rows(self, rows: Iterable[Sequence]) -> Iterator[list]:
+        for row in rows:
+            row = list(row)
+            for i in self._datetimes:
+                if row[i] is not None:
+                    row[i] = row[i].isoformat()
+            yield row
+
+    def header(self) -> Optional[bytes]:
+        return self._csv([self.names]) if self.fmt == "csv" else None
+
+    @staticmethod
+    def _csv(rows: Iterable[Sequence]) -> bytes:
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode()
+
+    def chunk(self, rows: Sequence[Sequence]) -> bytes:
+        if self.fmt == "csv":
+            return self._csv(self._rows(rows))
+        names, dumps = self.names, self._dumps
+        return "".join([dumps(dict(zip(names, row))) + "\n" for row in self._rows(rows)]).encode()
+
+
+def _stream_sync(db: Session, statement: Select, encoder: _Encoder) -> Iterator[bytes]:
+    # The generator owns the session from here on: it may outlive the
+    # request scope, so it closes the session itself once done
+    try:
+        header = encoder.header()
+        if header:
+            yield header
+        # On the session's connection: plain Core rows skip the ORM loading layer
+        result = db.connection().execute(statement.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        for rows in result.partitions():
+            yield encoder.chunk(rows)
+    finally:
+        db.close()
+
+
+async def _stream_async(db, statement: Select, encoder: _Encoder) -> AsyncIterator[bytes]:
+    try:
+        header = encoder.header()
+        if header:
+            yield header
+        connection = await db.connection()
+        result = await connection.stream(statement.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+        async for rows in result.partitions():
+            yield encoder.chunk(rows)
+    finally:
+        await db.close()
+
+
+def _export(db, statement: Select, fmt: ExportFormat, name: str) -> StreamingResponse:
+    encoder = _Encoder(fmt, list(statement.selected_columns))
+    if hasattr(db, "run_sync"):
+        body = _stream_async(db, statement, encoder)
+    else:
+        # Starlette iterates sync generators on the threadpool
+        body = _stream_sync(db, statement, encoder)
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[fmt],
+        headers={
+            "Content-Disposition": f'attachment; filename="{name}.{fmt}"',
+            "Cache-Control": "no-store",
+        },
+    )
+
+
+@router.get("/leaderboard/export")
+async def export_leaderboard(
+    format: ExportFormat = Query("ndjson"),
+    mode: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    """Stream every leaderboard entry (optionally of one mode), best first
+    per mode (service token required)"""
+    statement = select(
+        LeaderboardEntry.id,
+        LeaderboardEntry.user_id,
+        LeaderboardEntry.username,
+        LeaderboardEntry.score,
+        LeaderboardEntry.mode,
+        LeaderboardEntry.date,
+    )
+    if mode:
+        statement = statement.where(LeaderboardEntry.mode == mode)
+    # Exactly the order of ix_leaderboard_entries_mode_score_date_id: no sort
+    statement = statement.order_by(
+        LeaderboardEntry.mode,
+        LeaderboardEntry.score.desc(),
+        LeaderboardEntry.date.desc(),
+        LeaderboardEntry.id.desc(),
+    )
+    return _export(db, statement, format, "leaderboard")
+
+
+@router.get("/users/export")
+async def export_users(
+    format: ExportFormat = Query("ndjson"),
+    db: Session = Depends(get_db),
+) -> StreamingResponse:
+    """Stream every user account, without password hashes (service token required)"""
+    statement = select(
+        User.id, User.username, User.email, User.high_score, User.created_at
+    ).order_by(User.id)
+    return _export(db, statement, format, "users")
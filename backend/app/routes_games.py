@@ -0,0 +1,87 @@
+"""Server-hosted game routes.
+
+Games are ticked by ``game_host`` and spectated like any active player:
+``/players/{id}`` and ``/players/{id}/stream`` serve them, and the lobby
+stream announces them as they start and end. A game ends with the session
+that started it.
+"""
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.responses import JSONResponse
+
+from .engine import parse_direction
+from .game_host import GameHostError, GameLimitError, game_host
+from .routes_auth import get_current_user, get_session_token
+from .schemas import ActivePlayerSchema, GameCreateRequest, GameDirectionRequest, GameHostStatsSchema
+from .session_cache import CurrentUser
+
+router = APIRouter(prefix="/games", tags=["games"])
+
+
+def _unavailable(exc: GameHostError) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(exc))
+
+
+def _owned_game(game_id: str, user: CurrentUser) -> None:
+    hosted = game_host.get(game_id)
+    if hosted is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
+    if hosted.user_id != user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not your game")
+
+
+@router.post("", response_model=ActivePlayerSchema, status_code=status.HTTP_201_CREATED)
+async def create_game(
+    request: GameCreateRequest,
+    user: CurrentUser = Depends(get_current_user),
+    token: str = Depends(get_session_token),
+) -> JSONResponse:
+    """Start a game on the server; it moves on its own until it ends, is
+    stopped, goes idle or the session ends"""
+    try:
+        game = await game_host.create_game(
+            user.id, user.username, request.mode, request.grid_size, request.seed, session=token,
+        )
+    except GameLimitError as exc:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(exc))
+    except GameHostError as exc:
+        raise _unavailable(exc)
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return JSONResponse(game, status_code=status.HTTP_201_CREATED)
+
+
+@router.get("/stats", response_model=GameHostStatsSchema)
+async def get_game_host_stats() -> GameHostStatsSchema:
+    """Hosted games and per-shard tick lag of this worker"""
+    return GameHostStatsSchema(**game_host.stats())
+
+
+@router.get("/{gameId}", response_model=ActivePlayerSchema)
+async def get_game(gameId: str) -> JSONResponse:
+    """Current state of a hosted game"""
+    try:
+        game = await game_host.snapshot(gameId)
+    except GameHostError as exc:
+        raise _unavailable(exc)
+    if game is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Game not found")
+    return JSONResponse(game)
+
+
+@router.post("/{gameId}/direction", status_code=status.HTTP_204_NO_CONTENT)
+async def turn(gameId: str, request: GameDirectionRequest, user: CurrentUser = Depends(get_current_user)) -> Response:
+    """Turn on the game's next move (reversals are ignored, as in the client)"""
+    _owned_game(gameId, user)
+    try:
+        game_host.turn(gameId, parse_direction(request.direction))
+    except GameHostError as exc:
+        raise _unavailable(exc)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.delete("/{gameId}", status_code=status.HTTP_204_NO_CONTENT)
+async def stop_game(gameId: str, user: CurrentUser = Depends(get_current_user)) -> Response:
+    """End a game early"""
+    _owned_game(gameId, user)
+    game_host.stop_game(gameId)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
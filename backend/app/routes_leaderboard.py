@@ -1,73 +1,323 @@
 """Leaderboard routes using SQLAlchemy"""
-from fastapi import APIRouter, Depends, Query
+import base64
+import json
+import os
+from collections import Counter
+from contextlib import ExitStack
+from datetime import datetime
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
-from typing import Optional
-from .database import get_db, User, LeaderboardEntry
-from .schemas import LeaderboardEntrySchema, ScoreSubmissionRequest, ScoreSubmissionResult
-from .routes_auth import get_current_user
+from starlette.concurrency import run_in_threadpool
+from typing import Literal, Optional
+from .database import get_db, run_db, User, LeaderboardEntry, UserBestScore
+from .engine import ReplayError, parse_direction, simulate_replay
+from .leaderboard_cache import leaderboard_cache, serialize_board
+from .leaderboard_index import leaderboard_index
+from .leaderboard_windows import leaderboard_windows, load_window, window_start
+from .score_queue import ScoreQueueFull, ScoreRow, score_queue, write_scores
+from .schemas import (
+    BatchScoreRequest,
+    BatchScoreResult,
+    LeaderboardEntrySchema,
+    RankedLeaderboardEntrySchema,
+    ScoreSubmissionRequest,
+    ScoreSubmissionResult,
+)
+from .routes_auth import get_current_user, require_service_token
+from .session_cache import CurrentUser, session_cache
 
 router = APIRouter(tags=["leaderboard"])
 
+# Reject score submissions that don't carry a replay to verify
+REQUIRE_SCORE_REPLAY = os.getenv("REQUIRE_SCORE_REPLAY", "false").lower() == "true"
+# Longest replay (in moves) the server will re-simulate
+REPLAY_MAX_TICKS = int(os.getenv("SCORE_REPLAY_MAX_TICKS", "200000"))
+# Largest leaderboard page (limit), and twice the most neighbours around a player
+MAX_PAGE_SIZE = int(os.getenv("LEADERBOARD_MAX_PAGE_SIZE", "100"))
+# Most submissions accepted by one POST /leaderboard/scores:batch
+BATCH_MAX_ITEMS = int(os.getenv("SCORE_BATCH_MAX_ITEMS", "1000"))
+
+
+def _sort_key(model) -> tuple:
+    """Columns boards are ordered by (descending); the id breaks ties"""
+    return model.score, model.date, model.entry_id if model is UserBestScore else model.id
+
+
+def _load_board(
+    db: Session,
+    model,
+    limit: int,
+    mode: Optional[str],
+    after: Optional[tuple] = None,
+    ascending: bool = False,
+) -> list[LeaderboardEntrySchema]:
+    """Best ``limit`` rows of ``model`` (or worst, ``ascending``) strictly
+    past the keyset position ``after``, without OFFSET"""
+    key = _sort_key(model)
+    query = db.query(model)
+    if mode:
+        query = query.filter(model.mode == mode)
+    if after is not None:
+        position = tuple_(*key)
+        query = query.filter(position > after if ascending else position < after)
+    order = [column.asc() if ascending else column.desc() for column in key]
+    rows = query.order_by(*order).limit(limit).all()
+    return [LeaderboardEntrySchema(**row.to_dict()) for row in rows]
+
+
+def _load_leaderboard(
+    db: Session, limit: int, mode: Optional[str], after: Optional[tuple] = None
+) -> list[LeaderboardEntrySchema]:
+    return _load_board(db, LeaderboardEntry, limit, mode, after)
+
+
+def _load_best_scores(
+    db: Session, limit: int, mode: Optional[str], after: Optional[tuple] = None
+) -> list[LeaderboardEntrySchema]:
+    """Top players rather than top entries: one row per player (per mode)"""
+    return _load_board(db, UserBestScore, limit, mode, after)
+
+
+def _encode_cursor(entry: LeaderboardEntrySchema) -> str:
+    position = [entry.score, entry.date.isoformat(), entry.id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[int, datetime, str]:
+    try:
+        score, date, entry_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not (isinstance(score, int) and isinstance(entry_id, str)):
+            raise ValueError(cursor)
+        return score, datetime.fromisoformat(date), entry_id
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=422, detail="Invalid cursor")
+
+
+def _load_window(db: Session, limit: int, mode: Optional[str], window: str) -> list[LeaderboardEntrySchema]:
+    """Window board from the top-K buckets, or the table past their size
+    and for modes without buckets"""
+    if limit <= leaderboard_windows.top_k:
+        leaderboard_windows.ensure(db, mode, window)
+    entries = leaderboard_windows.top(mode, window, limit)
+    if entries is None:
+        entries = load_window(db, mode, window_start(window), limit)
+    return entries
+
 
 @router.get("/leaderboard", response_model=list[LeaderboardEntrySchema])
-def get_leaderboard(
-    limit: int = Query(10, ge=1),
+async def get_leaderboard(
+    limit: int = Query(10, ge=1, le=MAX_PAGE_SIZE),
     mode: Optional[str] = Query(None),
+    distinct_players: bool = Query(False),
+    window: Optional[Literal["day", "week", "month"]] = Query(None),
+    cursor: Optional[str] = Query(None),
+    if_none_match: Optional[str] = Header(None),
     db: Session = Depends(get_db),
-) -> list[LeaderboardEntrySchema]:
-    """Get leaderboard entries, optionally filtered by mode"""
-    query = db.query(LeaderboardEntry)
-    
-    if mode:
-        query = query.filter(LeaderboardEntry.mode == mode)
-    
-    # Sort by score descending, then by date descending
-    entries = query.order_by(
-        LeaderboardEntry.score.desc(),
-        LeaderboardEntry.date.desc()
-    ).limit(limit).all()
+) -> Response:
+    """Get leaderboard entries, optionally filtered by mode.
 
+    With ``distinct_players`` each player appears once per mode, with their
+    best entry. ``window`` restricts the board to the current day, week or
+    month. Full pages carry an ``X-Next-Cursor`` header; pass it back as
+    ``cursor`` for the following page.
+    """
+    if window and distinct_players:
+        raise HTTPException(status_code=422, detail="distinct_players can't be combined with window")
+    if cursor is not None and (window or not mode):
+        raise HTTPException(status_code=422, detail="cursor pagination needs a mode and no window")
+    load = _load_best_scores if distinct_players else _load_leaderboard
+
+    if cursor is not None:
+        # Deep pages are rarely requested twice, so they bypass the cache
+        entries = await run_db(db, load, limit, mode, _decode_cursor(cursor))
+        board = serialize_board(entries, limit)
+    else:
+        key = (mode or None, limit, distinct_players)
+        if window:
+            # The period is part of the key, so boards roll over with it
+            key += (window, window_start(window))
+        board = leaderboard_cache.get(key)
+        if board is None and leaderboard_cache.shared:
+            board = await run_in_threadpool(leaderboard_cache.get_shared, key)
+        if board is None:
+            generation = leaderboard_cache.generation
+            if window:
+                entries = leaderboard_windows.top(mode, window, limit)
+                if entries is None:
+                    entries = await run_db(db, _load_window, limit, mode, window)
+            else:
+                entries = await run_db(db, load, limit, mode)
+            board = serialize_board(entries, limit)
+            leaderboard_cache.put(key, board, generation)
+    headers = {"ETag": board.etag, "Cache-Control": "no-cache"}
+    if board.last is not None and board.size == limit and mode and not window:
+        headers["X-Next-Cursor"] = _encode_cursor(board.last)
+
+    # Unchanged board: let the client reuse its copy
+    if board.matches(if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=board.body, media_type="application/json", headers=headers)
+
+
+def _load_around(db: Session, user_id: str, mode: str, n: int) -> list[RankedLeaderboardEntrySchema]:
+    best = db.query(LeaderboardEntry).filter(
+        LeaderboardEntry.user_id == user_id, LeaderboardEntry.mode == mode
+    ).order_by(LeaderboardEntry.score.desc(), LeaderboardEntry.date.asc()).first()
+    if best is None:
+        raise HTTPException(status_code=404, detail="No entries for this player in this mode")
+    anchor = LeaderboardEntrySchema(**best.to_dict())
+    position = (anchor.score, anchor.date, anchor.id)
+    above = _load_board(db, LeaderboardEntry, n, mode, position, ascending=True)
+    below = _load_board(db, LeaderboardEntry, n, mode, position)
+
+    leaderboard_index.ensure(db, mode)
     return [
-        LeaderboardEntrySchema(
-            id=entry.id,
-            user_id=entry.user_id,
-            username=entry.username,
-            score=entry.score,
-            mode=entry.mode,
-            date=entry.date,
-        )
-        for entry in entries
+        RankedLeaderboardEntrySchema(**entry.model_dump(), rank=leaderboard_index.rank(mode, entry.score))
+        for entry in [*reversed(above), anchor, *below]
     ]
 
 
+@router.get("/leaderboard/around/{user_id}", response_model=list[RankedLeaderboardEntrySchema])
+async def get_leaderboard_around(
+    user_id: str,
+    mode: str = Query(...),
+    n: int = Query(5, ge=0, le=MAX_PAGE_SIZE // 2),
+    db: Session = Depends(get_db),
+) -> list[RankedLeaderboardEntrySchema]:
+    """A player's best entry in ``mode`` with the ``n`` entries above and below it"""
+    return await run_db(db, _load_around, user_id, mode, n)
+
+
+def _invalid_replay(detail: str) -> HTTPException:
+    # Literal 422: the status constant's name differs across Starlette versions
+    return HTTPException(status_code=422, detail=detail)
+
+
+def _verify_replay(request: ScoreSubmissionRequest) -> None:
+    """Re-simulate the submitted replay; the score must be what it reaches"""
+    replay = request.replay
+    if replay is None:
+        if REQUIRE_SCORE_REPLAY:
+            raise _invalid_replay("A replay is required to submit a score")
+        return
+    if replay.ticks > REPLAY_MAX_TICKS:
+        raise _invalid_replay(f"Replay is longer than {REPLAY_MAX_TICKS} moves")
+    inputs = [(tick, parse_direction(direction)) for tick, direction in replay.inputs]
+    try:
+        result = simulate_replay(replay.seed, inputs, replay.ticks, request.mode, replay.grid_size)
+    except ReplayError as exc:
+        raise _invalid_replay(f"Invalid replay: {exc}")
+    if result.score != request.score:
+        raise _invalid_replay("Replay does not reproduce the submitted score")
+
+
+def _submit_score(db: Session, request: ScoreSubmissionRequest, user: CurrentUser) -> ScoreSubmissionResult:
+    # Load this mode's scores into the rank index before our entry exists
+    leaderboard_index.ensure(db, request.mode)
+
+    # Insert the entry, raising the user's high score if needed (the
+    # snapshot never overstates it) and their best for this mode
+    row = ScoreRow(user.id, user.username, request.mode, request.score)
+    written = write_scores(db, [row], {user.id: user.high_score})
+    new_high_score = bool(written.raised)
+
+    with leaderboard_index.writing(request.mode):
+        db.commit()
+        leaderboard_index.add(request.mode, request.score)
+    leaderboard_windows.add(written.entries)
+    leaderboard_cache.invalidate_score(request.mode, request.score)
+    if new_high_score:
+        session_cache.update_user(user.id, high_score=request.score)
+
+    # Rank is 1 + how many entries have a higher score in this mode
+    rank = leaderboard_index.rank(request.mode, request.score)
+
+    return ScoreSubmissionResult(success=True, rank=rank)
+
+
 @router.post("/leaderboard/score", response_model=ScoreSubmissionResult)
-def submit_score(
+async def submit_score(
     request: ScoreSubmissionRequest,
-    user: User = Depends(get_current_user),
+    user: CurrentUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ) -> ScoreSubmissionResult:
-    """Submit a score to the leaderboard"""
-    # Create leaderboard entry
-    entry = LeaderboardEntry(
-        user_id=user.id,
-        username=user.username,
-        score=request.score,
-        mode=request.mode,
-    )
-    db.add(entry)
-    
-    # Update user's high score if needed
+    """Submit a score to the leaderboard, verifying its replay if one is sent"""
+    await run_in_threadpool(_verify_replay, request)
+    if score_queue.enabled:
+        return await _queue_score(request, user, db)
+    return await run_db(db, _submit_score, request, user)
+
+
+async def _queue_score(request: ScoreSubmissionRequest, user: CurrentUser, db: Session) -> ScoreSubmissionResult:
+    """Write-behind: acknowledge with a provisional rank, commit later"""
+    if not leaderboard_index.is_warm(request.mode):
+        await run_db(db, leaderboard_index.ensure, request.mode)
+    try:
+        rank = score_queue.submit(ScoreRow(user.id, user.username, request.mode, request.score))
+    except ScoreQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many scores waiting to be saved, retry shortly",
+            headers={"Retry-After": "1"},
+        )
     if request.score > user.high_score:
-        user.high_score = request.score
-    
-    db.commit()
-    db.refresh(entry)
-
-    # Calculate rank (how many entries have a higher score in this mode)
-    rank_query = db.query(LeaderboardEntry).filter(
-        LeaderboardEntry.mode == request.mode,
-        LeaderboardEntry.score > request.score
-    ).count()
-    rank = rank_query + 1  # Rank is 1-indexed
+        session_cache.update_user(user.id, high_score=request.score)
+    return ScoreSubmissionResult(success=True, rank=rank, provisional=True)
 
-    return ScoreSubmissionResult(success=True, rank=rank)
+
+def _submit_batch(db: Session, request: BatchScoreRequest) -> BatchScoreResult:
+    items = request.items
+    user_ids = {item.user_id for item in items}
+    users = {
+        user_id: (username, high_score)
+        for user_id, username, high_score in db.execute(
+            select(User.id, User.username, User.high_score).where(User.id.in_(user_ids))
+        )
+    }
+    unknown = sorted(user_ids - users.keys())
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown user ids: {', '.join(unknown)}")
+
+    modes = {item.mode for item in items}
+    for mode in modes:
+        leaderboard_index.ensure(db, mode)
+
+    rows = [ScoreRow(item.user_id, users[item.user_id][0], item.mode, item.score) for item in items]
+    written = write_scores(db, rows, {user_id: high for user_id, (_, high) in users.items()})
+
+    added = Counter((item.mode, item.score) for item in items)
+    with ExitStack() as stack:
+        for mode in modes:
+            stack.enter_context(leaderboard_index.writing(mode))
+        db.commit()
+        for (mode, score), n in added.items():
+            leaderboard_index.add(mode, score, n)
+    leaderboard_windows.add(written.entries)
+    for mode in modes:
+        leaderboard_cache.invalidate_score(mode, max(item.score for item in items if item.mode == mode))
+    for user_id, score in written.raised.items():
+        session_cache.update_user(user_id, high_score=score)
+
+    # Ranks against the final state, batch included
+    ranks = [leaderboard_index.rank(item.mode, item.score) for item in items]
+    return BatchScoreResult(success=True, ranks=ranks)
+
+
+@router.post(
+    "/leaderboard/scores:batch",
+    response_model=BatchScoreResult,
+    dependencies=[Depends(require_service_token)],
+)
+async def submit_scores_batch(
+    request: BatchScoreRequest,
+    db: Session = Depends(get_db),
+) -> BatchScoreResult:
+    """Submit many scores at once (service token required)"""
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {BATCH_MAX_ITEMS} scores per batch",
+        )
+    return await run_db(db, _submit_batch, request)
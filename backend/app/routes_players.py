@@ -1,54 +1,181 @@
 """Players and watch mode routes using SQLAlchemy"""
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, WebSocket
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-import json
-from .database import get_db, ActivePlayer
-from .schemas import ActivePlayerSchema, PositionSchema
+from typing import Optional
+import asyncio
+import os
+from .database import get_db, release_db, run_db, ActivePlayer
+from .game_host import GameHostError, game_host
+from .player_states import player_states
+from .pubsub import LOBBY_TOPIC, Subscription, hub, player_topic
+from .routes_auth import require_service_token
+from .schemas import ActivePlayerSchema, PlayerStatesRequest, PlayerStatesResult
 
 router = APIRouter(prefix="/players", tags=["players"])
 
+# Most updates accepted by one POST /players/states:batch
+STATE_BATCH_MAX_ITEMS = int(os.getenv("PLAYER_STATE_BATCH_MAX_ITEMS", "1000"))
+
+# Players are serialized straight from the model as plain dicts (the snake
+# is unpacked from ``snake_data``) and returned as JSONResponse, so reads
+# don't build a PositionSchema per segment. ``response_model`` is kept for
+# the OpenAPI docs only.
+
+
+def _load_active_players(db: Session) -> list[dict]:
+    players = db.query(ActivePlayer).filter(ActivePlayer.is_playing == True).all()
+    return [player.to_dict() for player in players]
+
+
+def _load_player(db: Session, player_id: str) -> Optional[dict]:
+    player = db.query(ActivePlayer).filter(ActivePlayer.id == player_id).first()
+    return player.to_dict() if player else None
+
+
+def _load_players(db: Session, player_ids: set[str]) -> list[tuple[dict, bytes]]:
+    players = db.query(ActivePlayer).filter(ActivePlayer.id.in_(player_ids)).all()
+    return [(player.to_dict(), player.snake_bytes) for player in players]
+
+
+def _active_players(rows: list[dict]) -> list[dict]:
+    """Active rows with the states posted to this worker, plus the games it hosts"""
+    return player_states.active(rows) + game_host.lobby()
+
+
+async def _current_player(db: Session, player_id: str) -> Optional[dict]:
+    """The player's row with any newer state posted to this worker"""
+    player = await run_db(db, _load_player, player_id)
+    return player_states.overlay([player])[0] if player else None
+
 
 @router.get("/active", response_model=list[ActivePlayerSchema])
-def get_active_players(db: Session = Depends(get_db)) -> list[ActivePlayerSchema]:
+async def get_active_players(db: Session = Depends(get_db)) -> JSONResponse:
     """Get all active players in watch mode"""
-    players = db.query(ActivePlayer).filter(ActivePlayer.is_playing == True).all()
+    return JSONResponse(_active_players(await run_db(db, _load_active_players)))
 
-    return [
-        ActivePlayerSchema(
-            id=player.id,
-            username=player.username,
-            current_score=player.current_score,
-            mode=player.mode,
-            snake=[
-                PositionSchema(x=pos["x"], y=pos["y"]) 
-                for pos in json.loads(player.snake_json)
-            ],
-            food=PositionSchema(x=player.food_x, y=player.food_y),
-            direction=player.direction,
-            is_playing=player.is_playing,
+
+@router.post(
+    "/states:batch",
+    response_model=PlayerStatesResult,
+    dependencies=[Depends(require_service_token)],
+)
+async def submit_player_states(request: PlayerStatesRequest, db: Session = Depends(get_db)) -> PlayerStatesResult:
+    """Update many players' states at once (service token required).
+
+    Watch-mode streams get the changes right away; the rows are written in
+    bulk by the throttled flush, and reads see the latest state meanwhile.
+    """
+    if len(request.updates) > STATE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {STATE_BATCH_MAX_ITEMS} updates per batch",
         )
-        for player in players
-    ]
+    updates = [update.model_dump(exclude_none=True) for update in request.updates]
+    missing = player_states.unknown(update["id"] for update in updates)
+    if missing:
+        for player, snake_data in await run_db(db, _load_players, missing):
+            player_states.remember(player, snake_data)
+        missing = player_states.unknown(missing)
+    try:
+        changed = player_states.submit([update for update in updates if update["id"] not in missing])
+    except ValueError as exc:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc))
+    return PlayerStatesResult(changed=changed, unknown=sorted(missing))
 
 
 @router.get("/{playerId}", response_model=ActivePlayerSchema)
-def get_player(playerId: str, db: Session = Depends(get_db)) -> ActivePlayerSchema:
+async def get_player(playerId: str, db: Session = Depends(get_db)) -> JSONResponse:
     """Get a specific active player by ID"""
-    player = db.query(ActivePlayer).filter(ActivePlayer.id == playerId).first()
+    player = await _current_player(db, playerId)
+    if not player and game_host.get(playerId) is not None:
+        # Games hosted by this worker have no row
+        try:
+            player = await game_host.snapshot(playerId)
+        except GameHostError:
+            player = None
 
     if not player:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Player not found")
 
-    return ActivePlayerSchema(
-        id=player.id,
-        username=player.username,
-        current_score=player.current_score,
-        mode=player.mode,
-        snake=[
-            PositionSchema(x=pos["x"], y=pos["y"]) 
-            for pos in json.loads(player.snake_json)
-        ],
-        food=PositionSchema(x=player.food_x, y=player.food_y),
-        direction=player.direction,
-        is_playing=player.is_playing,
-    )
+    return JSONResponse(player)
+
+
+# Close code telling a spectator that fell behind to reconnect for a new snapshot
+RESYNC_CLOSE_CODE = 4409
+
+
+async def _pump(websocket: WebSocket, subscription: Subscription) -> None:
+    """Forward hub messages to the socket until either side goes away, or
+    until the subscription overflows"""
+
+    async def watch_client():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+        subscription.close()
+
+    watcher = asyncio.create_task(watch_client())
+    try:
+        while (message := await subscription.get()) is not None:
+            await websocket.send_text(message)
+        if subscription.overflowed:
+            await websocket.close(code=RESYNC_CLOSE_CODE, reason="Fell behind; reconnect for a new snapshot")
+    finally:
+        watcher.cancel()
+
+
+@router.websocket("/stream")
+async def stream_lobby(websocket: WebSocket, db: Session = Depends(get_db)) -> None:
+    """Stream all active players: a snapshot, then incremental updates"""
+    # Subscribe before reading the snapshot so no update falls in between
+    subscription = hub.subscribe(LOBBY_TOPIC)
+    try:
+        players = _active_players(await run_db(db, _load_active_players))
+        await release_db(db)
+        await websocket.accept()
+        await websocket.send_json({
+            "type": "snapshot",
+            "players": players,
+        })
+        await _pump(websocket, subscription)
+    finally:
+        subscription.close()
+
+
+async def _stream_hosted(websocket: WebSocket, game_id: str) -> None:
+    """Stream a game hosted by this worker, subscribed exactly at its snapshot"""
+    try:
+        watched = await game_host.watch(game_id)
+    except GameHostError:
+        watched = None
+    await websocket.accept()
+    if watched is None:
+        await websocket.close(code=4404, reason="Player not found")
+        return
+    player, subscription = watched
+    try:
+        await websocket.send_json({"type": "snapshot", "player": player})
+        await _pump(websocket, subscription)
+    finally:
+        subscription.close()
+
+
+@router.websocket("/{playerId}/stream")
+async def stream_player(websocket: WebSocket, playerId: str, db: Session = Depends(get_db)) -> None:
+    """Stream one player's game: a snapshot, then incremental updates"""
+    if game_host.get(playerId) is not None:
+        await release_db(db)
+        await _stream_hosted(websocket, playerId)
+        return
+    subscription = hub.subscribe(player_topic(playerId))
+    try:
+        player = await _current_player(db, playerId)
+        await release_db(db)
+        await websocket.accept()
+        if not player:
+            await websocket.close(code=4404, reason="Player not found")
+            return
+        await websocket.send_json({"type": "snapshot", "player": player})
+        await _pump(websocket, subscription)
+    finally:
+        subscription.close()
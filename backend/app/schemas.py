@@ -1,12 +1,14 @@
 """Pydantic schemas for request/response validation (package version)"""
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional
+
+from .snake_codec import MAX_COORD
 
 
 class PositionSchema(BaseModel):
-    x: int
-    y: int
+    x: int = Field(ge=0, le=MAX_COORD)
+    y: int = Field(ge=0, le=MAX_COORD)
 
 
 class UserSchema(BaseModel):
@@ -35,6 +37,33 @@ class AuthResult(BaseModel):
     token: Optional[str] = None
 
 
+class SessionCacheStatsSchema(BaseModel):
+    size: int
+    max_size: int
+    ttl_seconds: float
+    hits: int
+    misses: int
+    evictions: int
+    expirations: int
+    shared_hits: int = 0  # lookups found in the shared backend (SHARED_STATE_URL)
+
+
+class PoolStatusSchema(BaseModel):
+    pool_class: str
+    status: str
+    size: Optional[int] = None
+    checked_in: Optional[int] = None
+    checked_out: Optional[int] = None
+    overflow: Optional[int] = None
+
+
+class PoolStatsSchema(BaseModel):
+    async_mode: bool
+    config: dict
+    pool: PoolStatusSchema
+    sync_pool: Optional[PoolStatusSchema] = None
+
+
 class LeaderboardEntrySchema(BaseModel):
     id: str
     user_id: str
@@ -44,14 +73,51 @@ class LeaderboardEntrySchema(BaseModel):
     date: datetime
 
 
+class RankedLeaderboardEntrySchema(LeaderboardEntrySchema):
+    # Ties share the rank of the best equal score
+    rank: Optional[int] = None
+
+
+class ReplaySchema(BaseModel):
+    seed: int = Field(ge=0, le=0xFFFFFFFF)
+    ticks: int = Field(ge=0)
+    # engine.replay.MAX_GRID_SIZE: the verifier caches tables for every size
+    grid_size: int = Field(20, ge=4, le=64)
+    # (moves made before the change, direction) pairs
+    inputs: list[tuple[int, Literal["UP", "DOWN", "LEFT", "RIGHT"]]] = []
+
+
+# Scores are stored in 32-bit INTEGER columns
+MAX_SCORE = 2**31 - 1
+
+
 class ScoreSubmissionRequest(BaseModel):
-    score: int
+    score: int = Field(ge=0, le=MAX_SCORE)
     mode: str
+    replay: Optional[ReplaySchema] = None
 
 
 class ScoreSubmissionResult(BaseModel):
     success: bool
     rank: Optional[int] = None
+    # The score was queued (write-behind mode) and the rank counts it
+    provisional: bool = False
+
+
+class BatchScoreItem(BaseModel):
+    user_id: str
+    score: int = Field(ge=0, le=MAX_SCORE)
+    mode: str
+
+
+class BatchScoreRequest(BaseModel):
+    items: list[BatchScoreItem] = Field(min_length=1)
+
+
+class BatchScoreResult(BaseModel):
+    success: bool
+    # Rank of each item, in request order, once the whole batch is in
+    ranks: list[Optional[int]]
 
 
 class ActivePlayerSchema(BaseModel):
@@ -63,3 +129,54 @@ class ActivePlayerSchema(BaseModel):
     food: PositionSchema
     direction: str
     is_playing: bool
+
+
+class PlayerStateUpdate(BaseModel):
+    """Latest state of one player; omitted fields keep their current value"""
+    id: str
+    current_score: Optional[int] = Field(None, ge=0, le=MAX_SCORE)
+    snake: Optional[list[PositionSchema]] = None
+    food: Optional[PositionSchema] = None
+    direction: Optional[Literal["UP", "DOWN", "LEFT", "RIGHT"]] = None
+    is_playing: Optional[bool] = None
+
+
+class PlayerStatesRequest(BaseModel):
+    updates: list[PlayerStateUpdate] = Field(min_length=1)
+
+
+class PlayerStatesResult(BaseModel):
+    # Players whose state changed
+    changed: int
+    # Ids without an active_players row; their updates were skipped
+    unknown: list[str]
+
+
+class GameCreateRequest(BaseModel):
+    mode: Literal["passthrough", "walls"] = "passthrough"
+    grid_size: int = Field(20, ge=4, le=256)
+    # Food RNG seed (the same seed and turns give the same game); random if omitted
+    seed: Optional[int] = Field(None, ge=0, le=0xFFFFFFFF)
+
+
+class GameDirectionRequest(BaseModel):
+    direction: Literal["UP", "DOWN", "LEFT", "RIGHT"]
+
+
+class GameShardStatsSchema(BaseModel):
+    shard: int
+    games: int
+    ticks: int
+    moves: int
+    lag_ms_p50: float
+    lag_ms_p99: float
+    lag_ms_max: float
+
+
+class GameHostStatsSchema(BaseModel):
+    running: bool
+    processes: int
+    games: int
+    max_games: int
+    max_games_per_user: int
+    shards: list[GameShardStatsSchema]
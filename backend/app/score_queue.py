@@ -0,0 +1,248 @@
+"""Bulk score writes and the optional write-behind score queue.
+
+``write_scores`` stores submissions with one multi-row INSERT, one high-score
+UPDATE and one best-score upsert; it backs ``POST /leaderboard/score``,
+``POST /leaderboard/scores:batch`` and the queue's flushes.
+
+With ``SCORE_WRITE_BEHIND=true``, ``submit_score`` doesn't commit: the score
+is added to the in-memory rank index (so the response carries a provisional
+rank) and queued, and a background task started by the app lifespan writes
+the queue out in batches every ``SCORE_FLUSH_INTERVAL_SECONDS`` or as soon
+as ``SCORE_FLUSH_BATCH_SIZE`` scores are waiting. A full queue rejects new
+scores (503) instead of growing, and shutdown drains what is left. Queued
+scores are lost if the process dies before they are flushed.
+
+A batch the database rejects as data (an integrity or data error) is split
+in halves until the offending scores are isolated; those are logged and
+dropped, and the rest is written. Any other failure (the database being
+unreachable, say) puts the unwritten scores back to be retried.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Callable, NamedTuple, Optional, Sequence
+
+from sqlalchemy import case, insert
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from .best_scores import record_best_scores
+from .database import LeaderboardEntry, User
+from .leaderboard_cache import LeaderboardCache, leaderboard_cache
+from .leaderboard_index import LeaderboardIndex, leaderboard_index
+from .leaderboard_windows import LeaderboardWindows, leaderboard_windows
+
+logger = logging.getLogger(__name__)
+
+# Acknowledge scores before they are committed
+WRITE_BEHIND = os.getenv("SCORE_WRITE_BEHIND", "false").lower() == "true"
+# Scores waiting to be written before submissions get 503
+QUEUE_MAX_SIZE = int(os.getenv("SCORE_QUEUE_MAX_SIZE", "10000"))
+# Most scores written per flush, and the longest a score waits
+FLUSH_BATCH_SIZE = int(os.getenv("SCORE_FLUSH_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.getenv("SCORE_FLUSH_INTERVAL_SECONDS", "0.2"))
+# How long shutdown waits for the queue to drain
+DRAIN_TIMEOUT = float(os.getenv("SCORE_QUEUE_DRAIN_SECONDS", "10"))
+
+
+class ScoreRow(NamedTuple):
+    user_id: str
+    username: str
+    mode: str
+    score: int
+
+
+class ScoreWrite(NamedTuple):
+    entries: list[dict]  # inserted LeaderboardEntry column values
+    raised: dict[str, int]  # new high scores by user id
+
+
+def write_scores(db: Session, rows: Sequence[ScoreRow], high_scores: Optional[dict[str, int]] = None) -> ScoreWrite:
+    """Insert ``rows`` and raise high scores and bests, without committing.
+
+    ``high_scores`` (current values, if the caller has them) limits the
+    UPDATE to users whose best actually improves; the WHERE re-checks
+    either way.
+    """
+    # Ids and dates are set here rather than by column defaults so the same
+    # values can go into user_best_scores
+    now = datetime.now()
+    entries = [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": row.user_id,
+            "username": row.username,
+            "score": row.score,
+            "mode": row.mode,
+            "date": now,
+        }
+        for row in rows
+    ]
+    db.execute(insert(LeaderboardEntry), entries)
+    record_best_scores(db, entries)
+
+    raised: dict[str, int] = {}
+    floors = high_scores or {}
+    for row in rows:
+        if row.score > raised.get(row.user_id, floors.get(row.user_id, row.score - 1)):
+            raised[row.user_id] = row.score
+    if raised:
+        best = case(raised, value=User.id)
+        db.query(User).filter(
+            User.id.in_(raised), User.high_score < best
+        ).update({User.high_score: best}, synchronize_session=False)
+    return ScoreWrite(entries, raised)
+
+
+class ScoreQueueFull(Exception):
+    """The write-behind queue is at capacity (or shutting down)"""
+
+
+class ScoreQueue:
+    """Bounded queue of acknowledged but uncommitted scores.
+
+    Queued scores are counted in the rank index from the moment they are
+    accepted, and their modes stay marked as being written (so index loads
+    and reconciliation leave them alone) until their batch is committed.
+    """
+
+    def __init__(
+        self,
+        max_size: int = QUEUE_MAX_SIZE,
+        batch_size: int = FLUSH_BATCH_SIZE,
+        interval: float = FLUSH_INTERVAL,
+        index: LeaderboardIndex = leaderboard_index,
+        cache: LeaderboardCache = leaderboard_cache,
+        enabled: bool = WRITE_BEHIND,
+        windows: LeaderboardWindows = leaderboard_windows,
+    ):
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.interval = interval
+        self.index = index
+        self.cache = cache
+        self.windows = windows
+        self.enabled = enabled
+        self.closed = False
+        self.flushed = 0
+        self.dropped = 0
+        self._pending: deque[ScoreRow] = deque()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def reset(self) -> None:
+        """Forget queued scores (tests and app re-creation)"""
+        for row in self._pending:
+            self.index.end_write(row.mode)
+        self._pending.clear()
+        self.closed = False
+        self._task = None
+
+    def submit(self, row: ScoreRow) -> Optional[int]:
+        """Queue ``row`` and return its provisional rank"""
+        if self.closed or len(self._pending) >= self.max_size:
+            raise ScoreQueueFull()
+        self.index.begin_write(row.mode)
+        try:
+            self.index.add(row.mode, row.score)
+        except BaseException:
+            self.index.end_write(row.mode)
+            raise
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+        return self.index.rank(row.mode, row.score)
+
+    @staticmethod
+    def _write(session_factory: Callable[[], Session], batch: list[ScoreRow]) -> list[dict]:
+        db = session_factory()
+        try:
+            entries = write_scores(db, batch).entries
+            db.commit()
+            return entries
+        finally:
+            db.close()
+
+    def _drop(self, row: ScoreRow) -> None:
+        """Give up on a score the database rejects, taking it out of the index"""
+        logger.error("Dropping queued score the database rejects: %r", row, exc_info=True)
+        self.index.add(row.mode, row.score, -1)
+        self.index.end_write(row.mode)
+        self.dropped += 1
+
+    def _written(self, rows: list[ScoreRow], entries: list[dict]) -> None:
+        self.windows.add(entries)
+        top: dict[str, int] = {}
+        for row in rows:
+            self.index.end_write(row.mode)
+            top[row.mode] = max(row.score, top.get(row.mode, row.score))
+        for mode, score in top.items():
+            self.cache.invalidate_score(mode, score)
+        self.flushed += len(rows)
+
+    async def flush(self, session_factory: Callable[[], Session]) -> int:
+        """Write up to one batch; returns how many scores were written or dropped"""
+        batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+        if not batch:
+            return 0
+        # Halves still to write, the next one last
+        chunks = [batch]
+        while chunks:
+            chunk = chunks.pop()
+            try:
+                entries = await asyncio.to_thread(self._write, session_factory, chunk)
+            except (IntegrityError, DataError):
+                if len(chunk) == 1:
+                    self._drop(chunk[0])
+                else:
+                    half = len(chunk) // 2
+                    chunks += [chunk[half:], chunk[:half]]
+            except BaseException:
+                self._pending.extendleft(reversed(chunk + [row for rest in reversed(chunks) for row in rest]))
+                raise
+            else:
+                self._written(chunk, entries)
+        return len(batch)
+
+    async def _run(self, session_factory: Callable[[], Session]) -> None:
+        while not (self.closed and not self._pending):
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                while self._pending:
+                    await self.flush(session_factory)
+            except Exception:
+                logger.exception("Flushing %d queued scores failed; will retry", len(self._pending))
+                await asyncio.sleep(self.interval)
+
+    def start(self, session_factory: Callable[[], Session]) -> asyncio.Task:
+        """Start the background flusher on the running loop"""
+        self.closed = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(session_factory))
+        return self._task
+
+    async def close(self, timeout: float = DRAIN_TIMEOUT) -> None:
+        """Stop accepting scores and wait for the queue to drain"""
+        self.closed = True
+        if self._task is None:
+            return
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+            logger.error("Score queue did not drain in %.1fs; %d scores were not written", timeout, len(self._pending))
+        self._task = None
+
+
+score_queue = ScoreQueue()
@@ -0,0 +1,300 @@
+"""Bounded TTL/LRU cache mapping session tokens to user snapshots.
+
+``get_current_user`` runs on every authenticated request, so successful
+token lookups are cached as a small immutable ``CurrentUser`` snapshot
+instead of hitting ``sessions`` and ``users`` each time. Entries never
+outlive the cache TTL or the session's own ``expires_at``, and logout
+evicts them explicitly. An evicted token is remembered for one TTL so a
+lookup that read the session before it was deleted can't cache it again.
+
+Attached to a shared backend (``SHARED_STATE_URL``), lookups missing here
+are tried there before the database, every lookup loaded from the
+database is stored there for the other workers, and evictions and user
+updates are broadcast so no worker keeps serving a revoked token.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime
+from typing import Callable, Optional
+
+from .shared_state import SharedState, SharedStateError
+
+logger = logging.getLogger(__name__)
+
+# Seconds a token lookup may be served from memory
+TTL_SECONDS = float(os.getenv("SESSION_CACHE_TTL_SECONDS", "60"))
+# Maximum number of cached tokens
+MAX_SIZE = int(os.getenv("SESSION_CACHE_MAX_SIZE", "10000"))
+# Seconds a token lookup is kept in the shared backend
+SHARED_TTL_SECONDS = float(os.getenv("SESSION_SHARED_TTL_SECONDS", "300"))
+
+EVICT_CHANNEL = "session-cache:evict"
+USER_CHANNEL = "session-cache:user"
+
+
+def _token_key(token: str) -> str:
+    return f"session:{token}"
+
+
+def _user_key(user_id: str) -> str:
+    return f"session-user:{user_id}"
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    """Lightweight snapshot of the authenticated user"""
+    id: str
+    username: str
+    email: str
+    created_at: datetime
+    high_score: int
+
+    @classmethod
+    def from_model(cls, user) -> "CurrentUser":
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            created_at=user.created_at,
+            high_score=user.high_score or 0,
+        )
+
+    def to_json(self) -> bytes:
+        return json.dumps(dict(asdict(self), created_at=self.created_at.isoformat())).encode()
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "CurrentUser":
+        fields = json.loads(data)
+        return cls(**dict(fields, created_at=datetime.fromisoformat(fields["created_at"])))
+
+
+class SessionCache:
+    """Thread-safe LRU of token -> (user snapshot, deadline)"""
+
+    def __init__(self, max_size: int = MAX_SIZE, ttl: float = TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple[CurrentUser, float]]" = OrderedDict()
+        self._tokens_by_user: dict[str, set[str]] = {}
+        self._revoked: "OrderedDict[str, float]" = OrderedDict()  # token -> deadline
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.shared_hits = 0
+        self._state: Optional[SharedState] = None
+        self._unsubscribe: list[Callable[[], None]] = []
+        self._evict_listeners: list[Callable[[str], None]] = []
+
+    @property
+    def shared(self) -> bool:
+        """Whether ``get_shared`` can find lookups made by other workers"""
+        return self._state is not None
+
+    def attach(self, state: SharedState) -> None:
+        """Share lookups and invalidations with the other workers using ``state``
+        (a no-op for the in-process backend)"""
+        self.detach()
+        if not state.shared:
+            return
+        self._state = state
+        self._unsubscribe = [
+            state.on_broadcast(EVICT_CHANNEL, self._on_evict),
+            state.on_broadcast(USER_CHANNEL, self._on_user),
+        ]
+
+    def on_evict(self, callback: Callable[[str], None]) -> Callable[[], None]:
+        """Call ``callback(token)`` whenever a token is revoked, here or in
+        another worker; returns a function that stops the calls"""
+        self._evict_listeners.append(callback)
+        return lambda: self._evict_listeners.remove(callback)
+
+    def detach(self) -> None:
+        for unsubscribe in self._unsubscribe:
+            unsubscribe()
+        self._unsubscribe = []
+        self._state = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens_by_user.clear()
+            self._revoked.clear()
+
+    def _remove(self, token: str) -> None:
+        user, _ = self._entries.pop(token)
+        tokens = self._tokens_by_user.get(user.id)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens_by_user[user.id]
+
+    def _revoke(self, token: str) -> None:
+        """Refuse ``put`` for ``token`` for the next TTL (lock held)"""
+        now = time.monotonic()
+        self._revoked[token] = now + self.ttl
+        self._revoked.move_to_end(token)
+        # Deadlines grow with insertion order, so expired ones are in front
+        while self._revoked and (next(iter(self._revoked.values())) <= now or len(self._revoked) > self.max_size):
+            self._revoked.popitem(last=False)
+
+    def _is_revoked(self, token: str) -> bool:
+        deadline = self._revoked.get(token)
+        return deadline is not None and deadline > time.monotonic()
+
+    def get(self, token: str) -> Optional[CurrentUser]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            user, deadline = entry
+            if time.monotonic() >= deadline:
+                self._remove(token)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return user
+
+    def get_shared(self, token: str) -> Optional[CurrentUser]:
+        """Look ``token`` up in the shared backend (blocking IO: call it off
+        the event loop), caching what is found here as well"""
+        state = self._state
+        if state is None:
+            return None
+        try:
+            found = state.get(_token_key(token))
+            if found is None:
+                return None
+            user_id, deadline = json.loads(found)
+            # Dropped whenever the user changes, unlike the token entries
+            user = state.get(_user_key(user_id))
+            if user is None:
+                return None
+        except SharedStateError as exc:
+            logger.warning("Shared session lookup failed: %s", exc)
+            return None
+        user = CurrentUser.from_json(user)
+        self._put_local(token, user, datetime.fromtimestamp(deadline) if deadline else None)
+        with self._lock:
+            self.shared_hits += 1
+        return user
+
+    def put(self, token: str, user: CurrentUser, expires_at: Optional[datetime] = None) -> None:
+        """Cache ``user`` for ``token``, never past the session's ``expires_at``"""
+        self._put_local(token, user, expires_at)
+        if self._state is not None:
+            self._state.defer(self._put_shared, self._state, token, user, expires_at)
+
+    def _put_shared(self, state: SharedState, token: str, user: CurrentUser, expires_at: Optional[datetime]) -> None:
+        # Evicted while this write was queued
+        with self._lock:
+            if self._is_revoked(token):
+                return
+        ttl = SHARED_TTL_SECONDS
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.now()).total_seconds())
+        if ttl <= 0:
+            return
+        deadline = expires_at.timestamp() if expires_at is not None else None
+        state.set(_user_key(user.id), user.to_json(), ttl=SHARED_TTL_SECONDS)
+        state.set(_token_key(token), json.dumps([user.id, deadline]).encode(), ttl=ttl)
+
+    def _put_local(self, token: str, user: CurrentUser, expires_at: Optional[datetime]) -> None:
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, (expires_at - datetime.now()).total_seconds())
+            if ttl <= 0:
+                return
+        with self._lock:
+            if self._is_revoked(token):
+                return
+            if token in self._entries:
+                self._remove(token)
+            self._entries[token] = (user, time.monotonic() + ttl)
+            self._tokens_by_user.setdefault(user.id, set()).add(token)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def evict(self, token: str) -> None:
+        """Forget ``token``, in every worker"""
+        self._evict_local(token)
+        if self._state is not None:
+            self._state.defer(self._share_change, self._state, [_token_key(token)], {"token": token})
+
+    def evict_user(self, user_id: str) -> None:
+        """Drop every cached token belonging to ``user_id``, in every worker"""
+        self._evict_user_local(user_id)
+        if self._state is not None:
+            self._state.defer(self._share_change, self._state, [_user_key(user_id)], {"user_id": user_id})
+
+    def update_user(self, user_id: str, **changes) -> None:
+        """Patch the snapshot of ``user_id`` in every cached token, in every worker"""
+        self._update_user_local(user_id, changes)
+        if self._state is not None:
+            self._state.defer(
+                self._share_change, self._state, [_user_key(user_id)], {"user_id": user_id, "changes": changes},
+            )
+
+    @staticmethod
+    def _share_change(state: SharedState, stale_keys: list[str], payload: dict) -> None:
+        state.delete(*stale_keys)
+        state.broadcast(USER_CHANNEL if "changes" in payload else EVICT_CHANNEL, payload)
+
+    def _on_evict(self, payload: dict) -> None:
+        if "token" in payload:
+            self._evict_local(payload["token"])
+        else:
+            self._evict_user_local(payload["user_id"])
+
+    def _on_user(self, payload: dict) -> None:
+        self._update_user_local(payload["user_id"], payload["changes"])
+
+    def _evict_local(self, token: str) -> None:
+        with self._lock:
+            self._revoke(token)
+            if token in self._entries:
+                self._remove(token)
+        for callback in list(self._evict_listeners):
+            try:
+                callback(token)
+            except Exception:
+                logger.exception("Session eviction listener failed")
+
+    def _evict_user_local(self, user_id: str) -> None:
+        with self._lock:
+            for token in list(self._tokens_by_user.get(user_id, ())):
+                self._remove(token)
+
+    def _update_user_local(self, user_id: str, changes: dict) -> None:
+        with self._lock:
+            for token in self._tokens_by_user.get(user_id, ()):
+                user, deadline = self._entries[token]
+                self._entries[token] = (replace(user, **changes), deadline)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "shared_hits": self.shared_hits,
+            }
+
+
+session_cache = SessionCache()
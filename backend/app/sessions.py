@@ -0,0 +1,139 @@
+"""Login session lifetime: expiry, sliding renewal, per-user cap and purge.
+
+Sessions expire ``SESSION_TTL_SECONDS`` after they were last renewed. A
+session in use is renewed when its token is looked up (on a session cache
+miss) and it was last renewed over ``SESSION_RENEW_AFTER_SECONDS`` ago, so
+active users stay logged in at the cost of at most one UPDATE per session
+per renewal interval. Rows from before expiry was enforced have no
+``expires_at`` and count as expiring ``SESSION_TTL_SECONDS`` after creation.
+
+Each login beyond ``SESSION_MAX_PER_USER`` live sessions revokes that
+user's oldest ones, and a background task deletes expired rows in batches
+so the table stays proportional to the number of live sessions.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import and_, delete, or_, select
+from sqlalchemy.orm import Session
+
+from .database import Session as SessionModel
+
+logger = logging.getLogger(__name__)
+
+# Seconds a session lives after its last renewal (0: sessions never expire)
+SESSION_TTL = float(os.getenv("SESSION_TTL_SECONDS", str(30 * 86400)))
+# Least time between two renewals of one session
+RENEW_AFTER = float(os.getenv("SESSION_RENEW_AFTER_SECONDS", "3600"))
+# Live sessions kept per user; older ones are revoked at login (0: no cap)
+MAX_PER_USER = int(os.getenv("SESSION_MAX_PER_USER", "10"))
+# Seconds between purges of expired sessions (0 disables the task)
+PURGE_INTERVAL = float(os.getenv("SESSION_PURGE_INTERVAL_SECONDS", "3600"))
+# Rows deleted per purge transaction
+PURGE_BATCH_SIZE = int(os.getenv("SESSION_PURGE_BATCH_SIZE", "1000"))
+
+
+def _ttl() -> Optional[timedelta]:
+    return timedelta(seconds=SESSION_TTL) if SESSION_TTL > 0 else None
+
+
+def expires_at(session: SessionModel) -> Optional[datetime]:
+    """When ``session`` expires (None: never)"""
+    ttl = _ttl()
+    if session.expires_at is not None or ttl is None:
+        return session.expires_at
+    return session.created_at + ttl
+
+
+def _expired(now: datetime):
+    """SQL condition matching expired sessions"""
+    ttl = _ttl()
+    condition = SessionModel.expires_at <= now
+    if ttl is not None:
+        condition = or_(
+            condition,
+            and_(SessionModel.expires_at.is_(None), SessionModel.created_at <= now - ttl),
+        )
+    return condition
+
+
+def create_session(db: Session, user_id: str) -> tuple[str, list[str]]:
+    """Add a session for ``user_id`` without committing; returns its token
+    and the tokens revoked to stay within ``SESSION_MAX_PER_USER``"""
+    now = datetime.now()
+    ttl = _ttl()
+    token = str(uuid.uuid4())
+    db.add(SessionModel(
+        token=token, user_id=user_id, created_at=now, expires_at=now + ttl if ttl else None,
+    ))
+
+    revoked: list[str] = []
+    if MAX_PER_USER > 0:
+        # The newest MAX_PER_USER - 1 others survive (expired ones count
+        # too; the purge would delete them anyway)
+        revoked = list(db.scalars(
+            select(SessionModel.token)
+            .where(SessionModel.user_id == user_id, SessionModel.token != token)
+            .order_by(SessionModel.created_at.desc(), SessionModel.token.desc())
+            .offset(MAX_PER_USER - 1)
+        ))
+        if revoked:
+            db.execute(delete(SessionModel).where(SessionModel.token.in_(revoked)))
+    return token, revoked
+
+
+def renew(db: Session, session: SessionModel, now: datetime) -> Optional[datetime]:
+    """Push the expiry of a live ``session`` out to a full TTL if it was
+    last renewed over ``SESSION_RENEW_AFTER_SECONDS`` ago; returns the new
+    expiry, or None if nothing changed. Doesn't commit."""
+    ttl = _ttl()
+    if ttl is None:
+        return None
+    current = expires_at(session)
+    if current - now > ttl - timedelta(seconds=RENEW_AFTER):
+        return None
+    session.expires_at = now + ttl
+    return session.expires_at
+
+
+def purge_expired_sessions(db: Session, batch_size: Optional[int] = None, now: Optional[datetime] = None) -> int:
+    """Delete expired sessions, committing every ``batch_size`` rows so no
+    transaction holds many row locks; returns how many were deleted"""
+    batch_size = batch_size or PURGE_BATCH_SIZE
+    now = now or datetime.now()
+    deleted = 0
+    while True:
+        tokens = list(db.scalars(select(SessionModel.token).where(_expired(now)).limit(batch_size)))
+        if tokens:
+            db.execute(delete(SessionModel).where(SessionModel.token.in_(tokens)))
+            db.commit()
+            deleted += len(tokens)
+        if len(tokens) < batch_size:
+            return deleted
+
+
+async def purge_sessions_periodically(
+    session_factory: Callable[[], Session],
+    interval: float = PURGE_INTERVAL,
+) -> None:
+    """Background loop deleting expired sessions every ``interval`` seconds"""
+
+    def run_once():
+        db = session_factory()
+        try:
+            deleted = purge_expired_sessions(db)
+        finally:
+            db.close()
+        if deleted:
+            logger.info("Purged %d expired sessions", deleted)
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_once)
+        except Exception:
+            logger.exception("Purging expired sessions failed")
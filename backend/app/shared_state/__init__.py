@@ -0,0 +1,37 @@
+"""State shared between the workers of one deployment.
+
+``SHARED_STATE_URL`` picks the backend:
+
+- ``memory://`` (default): in-process only, for a single worker
+- ``sqlite:///path/to/state.db``: a SQLite file, for workers on one host
+- ``redis://host:6379/0``: a Redis-protocol server, for several hosts
+
+With a shared backend the session cache and the leaderboard cache read
+through it before the database, and invalidations and watch-mode messages
+are broadcast to every worker.
+"""
+import os
+
+from .base import SharedState, SharedStateError
+from .memory import MemoryState
+
+SHARED_STATE_URL = os.getenv("SHARED_STATE_URL", "memory://")
+
+
+def create_state(url: str) -> SharedState:
+    """Backend for ``url`` (see the module docstring)"""
+    scheme = url.split("://", 1)[0].lower()
+    if scheme == "memory":
+        return MemoryState()
+    if scheme == "sqlite":
+        from .sqlite import SQLiteState
+        return SQLiteState(url.split(":///", 1)[1])
+    if scheme in ("redis", "resp"):
+        from .resp import RESPState
+        return RESPState(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL: {url!r}")
+
+
+shared_state = create_state(SHARED_STATE_URL)
+
+__all__ = ["MemoryState", "SharedState", "SharedStateError", "create_state", "shared_state"]
@@ -0,0 +1,139 @@
+"""The interface every shared-state backend implements."""
+import json
+import logging
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[bytes], None]
+
+
+class SharedStateError(Exception):
+    """The backend could not be reached or answered with an error"""
+
+
+class SharedState(ABC):
+    """Key/value store with expiry, counters and pub/sub.
+
+    Values are bytes. Handlers passed to ``subscribe`` run on a backend
+    thread (or inline, for the in-process backend), so they must be quick
+    and thread-safe. ``shared`` tells consumers whether other processes see
+    what this instance writes; when it is False they keep to their
+    in-process state, exactly as without a backend.
+    """
+
+    shared = True
+
+    def __init__(self):
+        # Tags broadcasts, so an instance ignores the ones it sent itself
+        self.instance_id = uuid.uuid4().hex
+        self._handlers_lock = threading.Lock()
+        self._handlers: dict[str, list[Handler]] = {}
+        self._writer: Optional[ThreadPoolExecutor] = None
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        """Value of ``key``, or None if it is missing or expired"""
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        """Store ``value``, expiring after ``ttl`` seconds if given"""
+
+    @abstractmethod
+    def delete(self, *keys: str) -> None:
+        """Remove ``keys`` (missing ones are ignored)"""
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        """Atomically add one to the integer at ``key`` (missing is 0)"""
+
+    @abstractmethod
+    def publish(self, channel: str, message: bytes) -> None:
+        """Send ``message`` to every subscriber of ``channel``, in any process"""
+
+    def _listen(self, channel: str) -> None:
+        """Start receiving ``channel`` (called on its first subscription)"""
+
+    def _unlisten(self, channel: str) -> None:
+        """Stop receiving ``channel`` (called when its last handler goes)"""
+
+    def subscribe(self, channel: str, handler: Handler) -> Callable[[], None]:
+        """Call ``handler`` with each message on ``channel``; returns the
+        function that unsubscribes it"""
+        with self._handlers_lock:
+            handlers = self._handlers.setdefault(channel, [])
+            first = not handlers
+            handlers.append(handler)
+        if first:
+            self._listen(channel)
+
+        def unsubscribe() -> None:
+            with self._handlers_lock:
+                handlers = self._handlers.get(channel, [])
+                if handler not in handlers:
+                    return
+                handlers.remove(handler)
+                last = not handlers
+                if last:
+                    del self._handlers[channel]
+            if last:
+                self._unlisten(channel)
+
+        return unsubscribe
+
+    def _dispatch(self, channel: str, message: bytes) -> None:
+        with self._handlers_lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for handler in handlers:
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("Shared state handler for %r failed", channel)
+
+    def defer(self, fn: Callable, *args) -> None:
+        """Run ``fn(*args)`` on this backend's writer thread, in submission
+        order, logging failures: for writes and broadcasts that requests
+        shouldn't wait for"""
+        if self._writer is None:
+            with self._handlers_lock:
+                if self._writer is None:
+                    self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shared-state")
+        self._writer.submit(self._run_logged, fn, *args)
+
+    @staticmethod
+    def _run_logged(fn: Callable, *args) -> None:
+        try:
+            fn(*args)
+        except Exception:
+            logger.warning("Shared state write failed", exc_info=True)
+
+    def flush(self) -> None:
+        """Wait for deferred writes submitted so far"""
+        if self._writer is not None:
+            self._writer.submit(lambda: None).result()
+
+    def close(self) -> None:
+        """Finish deferred writes, release connections and stop background threads"""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    # Broadcasts: JSON messages every other instance acts on
+
+    def broadcast(self, channel: str, payload: dict) -> None:
+        body = dict(payload, origin=self.instance_id)
+        self.publish(channel, json.dumps(body, separators=(",", ":")).encode())
+
+    def on_broadcast(self, channel: str, handler: Callable[[dict], None]) -> Callable[[], None]:
+        """Subscribe ``handler`` to broadcasts on ``channel`` sent by other instances"""
+
+        def receive(message: bytes) -> None:
+            payload = json.loads(message)
+            if payload.pop("origin", None) != self.instance_id:
+                handler(payload)
+
+        return self.subscribe(channel, receive)
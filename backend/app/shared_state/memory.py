@@ -0,0 +1,52 @@
+"""In-process backend: state is visible to this worker only."""
+import threading
+import time
+from typing import Optional
+
+from .base import SharedState
+
+
+class MemoryState(SharedState):
+    """Dictionary-backed state; publishes call local handlers inline"""
+
+    shared = False
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._values: dict[str, tuple[bytes, Optional[float]]] = {}
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._values.get(key)
+            if item is None:
+                return None
+            value, deadline = item
+            if deadline is not None and time.monotonic() >= deadline:
+                del self._values[key]
+                return None
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        deadline = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._values[key] = (value, deadline)
+
+    def delete(self, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, deadline = self._values.get(key, (b"0", None))
+            number = int(value) + 1
+            self._values[key] = (str(number).encode(), deadline)
+            return number
+
+    def publish(self, channel: str, message: bytes) -> None:
+        self._dispatch(channel, message)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
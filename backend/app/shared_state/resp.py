@@ -0,0 +1,213 @@
+"""Redis-protocol (RESP2) backend, for workers on several hosts.
+
+Speaks the handful of commands it needs (GET, SET ... PX, DEL, INCR,
+PUBLISH, SUBSCRIBE) over plain sockets, so it works with Redis, Valkey,
+KeyDB or anything else speaking RESP, without a client library. Commands
+go through a small pool of connections; subscriptions use one dedicated
+connection read by a listener thread, which reconnects (and resubscribes)
+after errors.
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+from .base import SharedState, SharedStateError
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for a connection or a reply
+TIMEOUT = float(os.getenv("SHARED_STATE_TIMEOUT_SECONDS", "1.0"))
+# Idle connections kept for commands
+POOL_SIZE = 8
+
+
+def _encode(*args) -> bytes:
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+class _Connection:
+    def __init__(self, host: str, port: int, timeout: Optional[float], db: int, password: Optional[str]):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.reader = self.sock.makefile("rb")
+        if password:
+            self.command("AUTH", password)
+        if db:
+            self.command("SELECT", db)
+
+    def send(self, *args) -> None:
+        self.sock.sendall(_encode(*args))
+
+    def read(self):
+        line = self.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise SharedStateError(rest.decode(errors="replace"))
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("connection closed")
+            return data[:-2]
+        if kind == b"*":
+            length = int(rest)
+            return None if length < 0 else [self.read() for _ in range(length)]
+        raise SharedStateError(f"unexpected reply {line!r}")
+
+    def command(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def close(self) -> None:
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.reader.close()
+        self.sock.close()
+
+
+class RESPState(SharedState):
+    """State in a Redis-compatible server; ``url`` is ``redis://[:password@]host[:port][/db]``"""
+
+    def __init__(self, url: str, timeout: float = TIMEOUT):
+        super().__init__()
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.password = parts.password
+        self.timeout = timeout
+        self._pool: list[_Connection] = []
+        self._pool_lock = threading.Lock()
+        self._subscriber: Optional[_Connection] = None
+        self._subscriber_lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _open(self, timeout: Optional[float]) -> _Connection:
+        return _Connection(self.host, self.port, timeout, self.db, self.password)
+
+    def _command(self, *args):
+        with self._pool_lock:
+            conn = self._pool.pop() if self._pool else None
+        try:
+            if conn is None:
+                conn = self._open(self.timeout)
+            reply = conn.command(*args)
+        except (OSError, ConnectionError) as exc:
+            if conn is not None:
+                conn.close()
+            raise SharedStateError(f"{args[0]} failed: {exc}") from exc
+        except SharedStateError:
+            # An error reply leaves the connection usable
+            self._release(conn)
+            raise
+        self._release(conn)
+        return reply
+
+    def _release(self, conn: _Connection) -> None:
+        with self._pool_lock:
+            if len(self._pool) < POOL_SIZE and not self._closed:
+                self._pool.append(conn)
+                return
+        conn.close()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            self._command("SET", key, value)
+        else:
+            self._command("SET", key, value, "PX", max(1, int(ttl * 1000)))
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._command("DEL", *keys)
+
+    def incr(self, key: str) -> int:
+        return self._command("INCR", key)
+
+    def publish(self, channel: str, message: bytes) -> None:
+        self._command("PUBLISH", channel, message)
+
+    def _listen(self, channel: str) -> None:
+        with self._subscriber_lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._receive, name="shared-state-resp", daemon=True)
+                self._listener.start()
+            elif self._subscriber is not None:
+                try:
+                    self._subscriber.send("SUBSCRIBE", channel)
+                except OSError:
+                    pass  # the listener reconnects and subscribes to everything
+
+    def _unlisten(self, channel: str) -> None:
+        with self._subscriber_lock:
+            if self._subscriber is not None:
+                try:
+                    self._subscriber.send("UNSUBSCRIBE", channel)
+                except OSError:
+                    pass
+
+    def _receive(self) -> None:
+        backoff = 0.1
+        while not self._closed:
+            try:
+                conn = self._open(None)
+                with self._subscriber_lock, self._handlers_lock:
+                    channels = list(self._handlers)
+                    self._subscriber = conn
+                    if channels:
+                        conn.send("SUBSCRIBE", *channels)
+                backoff = 0.1
+                while True:
+                    reply = conn.read()
+                    if isinstance(reply, list) and len(reply) == 3 and reply[0] == b"message":
+                        self._dispatch(reply[1].decode(), reply[2])
+            except (OSError, ConnectionError, ValueError, SharedStateError) as exc:
+                # (ValueError: the reader was closed under us by close())
+                if self._closed:
+                    return
+                logger.warning("Shared state subscription lost (%s); reconnecting", exc)
+            with self._subscriber_lock:
+                if self._subscriber is not None:
+                    self._subscriber.close()
+                    self._subscriber = None
+            if self._closed:
+                return
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 5.0)
+
+    def close(self) -> None:
+        super().close()
+        self._closed = True
+        with self._subscriber_lock:
+            if self._subscriber is not None:
+                self._subscriber.close()
+                self._subscriber = None
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.join(timeout=5)
+        with self._pool_lock:
+            pool, self._pool = self._pool, []
+        for conn in pool:
+            conn.close()
@@ -0,0 +1,141 @@
+"""SQLite-file backend for several workers on one host.
+
+Every worker opens the same database file (in WAL mode, so readers don't
+block the writer). Keys live in a table with an expiry column; published
+messages are appended to a log table that a listener thread in each worker
+polls every ``SHARED_STATE_POLL_SECONDS``. Old messages are pruned as new
+ones are published.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from .base import SharedState, SharedStateError
+
+# Seconds between polls of the message log by each worker's listener
+POLL_INTERVAL = float(os.getenv("SHARED_STATE_POLL_SECONDS", "0.05"))
+# Seconds a published message is kept for slow listeners
+MESSAGE_RETENTION = 60.0
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS shared_kv ("
+    " key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)",
+    "CREATE TABLE IF NOT EXISTS shared_messages ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL,"
+    " body BLOB NOT NULL, created_at REAL NOT NULL)",
+)
+
+
+class SQLiteState(SharedState):
+    """State in a SQLite file shared by the workers of one host"""
+
+    def __init__(self, path: str, poll_interval: float = POLL_INTERVAL):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._published = 0
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        with self._connect() as conn:
+            for statement in _SCHEMA:
+                conn.execute(statement)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit: each statement is its own short transaction
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> list:
+        try:
+            return self._connect().execute(sql, params).fetchall()
+        except sqlite3.Error as exc:
+            raise SharedStateError(str(exc)) from exc
+
+    def get(self, key: str) -> Optional[bytes]:
+        rows = self._execute(
+            "SELECT value FROM shared_kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, time.time()),
+        )
+        if not rows:
+            return None
+        value = rows[0][0]
+        # Counters come back as text; everything else was stored as a blob
+        return value.encode() if isinstance(value, str) else bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        expires_at = time.time() + ttl if ttl is not None else None
+        self._execute(
+            "INSERT INTO shared_kv (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+            (key, value, expires_at),
+        )
+
+    def delete(self, *keys: str) -> None:
+        if keys:
+            self._execute(f"DELETE FROM shared_kv WHERE key IN ({', '.join('?' * len(keys))})", keys)
+
+    def incr(self, key: str) -> int:
+        # Counters are stored as text, like Redis, so get() reads them back alike
+        rows = self._execute(
+            "INSERT INTO shared_kv (key, value) VALUES (?, '1') "
+            "ON CONFLICT (key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT) "
+            "RETURNING value",
+            (key,),
+        )
+        return int(rows[0][0])
+
+    def publish(self, channel: str, message: bytes) -> None:
+        now = time.time()
+        self._execute(
+            "INSERT INTO shared_messages (channel, body, created_at) VALUES (?, ?, ?)",
+            (channel, message, now),
+        )
+        self._published += 1
+        if self._published % 100 == 0:
+            self._execute("DELETE FROM shared_messages WHERE created_at < ?", (now - MESSAGE_RETENTION,))
+            self._execute("DELETE FROM shared_kv WHERE expires_at <= ?", (now,))
+
+    def _listen(self, channel: str) -> None:
+        if self._listener is None:
+            # Only messages published from now on are delivered
+            last_id = self._execute("SELECT COALESCE(MAX(id), 0) FROM shared_messages")[0][0]
+            self._listener = threading.Thread(
+                target=self._poll, args=(last_id,), name="shared-state-sqlite", daemon=True
+            )
+            self._listener.start()
+
+    def _poll(self, last_id: int) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                rows = self._execute(
+                    "SELECT id, channel, body FROM shared_messages WHERE id > ? ORDER BY id", (last_id,)
+                )
+            except SharedStateError:
+                continue
+            for message_id, channel, body in rows:
+                last_id = message_id
+                self._dispatch(channel, bytes(body))
+
+    def close(self) -> None:
+        super().close()
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join()
+            self._listener = None
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
@@ -0,0 +1,81 @@
+"""Compact binary encoding of snake bodies.
+
+A snake is stored as packed uint8 ``x, y`` pairs, head first, so a 400-cell
+snake takes 800 bytes instead of ~10KB of JSON and decoding is a slice
+rather than ``json.loads``. Moves are expressed as deltas (new head cells
+plus how many tail cells were trimmed) rather than whole bodies.
+"""
+import json
+from typing import Iterable, NamedTuple, Optional, Union
+
+# Coordinates must fit in one byte
+MAX_COORD = 255
+
+# Longest run of new head cells that ``diff_snake`` looks for
+MAX_DELTA_HEADS = 16
+
+Point = Union[tuple[int, int], dict]
+
+
+class SnakeDelta(NamedTuple):
+    """``heads`` are prepended (newest first) and ``trim`` cells dropped from the tail"""
+    heads: bytes
+    trim: int
+
+    def to_json(self) -> dict:
+        return {"heads": decode_snake(self.heads), "trim": self.trim}
+
+
+def _xy(point: Point) -> tuple[int, int]:
+    if isinstance(point, dict):
+        return point["x"], point["y"]
+    return point[0], point[1]
+
+
+def encode_snake(points: Iterable[Point]) -> bytes:
+    """Pack ``points`` (``(x, y)`` tuples or ``{"x", "y"}`` dicts) head first"""
+    out = bytearray()
+    for point in points:
+        x, y = _xy(point)
+        if not (0 <= x <= MAX_COORD and 0 <= y <= MAX_COORD):
+            raise ValueError(f"Snake coordinate out of range: ({x}, {y})")
+        out += bytes((x, y))
+    return bytes(out)
+
+
+def decode_snake(data: bytes) -> list[dict]:
+    """Unpack to ``[{"x": .., "y": ..}, ...]`` ready for JSON responses"""
+    return [{"x": x, "y": y} for x, y in zip(data[0::2], data[1::2])]
+
+
+def snake_length(data: bytes) -> int:
+    return len(data) // 2
+
+
+def apply_delta(data: bytes, delta: SnakeDelta) -> bytes:
+    """Advance a packed snake by ``delta``"""
+    keep = len(data) - 2 * delta.trim
+    if keep < 0:
+        raise ValueError("Delta trims more cells than the snake has")
+    return delta.heads + data[:keep]
+
+
+def diff_snake(old: bytes, new: bytes) -> Optional[SnakeDelta]:
+    """Express ``new`` as a delta from ``old``, or None if it is not one.
+
+    Finds the smallest number of new head cells such that the (non-empty)
+    rest of ``new`` is a prefix of ``old``; anything else (teleport, reset)
+    needs a full body.
+    """
+    if new == old:
+        return SnakeDelta(b"", 0)
+    for heads in range(1, min(MAX_DELTA_HEADS + 1, snake_length(new))):
+        body = new[2 * heads:]
+        if old.startswith(body):
+            return SnakeDelta(new[:2 * heads], (len(old) - len(body)) // 2)
+    return None
+
+
+def snake_from_json(snake_json: str) -> bytes:
+    """Convert a legacy ``snake_json`` column value"""
+    return encode_snake(json.loads(snake_json))
@@ -0,0 +1 @@
+"""Performance benchmarks for the Snake Duel backend (not run by pytest)"""
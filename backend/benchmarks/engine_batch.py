@@ -0,0 +1,75 @@
+"""Moves per second of the NumPy batch engine against per-game stepping.
+
+Runs ``--games`` games for ``--steps`` moves, first as ``Game`` objects
+ticked one at a time and then as one ``BatchGames``, with the same random
+turns (``--turn-rate`` of the games turn each move) and ended games
+restarted. Needs the ``numpy`` extra.
+
+Usage (from backend/):
+    uv run python -m benchmarks.engine_batch --games 1000 10000 100000
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from app.engine import Game, Mulberry32
+from app.engine.batch import BatchGames
+
+
+def run_games(count: int, steps: int, grid_size: int, mode: str, turn_rate: float) -> tuple[float, int]:
+    rng = random.Random(1)
+    games = [Game(grid_size, mode, random=Mulberry32(i), placement="client") for i in range(count)]
+    moves = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        for i, game in enumerate(games):
+            if game.game_over:
+                game = games[i] = Game(grid_size, mode, random=Mulberry32(rng.randrange(2**32)), placement="client")
+            if rng.random() < turn_rate:
+                game.set_direction(rng.randrange(4))
+            moves += game.tick()
+    return time.perf_counter() - start, moves
+
+
+def run_batch(count: int, steps: int, grid_size: int, mode: str, turn_rate: float) -> tuple[float, int]:
+    rng = np.random.default_rng(1)
+    batch = BatchGames(count, grid_size, mode, seeds=range(count))
+    moves = 0
+    start = time.perf_counter()
+    for _ in range(steps):
+        ended = np.flatnonzero(batch.game_over)
+        if ended.size:
+            batch.restart(ended, rng.integers(0, 2**32, size=ended.size, dtype=np.uint64))
+        turning = np.flatnonzero(rng.random(count) < turn_rate)
+        batch.set_directions(turning, rng.integers(0, 4, size=turning.size))
+        moves += int(batch.step().sum())
+    return time.perf_counter() - start, moves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--grid-size", type=int, default=20)
+    parser.add_argument("--mode", choices=("passthrough", "walls"), default="passthrough")
+    parser.add_argument("--turn-rate", type=float, default=0.1)
+    parser.add_argument("--skip-games", action="store_true", help="only time BatchGames")
+    args = parser.parse_args()
+
+    print(f"{args.mode}, {args.grid_size}x{args.grid_size}, {args.steps} steps, turn rate {args.turn_rate}")
+    print("   games        Game moves/s   BatchGames moves/s   speed-up")
+    for count in args.games:
+        elapsed, moves = run_batch(count, args.steps, args.grid_size, args.mode, args.turn_rate)
+        batch_rate = moves / elapsed
+        if args.skip_games:
+            print(f"{count:>8}  {'-':>18}  {batch_rate:>19,.0f}")
+            continue
+        elapsed, moves = run_games(count, args.steps, args.grid_size, args.mode, args.turn_rate)
+        game_rate = moves / elapsed
+        print(f"{count:>8}  {game_rate:>18,.0f}  {batch_rate:>19,.0f}  {batch_rate / game_rate:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Tick throughput of the server-side snake engine on one core.
+
+Runs ``--games`` concurrent games round-robin, turning at random about one
+tick in five and restarting games that end, and reports ticks per second
+and how many games one core could keep up with at the start and top speeds.
+
+Usage (from backend/):
+    python -m benchmarks.engine_ticks --games 10000 --seconds 5
+"""
+import argparse
+import random
+import time
+
+from app.engine import INITIAL_SPEED, MIN_SPEED, PLACEMENTS, Game
+
+
+def run(games: int, seconds: float, grid_size: int, mode: str, placement: str) -> tuple[int, float]:
+    rng = random.Random(1234)
+    pool = [Game(grid_size, mode, random=rng.random, placement=placement) for _ in range(games)]
+    turns = [rng.randrange(4) if rng.random() < 0.2 else -1 for _ in range(4096)]
+    ticks = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for i, game in enumerate(pool):
+            turn = turns[(ticks + i) & 4095]
+            if turn >= 0:
+                game.set_direction(turn)
+            if not game.tick():
+                pool[i] = Game(grid_size, mode, random=rng.random, placement=placement)
+        ticks += games
+    return ticks, time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--grid-size", type=int, default=20)
+    parser.add_argument("--mode", choices=("passthrough", "walls"), default="passthrough")
+    parser.add_argument("--placement", choices=PLACEMENTS, default="free")
+    args = parser.parse_args()
+
+    ticks, elapsed = run(args.games, args.seconds, args.grid_size, args.mode, args.placement)
+    rate = ticks / elapsed
+    print(f"{args.games} games, {args.mode}, {args.grid_size}x{args.grid_size}, {args.placement} food placement")
+    print(f"  {rate:,.0f} ticks/s ({1e6 / rate:.2f} us/tick)")
+    for label, speed in (("start", INITIAL_SPEED), ("top", MIN_SPEED)):
+        print(f"  games per core at {label} speed ({speed} ms/tick): {rate * speed / 1000:,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Peak memory and throughput of the streaming leaderboard export.
+
+Seeds ``leaderboard_entries`` (as in ``leaderboard_queries``), then exports
+every row as NDJSON through ``routes_export`` and, for comparison, loads the
+same rows the way ``/leaderboard?limit=<huge>`` used to (ORM objects plus a
+Pydantic model each). Peak memory is measured with ``tracemalloc``.
+
+Usage (from backend/):
+    python -m benchmarks.export_memory --rows 1000000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.leaderboard_queries import seed
+
+
+def measure(label: str, fn) -> None:
+    # Timed untraced; tracemalloc slows allocation-heavy code several times over
+    start = time.perf_counter()
+    rows, size = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<26} {rows:>9} rows  {elapsed:6.1f}s  {rows / elapsed:>9.0f} rows/s  "
+        f"peak {peak / 2**20:8.1f} MiB  output {size / 2**20:8.1f} MiB"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--url", help="database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.setdefault("DATABASE_URL", url)
+    from app import routes_export
+    from app.database import Base, LeaderboardEntry, User
+    from app.routes_leaderboard import _load_leaderboard
+
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    seed(engine, (User.__table__, LeaderboardEntry.__table__), args.rows)
+    print(f"Seeded {args.rows} entries into {engine.dialect.name} in {time.perf_counter() - start:.1f}s\n")
+    Session = sessionmaker(bind=engine)
+
+    def stream():
+        async def drain():
+            response = await routes_export.export_leaderboard(format="ndjson", mode=None, db=Session())
+            rows = size = 0
+            async for chunk in response.body_iterator:
+                rows += chunk.count(b"\n")
+                size += len(chunk)
+            return rows, size
+        return asyncio.run(drain())
+
+    def materialize():
+        db = Session()
+        try:
+            entries = _load_leaderboard(db, args.rows, None)
+            body = b"".join(entry.model_dump_json().encode() + b"\n" for entry in entries)
+            return len(entries), len(body)
+        finally:
+            db.close()
+
+    measure("streaming export", stream)
+    measure("ORM + Pydantic (old way)", materialize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Food placement cost by board fill: rejection sampling against the free-cell index.
+
+Occupies ``--fill`` of a ``--grid-size`` board at random and times placing
+food there ``--placements`` times with ``place_food`` (``generateFood``'s
+rejection sampling) and with ``FreeCells.sample``, reporting the draws each
+needs and how often rejection sampling gave up and put food on the snake.
+The index's upkeep, a remove and an add per move, is timed as well.
+
+Usage (from backend/):
+    uv run python -m benchmarks.food_placement --fill 0.1 0.5 0.95 0.99
+"""
+import argparse
+import random
+import time
+
+from app.engine import FreeCells, place_food
+
+
+def board(grid_size: int, fill: float, rng: random.Random) -> tuple[bytearray, FreeCells]:
+    cell_count = grid_size * grid_size
+    occupied = bytearray(cell_count)
+    free = FreeCells(cell_count)
+    for cell in rng.sample(range(cell_count), round(fill * cell_count)):
+        occupied[cell] = 1
+        free.remove(cell)
+    return occupied, free
+
+
+def run(grid_size: int, fill: float, placements: int) -> dict:
+    rng = random.Random(1234)
+    occupied, free = board(grid_size, fill, rng)
+
+    draws = 0
+
+    def counted():
+        nonlocal draws
+        draws += 1
+        return rng.random()
+
+    start = time.perf_counter()
+    on_snake = sum(occupied[place_food(occupied, grid_size, counted)] for _ in range(placements))
+    rejection = time.perf_counter() - start
+    rejection_draws = draws
+
+    draws = 0
+    start = time.perf_counter()
+    for _ in range(placements):
+        free.sample(counted)
+    indexed = time.perf_counter() - start
+
+    # A move without food frees the tail and takes the new head cell
+    cells = [free.sample(rng.random) for _ in range(1024)]
+    start = time.perf_counter()
+    for i in range(placements):
+        cell = cells[i & 1023]
+        free.remove(cell)
+        free.add(cell)
+    upkeep = time.perf_counter() - start
+
+    return {
+        "rejection_us": 1e6 * rejection / placements,
+        "rejection_draws": rejection_draws / placements,
+        "on_snake": on_snake / placements,
+        "free_us": 1e6 * indexed / placements,
+        "free_draws": draws / placements,
+        "upkeep_us": 1e6 * upkeep / placements,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--grid-size", type=int, default=20)
+    parser.add_argument("--fill", type=float, nargs="+", default=[0.1, 0.5, 0.95])
+    parser.add_argument("--placements", type=int, default=100_000)
+    args = parser.parse_args()
+
+    print(f"{args.grid_size}x{args.grid_size}, {args.placements} placements per fill")
+    print("  fill   rejection us  draws  on snake   free-cell us  draws   upkeep us/move")
+    for fill in args.fill:
+        r = run(args.grid_size, fill, args.placements)
+        print(
+            f"  {fill:>4.0%}  {r['rejection_us']:>12.2f}  {r['rejection_draws']:>5.1f}  {r['on_snake']:>8.2%}"
+            f"  {r['free_us']:>13.2f}  {r['free_draws']:>5.1f}  {r['upkeep_us']:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Tick lag of the game host with many concurrent games.
+
+Starts ``--games`` games spread over ``--ramp`` seconds (as players would
+arrive) on a ``GameHost`` with ``--processes`` shard processes (0: one
+shard on a thread), lets them run for ``--seconds``, and reports the moves
+per second achieved against what the games' speeds call for, plus the lag
+percentiles of each shard. Games that end are restarted so the count stays
+put. Every update is published to the hub; ``--watchers`` subscribes that
+many games' topics.
+
+Usage (from backend/):
+    python -m benchmarks.game_host --games 10000 --processes 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from app.engine import INITIAL_SPEED
+from app.game_host import GameHost
+from app.pubsub import LOBBY_TOPIC, PubSubHub, player_topic
+
+
+async def run(games: int, processes: int, seconds: float, ramp: float, watchers: int, mode: str) -> dict:
+    hub = PubSubHub()
+    host = GameHost(hub, processes=processes, max_games=games)
+    host.start()
+    rng = random.Random(1234)
+    try:
+        # Keep the count up as games end (walls games end quickly)
+        ended = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        lobby = hub.subscribe(LOBBY_TOPIC, maxsize=games * 4)
+
+        async def restart_ended():
+            while (message := await lobby.get()) is not None:
+                if '"type":"removed"' in message:
+                    ended.put_nowait(None)
+
+        async def refill():
+            while True:
+                await ended.get()
+                host.start_game("bench", "bench", mode, seed=rng.randrange(2**32))
+
+        tasks = [asyncio.create_task(restart_ended()), asyncio.create_task(refill())]
+        started = []
+        ramp_start = loop.time()
+        for i in range(games):
+            await asyncio.sleep(max(0.0, ramp_start + ramp * i / games - loop.time()))
+            started.append(host.start_game("bench", "bench", mode, seed=rng.randrange(2**32))[0])
+        subscriptions = [hub.subscribe(player_topic(game_id)) for game_id in started[:watchers]]
+        await asyncio.sleep(0.5)
+
+        before = host.stats()
+        start = time.perf_counter()
+        cpu_start = os.times()
+        await asyncio.sleep(seconds)
+        cpu_end = os.times()
+        elapsed = time.perf_counter() - start
+        after = host.stats()
+
+        for task in tasks:
+            task.cancel()
+        for subscription in subscriptions:
+            subscription.close()
+        lobby.close()
+    finally:
+        await asyncio.to_thread(host.close)
+
+    moves = sum(s["moves"] for s in after["shards"]) - sum(s["moves"] for s in before["shards"])
+    # This process's CPU: with shard processes, what hosting costs the API worker
+    cpu = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    return {"elapsed": elapsed, "moves": moves, "cpu": cpu, "games": after["games"], "shards": after["shards"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--games", type=int, default=10_000)
+    parser.add_argument("--processes", type=int, default=0)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--ramp", type=float, default=1.0, help="seconds over which games start")
+    parser.add_argument("--watchers", type=int, default=0, help="games with a subscriber")
+    parser.add_argument("--mode", choices=("passthrough", "walls"), default="passthrough")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.games, args.processes, args.seconds, args.ramp, args.watchers, args.mode))
+    rate = result["moves"] / result["elapsed"]
+    # Games slow down to 50 ms a move as they eat, so this is a lower bound
+    due = args.games * 1000 / INITIAL_SPEED
+    print(f"{args.games} games, {args.mode}, {args.processes or 'no'} shard processes, {args.watchers} watched")
+    print(f"  {rate:,.0f} moves/s (games at start speed need {due:,.0f})")
+    print(f"  host process CPU: {100 * result['cpu'] / result['elapsed']:.0f}%")
+    print("  shard  games   lag p50    p99     max (ms)")
+    for shard in result["shards"]:
+        print(
+            f"  {shard['shard']:>5}  {shard['games']:>5}  {shard['lag_ms_p50']:>8.2f} "
+            f"{shard['lag_ms_p99']:>7.2f} {shard['lag_ms_max']:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
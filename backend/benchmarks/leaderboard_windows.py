@@ -0,0 +1,89 @@
+"""Latency of time-windowed boards: ad-hoc SQL against the top-K buckets.
+
+Seeds ``leaderboard_entries`` (a year of entries, as in
+``leaderboard_queries``), then times "top 10 of the current day/week/month"
+as a date-filtered query and as a ``LeaderboardWindows.top`` lookup, next to
+the all-time top-10 query for reference.
+
+Usage (from backend/):
+    python -m benchmarks.leaderboard_windows --rows 1000000
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.leaderboard_queries import TOP_N_SQL, seed, time_query
+
+WINDOW_SQL = (
+    "SELECT id, user_id, username, score, mode, date FROM leaderboard_entries "
+    "WHERE mode = :mode AND date >= :start ORDER BY score DESC, date DESC LIMIT :limit"
+)
+
+# The seeded entries span the year before 2026-01-01
+NOW = datetime(2025, 12, 31, 12)
+
+
+def time_call(fn, repeat: int) -> dict:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[max(0, int(len(samples) * 0.95) - 1)],
+    }
+
+
+def report(name: str, stats: dict) -> None:
+    print(f"{name:<28} median {stats['median_ms']:9.3f} ms   p95 {stats['p95_ms']:9.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--url", help="database URL (default: temporary SQLite file)")
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.setdefault("DATABASE_URL", url)
+    from app.database import Base, LeaderboardEntry, User
+    from app.leaderboard_windows import WINDOWS, LeaderboardWindows, window_start
+
+    engine = create_engine(url)
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    start = time.perf_counter()
+    seed(engine, (User.__table__, LeaderboardEntry.__table__), args.rows)
+    print(f"Seeded {args.rows} entries into {engine.dialect.name} in {time.perf_counter() - start:.1f}s\n")
+
+    with engine.connect() as conn:
+        conn.execute(text("ANALYZE"))
+        report("all-time top-10 (SQL)", time_query(conn, TOP_N_SQL, {"mode": "walls", "limit": 10}, args.repeat))
+        for window in WINDOWS:
+            params = {"mode": "walls", "start": window_start(window, NOW), "limit": 10}
+            report(f"{window} top-10 (SQL)", time_query(conn, WINDOW_SQL, params, args.repeat))
+        # Few rows in the window yet: the index walk can't stop early
+        params = {"mode": "walls", "start": datetime(2025, 12, 31, 23, 55), "limit": 10}
+        report("last 5 minutes top-10 (SQL)", time_query(conn, WINDOW_SQL, params, args.repeat))
+
+    windows = LeaderboardWindows()
+    db = sessionmaker(bind=engine)()
+    start = time.perf_counter()
+    windows.refresh(db, NOW)
+    db.close()
+    print(f"\nLoaded {len(WINDOWS) * 2} buckets in {(time.perf_counter() - start) * 1000:.1f} ms")
+    for window in WINDOWS:
+        report(f"{window} top-10 (buckets)", time_call(lambda: windows.top("walls", window, 10, NOW), args.repeat))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Time to verify a recorded game with ``simulate_replay``.
+
+Records games with the engine and a random-turning bot (keeping the longest
+survivor for each setting), then times re-simulating a ``--ticks``-move
+replay. The turn rate is the chance of a turn attempt per move; the
+straight-line row (rate 0) shows the per-move floor; a human turns every
+5-10 moves, i.e. at rates of about 0.1-0.2. Games that don't last
+``--ticks`` moves are also reported scaled to 10,000 moves. Walls mode runs
+the same loop but random play rarely survives long enough to measure.
+
+Usage (from backend/):
+    python -m benchmarks.replay_verify --ticks 10000 --turn-rates 0 0.05 0.1 0.2
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.engine import Game
+from app.engine.replay import Mulberry32, simulate_replay
+
+
+def record(seed: int, ticks: int, mode: str, turn_rate: float) -> tuple[Game, list]:
+    turns = random.Random(seed)
+    game = Game(20, mode, random=Mulberry32(seed), placement="client")
+    inputs = []
+    while game.ticks < ticks:
+        if turns.random() < turn_rate:
+            direction = turns.randrange(4)
+            if game.set_direction(direction):
+                inputs.append((game.ticks, direction))
+        if not game.tick():
+            break
+    return game, inputs
+
+
+def longest(ticks: int, mode: str, turn_rate: float, tries: int = 300) -> tuple[int, Game, list]:
+    best = None
+    for seed in range(tries):
+        game, inputs = record(seed, ticks, mode, turn_rate)
+        if best is None or game.ticks > best[1].ticks:
+            best = (seed, game, inputs)
+        if game.ticks >= ticks:
+            break
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--turn-rates", type=float, nargs="+", default=[0.0, 0.05, 0.1, 0.2])
+    args = parser.parse_args()
+
+    mode = "passthrough"
+    print(
+        f"{'mode':<12} {'turn rate':>9} {'moves':>6} {'inputs':>6} {'score':>5} "
+        f"{'median':>9} {'min':>9} {'median/10k':>11}"
+    )
+    for turn_rate in args.turn_rates:
+        seed, game, inputs = longest(args.ticks, mode, turn_rate)
+        result = simulate_replay(seed, inputs, game.ticks, mode)
+        assert result.score == game.score
+        samples = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            simulate_replay(seed, inputs, game.ticks, mode)
+            samples.append(time.perf_counter() - start)
+        print(
+            f"{mode:<12} {turn_rate:>9} {game.ticks:>6} {len(inputs):>6} {game.score:>5} "
+            f"{statistics.median(samples) * 1e3:>7.3f}ms {min(samples) * 1e3:>7.3f}ms "
+            f"{statistics.median(samples) * 1e7 / game.ticks:>9.3f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
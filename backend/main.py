@@ -1,12 +1,75 @@
 """Snake Duel API - FastAPI Backend"""
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
 import os
+from app import database
 from app.routes_auth import router as auth_router
+from app.routes_export import router as export_router
+from app.routes_games import router as games_router
 from app.routes_leaderboard import router as leaderboard_router
 from app.routes_players import router as players_router
 from app.database import init_db
+from app.game_host import game_host, stop_idle_games_periodically
+from app.leaderboard_cache import leaderboard_cache
+from app.leaderboard_index import leaderboard_index, reconcile_periodically, RECONCILE_INTERVAL
+from app.leaderboard_windows import leaderboard_windows, refresh_windows_periodically, REFRESH_INTERVAL
+from app.metrics import CONTENT_TYPE, METRICS_ENABLED, MetricsMiddleware, instrument_engine, metrics
+from app.player_states import player_states
+from app.pubsub import hub, player_feed
+from app.schemas import PoolStatsSchema
+from app.score_queue import score_queue
+from app.session_cache import session_cache
+from app.shared_state import shared_state
+from app.sessions import PURGE_INTERVAL, SESSION_TTL, purge_sessions_periodically
+
+
+def _warm_leaderboards():
+    db = database.SessionLocal()
+    try:
+        leaderboard_index.warm(db)
+        leaderboard_windows.refresh(db)
+    finally:
+        db.close()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm in-process caches on startup and run their maintenance tasks"""
+    await run_in_threadpool(_warm_leaderboards)
+    tasks = []
+    if RECONCILE_INTERVAL > 0:
+        tasks.append(asyncio.create_task(
+            reconcile_periodically(leaderboard_index, database.SessionLocal)
+        ))
+    if REFRESH_INTERVAL > 0:
+        tasks.append(asyncio.create_task(
+            refresh_windows_periodically(leaderboard_windows, database.SessionLocal)
+        ))
+    if PURGE_INTERVAL > 0 and SESSION_TTL > 0:
+        tasks.append(asyncio.create_task(
+            purge_sessions_periodically(database.SessionLocal)
+        ))
+    if score_queue.enabled:
+        score_queue.start(database.SessionLocal)
+    player_states.start(database.SessionLocal)
+    await run_in_threadpool(game_host.start)
+    if game_host.idle_seconds > 0:
+        tasks.append(asyncio.create_task(stop_idle_games_periodically(game_host)))
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await run_in_threadpool(game_host.close)
+        # Write out acknowledged scores and player states before the process goes away
+        await score_queue.close()
+        await player_states.close()
+        await run_in_threadpool(shared_state.flush)
 
 
 def create_app() -> FastAPI:
@@ -14,10 +77,27 @@ def create_app() -> FastAPI:
     # Initialize database
     init_db()
 
+    # Fresh app, fresh in-process state (rank index is re-warmed lazily)
+    score_queue.reset()
+    leaderboard_index.reset()
+    leaderboard_windows.reset()
+    leaderboard_cache.clear()
+    session_cache.clear()
+    hub.clear()
+    player_feed.clear()
+    player_states.reset()
+    game_host.reset()
+    metrics.reset()
+    # Hot reads and invalidations go through SHARED_STATE_URL (in-process by default)
+    session_cache.attach(shared_state)
+    leaderboard_cache.attach(shared_state)
+    hub.attach(shared_state)
+
     app = FastAPI(
         title="Snake Duel API",
         description="OpenAPI specification for Snake Duel multiplayer game",
         version="0.1.0",
+        lifespan=lifespan,
     )
 
     # Add CORS middleware
@@ -27,12 +107,23 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        # Let browsers read the leaderboard pagination cursor
+        expose_headers=["X-Next-Cursor"],
     )
 
+    # Per-route latency, query counts and N+1 detection, served on /metrics
+    if METRICS_ENABLED:
+        instrument_engine(database.engine)
+        if database.ASYNC_MODE:
+            instrument_engine(database.async_engine.sync_engine)
+        app.add_middleware(MetricsMiddleware, metrics=metrics)
+
     # Include routers
     app.include_router(auth_router)
     app.include_router(leaderboard_router)
     app.include_router(players_router)
+    app.include_router(export_router)
+    app.include_router(games_router)
 
     @app.get("/")
     def root():
@@ -43,7 +134,29 @@ def create_app() -> FastAPI:
     def health_check():
         """Health check endpoint"""
         return {"status": "healthy"}
-    
+
+    @app.get("/health/pool", response_model=PoolStatsSchema)
+    def pool_stats() -> PoolStatsSchema:
+        """Connection pool statistics for this worker"""
+        if database.ASYNC_MODE:
+            return PoolStatsSchema(
+                async_mode=True,
+                config=database.pool_config(),
+                pool=database.pool_status(database.async_engine),
+                sync_pool=database.pool_status(database.engine),
+            )
+        return PoolStatsSchema(
+            async_mode=False,
+            config=database.pool_config(),
+            pool=database.pool_status(database.engine),
+        )
+
+    if METRICS_ENABLED:
+        @app.get("/metrics", include_in_schema=False)
+        def prometheus_metrics() -> PlainTextResponse:
+            """Request metrics of this worker in the Prometheus text format"""
+            return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
     # Mount static files if directory exists (for production/docker)
     if os.path.isdir("/app/static"):
         app.mount("/", StaticFiles(directory="/app/static", html=True), name="static")
@@ -0,0 +1,86 @@
+"""add packed snake_data to active_players
+
+Stores the snake as packed uint8 (x, y) pairs and relaxes snake_json, which
+capped long snakes at 1000 characters, to a nullable legacy TEXT column.
+Existing rows are converted.
+
+Revision ID: 4f2a9c1e7b30
+Revises: dd129a1cbcfb
+Create Date: 2026-10-17 11:02:17.284615
+
+"""
+import json
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2a9c1e7b30'
+down_revision: Union[str, Sequence[str], None] = 'dd129a1cbcfb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+active_players = sa.table(
+    'active_players',
+    sa.column('id', sa.String),
+    sa.column('snake_json', sa.Text),
+    sa.column('snake_data', sa.LargeBinary),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('active_players') as batch_op:
+        batch_op.add_column(sa.Column('snake_data', sa.LargeBinary(), nullable=True))
+        batch_op.alter_column(
+            'snake_json',
+            existing_type=sa.String(length=1000),
+            type_=sa.Text(),
+            nullable=True,
+        )
+
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(active_players.c.id, active_players.c.snake_json)
+        .where(active_players.c.snake_json.is_not(None))
+    ).all()
+    for player_id, snake_json in rows:
+        packed = bytes(v for pos in json.loads(snake_json) for v in (pos['x'], pos['y']))
+        bind.execute(
+            active_players.update()
+            .where(active_players.c.id == player_id)
+            .values(snake_data=packed, snake_json=None)
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(active_players.c.id, active_players.c.snake_data)
+        .where(active_players.c.snake_data.is_not(None))
+    ).all()
+    for player_id, packed in rows:
+        snake = [{'x': x, 'y': y} for x, y in zip(packed[0::2], packed[1::2])]
+        bind.execute(
+            active_players.update()
+            .where(active_players.c.id == player_id)
+            .values(snake_json=json.dumps(snake, separators=(',', ':')))
+        )
+    # Snakes longer than the old column allows cannot be kept
+    bind.execute(
+        active_players.delete().where(
+            sa.or_(active_players.c.snake_json.is_(None), sa.func.length(active_players.c.snake_json) > 1000)
+        )
+    )
+
+    with op.batch_alter_table('active_players') as batch_op:
+        batch_op.alter_column(
+            'snake_json',
+            existing_type=sa.Text(),
+            type_=sa.String(length=1000),
+            nullable=False,
+        )
+        batch_op.drop_column('snake_data')
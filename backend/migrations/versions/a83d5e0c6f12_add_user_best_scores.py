@@ -0,0 +1,48 @@
+"""add user_best_scores (each player's best entry per mode)
+
+Creates the table only; populate it from existing entries with
+``python -m app.cli backfill-best-scores`` (safe to run while live).
+
+Revision ID: a83d5e0c6f12
+Revises: 4f2a9c1e7b30
+Create Date: 2026-10-17 13:40:05.118274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83d5e0c6f12'
+down_revision: Union[str, Sequence[str], None] = '4f2a9c1e7b30'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'user_best_scores',
+        sa.Column('user_id', sa.String(length=36), nullable=False),
+        sa.Column('mode', sa.String(length=50), nullable=False),
+        sa.Column('username', sa.String(length=255), nullable=False),
+        sa.Column('score', sa.Integer(), nullable=False),
+        sa.Column('entry_id', sa.String(length=36), nullable=False),
+        sa.Column('date', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('user_id', 'mode'),
+    )
+    op.create_index(
+        'ix_user_best_scores_mode_score_date',
+        'user_best_scores',
+        ['mode', sa.text('score DESC'), sa.text('date DESC')],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_best_scores_mode_score_date', table_name='user_best_scores')
+    op.drop_table('user_best_scores')
@@ -0,0 +1,58 @@
+"""add the id tie-breaker to the leaderboard sort indexes
+
+Keyset pagination orders by (score, date, id); with id in the index a page
+after a cursor is a single index seek instead of a seek on (score, date)
+plus a sort of the ties.
+
+Revision ID: c5e1b7d24a90
+Revises: a83d5e0c6f12
+Create Date: 2026-10-17 15:21:48.930517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1b7d24a90'
+down_revision: Union[str, Sequence[str], None] = 'a83d5e0c6f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_leaderboard_entries_mode_score_date_id',
+        'leaderboard_entries',
+        ['mode', sa.text('score DESC'), sa.text('date DESC'), sa.text('id DESC')],
+        unique=False,
+    )
+    op.drop_index('ix_leaderboard_entries_mode_score_date', table_name='leaderboard_entries')
+    op.create_index(
+        'ix_user_best_scores_mode_score_date_entry',
+        'user_best_scores',
+        ['mode', sa.text('score DESC'), sa.text('date DESC'), sa.text('entry_id DESC')],
+        unique=False,
+    )
+    op.drop_index('ix_user_best_scores_mode_score_date', table_name='user_best_scores')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(
+        'ix_user_best_scores_mode_score_date',
+        'user_best_scores',
+        ['mode', sa.text('score DESC'), sa.text('date DESC')],
+        unique=False,
+    )
+    op.drop_index('ix_user_best_scores_mode_score_date_entry', table_name='user_best_scores')
+    op.create_index(
+        'ix_leaderboard_entries_mode_score_date',
+        'leaderboard_entries',
+        ['mode', sa.text('score DESC'), sa.text('date DESC')],
+        unique=False,
+    )
+    op.drop_index('ix_leaderboard_entries_mode_score_date_id', table_name='leaderboard_entries')
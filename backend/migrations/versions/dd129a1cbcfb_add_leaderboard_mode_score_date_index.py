@@ -0,0 +1,37 @@
+"""add composite (mode, score desc, date desc) index on leaderboard_entries
+
+Replaces the single-column mode index, which is a prefix of the new one.
+
+Revision ID: dd129a1cbcfb
+Revises: 6c3c3c05ad3b
+Create Date: 2026-10-17 09:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'dd129a1cbcfb'
+down_revision: Union[str, Sequence[str], None] = '6c3c3c05ad3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_leaderboard_entries_mode_score_date',
+        'leaderboard_entries',
+        ['mode', sa.text('score DESC'), sa.text('date DESC')],
+        unique=False,
+    )
+    op.drop_index(op.f('ix_leaderboard_entries_mode'), table_name='leaderboard_entries')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_leaderboard_entries_mode'), 'leaderboard_entries', ['mode'], unique=False)
+    op.drop_index('ix_leaderboard_entries_mode_score_date', table_name='leaderboard_entries')
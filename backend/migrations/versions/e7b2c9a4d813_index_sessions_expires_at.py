@@ -0,0 +1,30 @@
+"""index sessions.expires_at
+
+The periodic purge deletes sessions by expiry; without an index every run
+scans the whole table.
+
+Revision ID: e7b2c9a4d813
+Revises: c5e1b7d24a90
+Create Date: 2026-10-17 18:02:11.604213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b2c9a4d813'
+down_revision: Union[str, Sequence[str], None] = 'c5e1b7d24a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(op.f('ix_sessions_expires_at'), 'sessions', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sessions_expires_at'), table_name='sessions')
@@ -0,0 +1,56 @@
+"""Fixtures shared by test modules."""
+import importlib
+import sys
+from pathlib import Path
+
+import pytest
+
+# Modules that bind the database module's engines or ``get_db`` at import
+APP_MODULES = [
+    "app.database",
+    "app.leaderboard_index",
+    "app.player_states",
+    "app.routes_auth",
+    "app.routes_export",
+    "app.routes_games",
+    "app.routes_leaderboard",
+    "app.routes_players",
+    "main",
+]
+
+
+@pytest.fixture
+def fresh_app_modules(monkeypatch):
+    """Import the app modules afresh against a given ``DATABASE_URL``.
+
+    Returns a loader taking the URL and returning the modules by name. The
+    original modules (and ``DATABASE_URL``) are put back afterwards, so other
+    tests keep their engines and dependency override keys.
+    """
+    backend_path = Path(__file__).resolve().parents[1]
+    if str(backend_path) not in sys.path:
+        sys.path.insert(0, str(backend_path))
+    import app as app_pkg
+
+    saved = {name: sys.modules.pop(name) for name in APP_MODULES if name in sys.modules}
+    loaded = []
+
+    def load(url: str) -> dict:
+        monkeypatch.setenv("DATABASE_URL", url)
+        for name in APP_MODULES:
+            sys.modules.pop(name, None)
+        modules = {name: importlib.import_module(name) for name in APP_MODULES}
+        loaded.append(modules["app.database"])
+        return modules
+
+    try:
+        yield load
+    finally:
+        for dbmod in loaded:
+            dbmod.engine.dispose()
+        for name in APP_MODULES:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+        for name, module in saved.items():
+            if name.startswith("app."):
+                setattr(app_pkg, name.split(".", 1)[1], module)
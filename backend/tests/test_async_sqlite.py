@@ -0,0 +1,155 @@
+"""Integration tests for async database mode (``sqlite+aiosqlite`` URL).
+
+The app modules are imported afresh with an async ``DATABASE_URL`` so that
+``get_db`` yields an ``AsyncSession`` and routes run their ORM code through
+``run_sync``; the original modules are restored afterwards.
+"""
+import inspect
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+pytest.importorskip("aiosqlite")
+pytest.importorskip("greenlet")
+
+
+@pytest.fixture
+def async_client(tmp_path, fresh_app_modules):
+    modules = fresh_app_modules(f"sqlite+aiosqlite:///{tmp_path / 'async.db'}")
+    dbmod = modules["app.database"]
+    assert dbmod.ASYNC_MODE
+    assert inspect.isasyncgenfunction(dbmod.get_db)
+    app = modules["main"].create_app()
+    with TestClient(app) as client:
+        yield client, dbmod
+        client.portal.call(dbmod.async_engine.dispose)
+
+
+def test_url_helpers():
+    from app.database import is_async_url, sync_url
+
+    assert is_async_url("sqlite+aiosqlite:///./x.db")
+    assert is_async_url("postgresql+asyncpg://u:p@localhost/db")
+    assert not is_async_url("postgresql://u:p@localhost/db")
+    assert sync_url("sqlite+aiosqlite:///./x.db") == "sqlite:///./x.db"
+    assert sync_url("postgresql+asyncpg://u:p@localhost/db") == "postgresql+psycopg2://u:p@localhost/db"
+    assert sync_url("sqlite:///./x.db") == "sqlite:///./x.db"
+
+
+def test_in_memory_database_is_shared_by_both_engines(fresh_app_modules):
+    modules = fresh_app_modules("sqlite+aiosqlite:///:memory:")
+    dbmod = modules["app.database"]
+    with TestClient(modules["main"].create_app()) as client:
+        resp = client.post(
+            "/auth/signup",
+            json={"username": "memuser", "email": "mem@example.com", "password": "pwd"},
+        )
+        assert resp.status_code == 201
+        # Background jobs use the sync engine; they see what requests wrote
+        session = dbmod.SessionLocal()
+        try:
+            assert [u.username for u in session.query(dbmod.User)] == ["memuser"]
+        finally:
+            session.close()
+        client.portal.call(dbmod.async_engine.dispose)
+
+
+def test_auth_flow_async(async_client):
+    client, _ = async_client
+
+    resp = client.post(
+        "/auth/signup",
+        json={"username": "asyncuser", "email": "async@example.com", "password": "pwd"},
+    )
+    assert resp.status_code == 201
+    token = resp.json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    resp = client.get("/auth/me", headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["username"] == "asyncuser"
+
+    resp = client.post("/auth/login", json={"email": "async@example.com", "password": "pwd"})
+    assert resp.json()["success"] is True
+
+    assert client.post("/auth/logout", headers=headers).status_code == 204
+    assert client.get("/auth/me", headers=headers).status_code == 401
+
+
+def test_scores_and_leaderboard_async(async_client):
+    client, _ = async_client
+
+    ranks = []
+    for i, score in enumerate([150, 300, 50]):
+        token = client.post(
+            "/auth/signup",
+            json={"username": f"a{i}", "email": f"a{i}@example.com", "password": "pwd"},
+        ).json()["token"]
+        resp = client.post(
+            "/leaderboard/score",
+            json={"score": score, "mode": "walls"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert resp.status_code == 200
+        ranks.append(resp.json()["rank"])
+    assert ranks == [1, 1, 3]
+
+    resp = client.get("/leaderboard?mode=walls")
+    assert [e["score"] for e in resp.json()] == [300, 150, 50]
+    resp = client.get("/leaderboard?mode=walls", headers={"If-None-Match": resp.headers["etag"]})
+    assert resp.status_code == 304
+
+
+def test_active_players_async(async_client):
+    client, dbmod = async_client
+
+    session = dbmod.SessionLocal()
+    try:
+        session.add(dbmod.ActivePlayer(
+            id="ap1", user_id="u_ap", username="watcher", current_score=42, mode="walls",
+            snake_json='[{"x":0,"y":0}]', food_x=5, food_y=5, direction="UP", is_playing=True,
+        ))
+        session.commit()
+    finally:
+        session.close()
+
+    resp = client.get("/players/active")
+    assert [p["username"] for p in resp.json()] == ["watcher"]
+    assert client.get("/players/ap1").json()["food"] == {"x": 5, "y": 5}
+    assert client.get("/players/missing").status_code == 404
+
+
+def test_export_async(async_client):
+    client, _ = async_client
+    sys.modules["app.routes_auth"].SERVICE_TOKEN = "s3cret"
+
+    token = client.post(
+        "/auth/signup",
+        json={"username": "exp", "email": "exp@example.com", "password": "pwd"},
+    ).json()["token"]
+    for score in (10, 20):
+        client.post(
+            "/leaderboard/score",
+            json={"score": score, "mode": "walls"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+    resp = client.get("/leaderboard/export?format=csv", headers={"X-Service-Token": "s3cret"})
+    assert resp.status_code == 200
+    lines = resp.text.splitlines()
+    assert lines[0] == "id,user_id,username,score,mode,date"
+    assert [line.split(",")[3] for line in lines[1:]] == ["20", "10"]
+
+
+def test_metrics_count_async_queries(async_client):
+    client, _ = async_client
+
+    client.post(
+        "/auth/signup",
+        json={"username": "met", "email": "met@example.com", "password": "pwd"},
+    )
+    text = client.get("/metrics").text
+    sample = 'http_request_db_queries_sum{method="POST",route="/auth/signup"} '
+    line = next(line for line in text.splitlines() if line.startswith(sample))
+    assert float(line[len(sample):]) >= 2
@@ -0,0 +1,71 @@
+"""Tests for user_best_scores maintenance and backfill."""
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.best_scores import backfill_best_scores, record_best_scores
+from app.database import Base, LeaderboardEntry, User, UserBestScore
+
+
+@pytest.fixture(scope="function")
+def db():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        User(id="u1", username="one", email="one@example.com", password_hash="pw"),
+        User(id="u2", username="two", email="two@example.com", password_hash="pw"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def entry(id, user_id, score, mode="walls", day=1):
+    return {
+        "id": id, "user_id": user_id, "username": user_id, "score": score,
+        "mode": mode, "date": datetime(2026, 1, day),
+    }
+
+
+def bests(db):
+    return {
+        (b.user_id, b.mode): (b.score, b.entry_id)
+        for b in db.query(UserBestScore)
+    }
+
+
+def test_record_keeps_highest_and_earliest(db):
+    record_best_scores(db, [entry("a", "u1", 100), entry("b", "u1", 300), entry("c", "u1", 300)])
+    record_best_scores(db, [entry("d", "u2", 50, mode="passthrough")])
+    db.commit()
+    assert bests(db) == {("u1", "walls"): (300, "b"), ("u2", "passthrough"): (50, "d")}
+
+    # Lower and equal scores leave the stored best alone
+    record_best_scores(db, [entry("e", "u1", 300, day=2), entry("f", "u1", 10)])
+    record_best_scores(db, [entry("g", "u2", 70, mode="passthrough", day=3)])
+    db.commit()
+    assert bests(db) == {("u1", "walls"): (300, "b"), ("u2", "passthrough"): (70, "g")}
+
+
+def test_backfill_matches_entries_and_is_idempotent(db):
+    for id, user_id, score, mode, day in [
+        ("a", "u1", 10, "walls", 1),
+        ("b", "u1", 40, "walls", 2),
+        ("c", "u1", 40, "walls", 3),
+        ("d", "u1", 5, "passthrough", 1),
+        ("e", "u2", 25, "walls", 1),
+    ]:
+        db.add(LeaderboardEntry(
+            id=id, user_id=user_id, username=user_id, score=score, mode=mode, date=datetime(2026, 1, day),
+        ))
+    db.commit()
+
+    assert backfill_best_scores(db, "walls") == 2
+    assert bests(db) == {("u1", "walls"): (40, "b"), ("u2", "walls"): (25, "e")}
+    assert backfill_best_scores(db) == 1
+    assert bests(db)[("u1", "passthrough")] == (5, "d")
+    assert backfill_best_scores(db) == 0
@@ -0,0 +1,155 @@
+"""Tests for the bulk import path and its CLI command."""
+import io
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import bulk_import, cli, database
+from app.bulk_import import (
+    BulkImportError,
+    import_rows,
+    read_records,
+    rebuild_best_scores,
+    rebuild_high_scores,
+)
+from app.database import Base, LeaderboardEntry, User, UserBestScore
+from app.leaderboard_cache import LeaderboardCache, serialize_board
+from app.shared_state import create_state
+
+USERS_CSV = """id,username,email,high_score,created_at
+u1,alpha,alpha@example.com,0,2026-01-01T10:00:00
+u2,beta,beta@example.com,,
+"""
+
+ENTRIES = [
+    {"id": "e1", "user_id": "u1", "username": "alpha", "score": 120, "mode": "walls", "date": "2026-01-02T00:00:00"},
+    {"user_id": "u1", "username": "alpha", "score": 300, "mode": "passthrough"},
+    {"user_id": "u2", "username": "beta", "score": "80", "mode": "walls"},
+]
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    Base.metadata.drop_all(bind=engine)
+
+
+def ndjson(records):
+    return io.StringIO("".join(json.dumps(record) + "\n" for record in records))
+
+
+def test_import_and_rebuild(engine):
+    result = import_rows(engine, "users", read_records(io.StringIO(USERS_CSV), "csv"), chunk_rows=1)
+    assert (result.rows, result.method) == (2, "executemany")
+    result = import_rows(engine, "leaderboard", read_records(ndjson(ENTRIES), "ndjson"), chunk_rows=2)
+    assert result.rows == 3
+
+    assert rebuild_high_scores(engine) == 2
+    assert rebuild_best_scores(engine) == 3
+    db = sessionmaker(bind=engine)()
+    assert {u.id: u.high_score for u in db.query(User)} == {"u1": 300, "u2": 80}
+    assert db.get(LeaderboardEntry, "e1").date.day == 2
+    assert db.get(UserBestScore, ("u1", "walls")).entry_id == "e1"
+    # No password in the input: the account can't be logged into
+    assert db.get(User, "u2").password_hash.startswith("!")
+    db.close()
+
+
+def test_bad_row_rolls_back_the_import(engine):
+    records = [{"user_id": "u1", "username": "a", "score": 1, "mode": "walls"}] * 3
+    records.append({"user_id": "u1", "username": "a", "score": "lots", "mode": "walls"})
+    with pytest.raises(BulkImportError, match="line 4: invalid score"):
+        import_rows(engine, "leaderboard", read_records(ndjson(records), "ndjson"), chunk_rows=2)
+    with pytest.raises(BulkImportError, match="line 2: missing email"):
+        import_rows(engine, "users", read_records(io.StringIO("username\nx\n"), "csv"))
+    db = sessionmaker(bind=engine)()
+    assert db.query(LeaderboardEntry).count() == 0
+    db.close()
+
+
+def test_cli_import(engine, tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(database, "engine", engine)
+    (tmp_path / "users.csv").write_text(USERS_CSV)
+    (tmp_path / "entries.ndjson").write_text(ndjson(ENTRIES).getvalue())
+
+    assert cli.main(["import", "users", str(tmp_path / "users.csv")]) == 0
+    assert cli.main(["import", "leaderboard", str(tmp_path / "entries.ndjson")]) == 0
+    output = capsys.readouterr().out
+    assert "users: 2 rows" in output
+    assert "leaderboard: 3 rows" in output and "rows/s, executemany" in output
+    assert "rebuilt high scores of 2 users" in output
+    assert "servers serve cached leaderboards" in output
+
+    (tmp_path / "bad.csv").write_text("user_id,username,score,mode\nu1,alpha,x,walls\n")
+    with pytest.raises(SystemExit, match="line 2: invalid score"):
+        cli.main(["import", "leaderboard", str(tmp_path / "bad.csv")])
+
+
+def test_cli_import_drops_cached_boards_in_servers(engine, tmp_path, monkeypatch, capsys):
+    url = f"sqlite:///{tmp_path / 'state.db'}"
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(cli, "SHARED_STATE_URL", url)
+    server = create_state(url)
+    cache = LeaderboardCache()
+    cache.attach(server)
+    try:
+        key = ("walls", 10, False)
+        cache.put(key, serialize_board([], 10), cache.generation)
+        (tmp_path / "entries.ndjson").write_text(ndjson(ENTRIES).getvalue())
+        assert cli.main(["import", "leaderboard", str(tmp_path / "entries.ndjson")]) == 0
+        assert "servers serve cached" not in capsys.readouterr().out
+        deadline = time.monotonic() + 2
+        while cache.get(key) is not None:
+            assert time.monotonic() < deadline, "board not invalidated"
+            time.sleep(0.01)
+    finally:
+        cache.detach()
+        server.close()
+
+
+def test_rebuild_keeps_high_scores_without_better_entries(engine):
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        User(id="u1", username="a", email="a@example.com", password_hash="!", high_score=500),
+        User(id="u2", username="b", email="b@example.com", password_hash="!", high_score=50),
+        User(id="u3", username="c", email="c@example.com", password_hash="!", high_score=70),
+        User(id="u4", username="d", email="d@example.com", password_hash="!", high_score=None),
+        LeaderboardEntry(user_id="u1", username="a", score=300, mode="walls"),
+        LeaderboardEntry(user_id="u2", username="b", score=80, mode="walls"),
+        LeaderboardEntry(user_id="u4", username="d", score=10, mode="walls"),
+    ])
+    db.commit()
+
+    assert rebuild_high_scores(engine) == 3
+    db.expire_all()
+    assert {u.id: u.high_score for u in db.query(User)} == {"u1": 500, "u2": 80, "u3": 70, "u4": 10}
+    db.close()
+
+
+def test_import_rebuilds_only_its_users(engine, monkeypatch):
+    db = sessionmaker(bind=engine)()
+    db.add_all([
+        User(id="u1", username="a", email="a@example.com", password_hash="!", high_score=0),
+        User(id="u2", username="b", email="b@example.com", password_hash="!", high_score=0),
+        User(id="u3", username="c", email="c@example.com", password_hash="!", high_score=0),
+        # Stale on purpose: not part of the import, so not touched
+        LeaderboardEntry(user_id="u3", username="c", score=90, mode="walls"),
+    ])
+    db.commit()
+    result = import_rows(engine, "leaderboard", read_records(ndjson(ENTRIES), "ndjson"))
+    assert result.user_ids == {"u1", "u2"}
+
+    monkeypatch.setattr(bulk_import, "HIGH_SCORE_CHUNK_USERS", 1)
+    assert rebuild_high_scores(engine, result.user_ids) == 2
+    assert {u.id: u.high_score for u in db.query(User)} == {"u1": 300, "u2": 80, "u3": 0}
+    db.close()
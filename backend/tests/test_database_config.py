@@ -0,0 +1,88 @@
+"""Unit tests for engine/pool configuration in app.database."""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool, StaticPool
+
+from app import database
+
+
+@pytest.fixture
+def pool_env(monkeypatch):
+    def configure(**settings):
+        for name, value in settings.items():
+            monkeypatch.setattr(database, name, value)
+    return configure
+
+
+def test_queue_pool_settings_for_server_databases(pool_env):
+    pool_env(DB_POOL_CLASS="", DB_POOL_SIZE=3, DB_MAX_OVERFLOW=7, DB_POOL_TIMEOUT=5.0,
+             DB_POOL_RECYCLE=600, DB_POOL_PRE_PING=True)
+    options = database.engine_options("postgresql://u:p@localhost/db")
+    assert "poolclass" not in options
+    assert options["pool_size"] == 3
+    assert options["max_overflow"] == 7
+    assert options["pool_timeout"] == 5.0
+    assert options["pool_recycle"] == 600
+    assert options["pool_pre_ping"] is True
+
+
+def test_sqlite_memory_uses_shared_static_pool(pool_env):
+    pool_env(DB_POOL_CLASS="")
+    options = database.engine_options("sqlite:///:memory:")
+    assert options["poolclass"] is StaticPool
+    assert options["connect_args"] == {"check_same_thread": False}
+    assert "pool_size" not in options
+
+
+def test_sqlite_file_pool_class_override(pool_env, tmp_path):
+    pool_env(DB_POOL_CLASS="null")
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    options = database.engine_options(url)
+    assert options["poolclass"] is NullPool
+    assert "pool_size" not in options
+    engine = create_engine(url, **options)
+    assert database.pool_status(engine)["checked_out"] is None
+
+
+def test_unknown_pool_class_rejected(pool_env):
+    pool_env(DB_POOL_CLASS="bogus")
+    with pytest.raises(ValueError):
+        database.engine_options("sqlite:///x.db")
+
+
+def test_pool_status_counts_checkouts(pool_env, tmp_path):
+    pool_env(DB_POOL_CLASS="queue", DB_POOL_SIZE=2)
+    url = f"sqlite:///{tmp_path / 'pool.db'}"
+    engine = create_engine(url, **database.engine_options(url))
+    assert isinstance(engine.pool, QueuePool)
+    with engine.connect():
+        stats = database.pool_status(engine)
+        assert stats["size"] == 2
+        assert stats["checked_out"] == 1
+    assert database.pool_status(engine)["checked_out"] == 0
+
+
+def test_queue_pool_class_on_async_url(pool_env, tmp_path):
+    pytest.importorskip("aiosqlite")
+    pytest.importorskip("greenlet")
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    pool_env(DB_POOL_CLASS="queue", DB_POOL_SIZE=2)
+    url = f"sqlite+aiosqlite:///{tmp_path / 'pool.db'}"
+    options = database.engine_options(url)
+    assert options["poolclass"] is AsyncAdaptedQueuePool
+    assert options["pool_size"] == 2
+
+    async def checkout():
+        engine = create_async_engine(url, **options)
+        try:
+            async with engine.connect():
+                return database.pool_status(engine)
+        finally:
+            await engine.dispose()
+
+    stats = asyncio.run(checkout())
+    assert stats["pool_class"] == "AsyncAdaptedQueuePool"
+    assert stats["checked_out"] == 1
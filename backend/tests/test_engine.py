@@ -0,0 +1,202 @@
+"""Tests for the server-side snake engine, including parity with game-logic.ts."""
+import random
+
+import pytest
+
+from app.engine import (
+    DOWN, FreeCells, Game, INITIAL_SPEED, LEFT, MIN_SPEED, RIGHT, UP, DIRECTIONS, parse_direction,
+)
+
+
+# --- Reference: a line-by-line transcription of frontend/src/lib/game-logic.ts ---
+
+def ts_generate_food(snake, grid_size, rand):
+    snake_set = {(p["x"], p["y"]) for p in snake}
+    attempts = 0
+    while True:
+        food = {"x": int(rand() * grid_size), "y": int(rand() * grid_size)}
+        attempts += 1
+        if not ((food["x"], food["y"]) in snake_set and attempts < grid_size * grid_size):
+            return food
+
+
+def ts_create_initial_state(grid_size, mode, rand):
+    center = grid_size // 2
+    snake = [{"x": center - i, "y": center} for i in range(3)]
+    return {
+        "snake": snake, "food": ts_generate_food(snake, grid_size, rand),
+        "direction": "RIGHT", "nextDirection": "RIGHT", "score": 0,
+        "isGameOver": False, "mode": mode, "gridSize": grid_size, "speed": 150,
+    }
+
+
+def ts_set_direction(state, new_direction):
+    opposites = {"UP": "DOWN", "DOWN": "UP", "LEFT": "RIGHT", "RIGHT": "LEFT"}
+    if state["isGameOver"] or new_direction == opposites[state["direction"]]:
+        return state
+    return {**state, "nextDirection": new_direction}
+
+
+def ts_move_snake(state, rand):
+    if state["isGameOver"]:
+        return state
+    snake, food, nd, grid = state["snake"], state["food"], state["nextDirection"], state["gridSize"]
+    head = dict(snake[0])
+    head["y"] += {"UP": -1, "DOWN": 1}.get(nd, 0)
+    head["x"] += {"LEFT": -1, "RIGHT": 1}.get(nd, 0)
+    if state["mode"] == "passthrough":
+        head["x"] = (head["x"] + grid) % grid
+        head["y"] = (head["y"] + grid) % grid
+    elif not (0 <= head["x"] < grid and 0 <= head["y"] < grid):
+        return {**state, "isGameOver": True, "direction": nd}
+    if any(seg == head for seg in snake[:-1]):
+        return {**state, "isGameOver": True, "direction": nd}
+    if head == food:
+        new_snake = [head, *snake]
+        return {
+            **state, "snake": new_snake, "food": ts_generate_food(new_snake, grid, rand),
+            "score": state["score"] + 10, "direction": nd,
+            "speed": max(50, state["speed"] - 5),
+        }
+    return {**state, "snake": [head, *snake[:-1]], "direction": nd}
+
+
+def assert_same(game, state):
+    assert game.snake() == [(p["x"], p["y"]) for p in state["snake"]]
+    assert game.food_position() == (state["food"]["x"], state["food"]["y"])
+    assert game.score == state["score"]
+    assert game.speed == state["speed"]
+    assert game.game_over == state["isGameOver"]
+    assert DIRECTIONS[game.direction] == state["direction"]
+
+
+@pytest.mark.parametrize("mode", ["passthrough", "walls"])
+@pytest.mark.parametrize("grid_size", [4, 6, 20])
+def test_parity_with_client_rules(mode, grid_size):
+    for seed in range(40):
+        inputs = random.Random(seed)
+        ts_rand = random.Random(seed)
+        game = Game(grid_size, mode, random=random.Random(seed).random, placement="client")
+        state = ts_create_initial_state(grid_size, mode, ts_rand.random)
+        assert_same(game, state)
+
+        for _ in range(400):
+            if inputs.random() < 0.3:
+                direction = inputs.choice(DIRECTIONS)
+                game.set_direction(parse_direction(direction))
+                state = ts_set_direction(state, direction)
+            game.tick()
+            state = ts_move_snake(state, ts_rand.random)
+            assert_same(game, state)
+            if state["isGameOver"]:
+                break
+
+
+def test_initial_state():
+    game = Game(20, "walls", random=random.Random(1).random)
+    assert game.snake() == [(10, 10), (9, 10), (8, 10)]
+    assert game.direction == RIGHT
+    assert game.speed == INITIAL_SPEED
+    assert game.food_position() not in game.snake()
+
+
+def test_walls_end_game_and_passthrough_wraps():
+    walls = Game(6, "walls")
+    walls.food = 0
+    assert [walls.tick() for _ in range(3)] == [True, True, False]
+    assert walls.game_over
+
+    wrap = Game(6, "passthrough")
+    wrap.food = 0
+    for _ in range(3):
+        assert wrap.tick()
+    assert wrap.snake()[0] == (0, 3)
+
+
+def test_reversal_is_ignored():
+    game = Game(20, "passthrough")
+    assert not game.set_direction(LEFT)
+    assert game.set_direction(UP)
+    # Still checked against the direction actually moved, as in setDirection
+    assert game.set_direction(DOWN)
+    assert game.next_direction == DOWN
+
+
+def test_chasing_the_tail_is_allowed():
+    game = Game(20, "passthrough", random=lambda: 0.0)
+    game.food = (10 * 20) + 11
+    game.tick()
+    assert game.length == 4
+    game.food = 0
+    for direction in (DOWN, LEFT, UP):
+        game.set_direction(direction)
+        assert game.tick()
+    assert not game.game_over
+
+
+def test_eating_grows_scores_and_speeds_up():
+    game = Game(40, "passthrough", random=random.Random(3).random)
+    for _ in range(21):
+        x, y = game.snake()[0]
+        game.food = y * 40 + (x + 1) % 40
+        assert game.tick()
+    assert game.score == 210
+    assert game.length == 24
+    assert game.speed == MIN_SPEED
+
+
+def test_snake_data_matches_codec():
+    from app.snake_codec import decode_snake
+
+    game = Game(20, "walls")
+    assert decode_snake(game.snake_data()) == game.to_dict()["snake"]
+
+
+def test_free_cells_swap_remove():
+    free = FreeCells(5)
+    for cell in (1, 4, 0):
+        free.remove(cell)
+    assert len(free) == 2 and 1 not in free and 2 in free
+    assert sorted(free.sample(lambda: i / 2) for i in range(2)) == [2, 3]
+    free.add(4)
+    assert len(free) == 3 and 4 in free
+    assert free.sample(lambda: 0.99) == 4
+    free.replace(2, 1)
+    assert len(free) == 3 and 2 not in free and 1 in free
+    assert sorted(free.sample(lambda: i / 3) for i in range(3)) == [1, 3, 4]
+
+
+def test_free_placement_tracks_the_board():
+    for seed in range(20):
+        inputs = random.Random(seed)
+        game = Game(6, "passthrough", random=random.Random(seed).random)
+        for _ in range(500):
+            if inputs.random() < 0.3:
+                game.set_direction(inputs.randrange(4))
+            if not game.tick():
+                break
+            free = {cell for cell in range(36) if cell in game.free}
+            assert free == {cell for cell in range(36) if not game.occupied[cell]}
+            assert len(game.free) == len(free)
+            if free:
+                assert game.food in free
+
+
+def test_free_placement_is_seeded():
+    def play(seed):
+        game = Game(8, "walls", random=random.Random(seed).random)
+        foods = []
+        while game.tick():
+            x, y = game.snake()[0]
+            fx, fy = game.food_position()
+            game.set_direction(RIGHT if fx > x else LEFT if fx < x else DOWN if fy > y else UP)
+            foods.append(game.food)
+        return foods
+
+    assert play(5) == play(5)
+    assert play(5) != play(6)
+
+
+def test_unknown_placement_is_rejected():
+    with pytest.raises(ValueError):
+        Game(20, "walls", placement="grid")
@@ -0,0 +1,112 @@
+"""Parity of the NumPy batch engine with the per-game engine.
+
+``Game`` is checked against a transcription of ``game-logic.ts`` in
+test_engine.py; here every batch game must match a ``Game`` built from the
+same seed and fed the same turns, move by move.
+"""
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.engine import Game, Mulberry32
+from app.engine.batch import BatchGames, _mulberry32
+
+
+def assert_same(batch, i, game):
+    assert batch.snake(i) == game.snake()
+    assert batch.food_position(i) == game.food_position()
+    assert batch.score[i] == game.score
+    assert batch.speed[i] == game.speed
+    assert batch.direction[i] == game.direction
+    assert batch.game_over[i] == game.game_over
+    assert batch.ticks[i] == game.ticks
+    assert batch.to_dict(i) == game.to_dict()
+
+
+def test_mulberry32_matches_the_scalar_generator():
+    seeds = [0, 1, 42, 0xFFFFFFFF, 123456789]
+    state = np.array(seeds, dtype=np.uint32)
+    scalars = [Mulberry32(seed) for seed in seeds]
+    for _ in range(100):
+        assert _mulberry32(state).tolist() == [rng() for rng in scalars]
+
+
+@pytest.mark.parametrize("grid_size", [4, 6, 20])
+def test_parity_with_game(grid_size):
+    count = 64
+    seeds = list(range(1000, 1000 + count))
+    modes = ["passthrough" if i % 2 else "walls" for i in range(count)]
+    batch = BatchGames(count, grid_size, modes, seeds=seeds)
+    games = [Game(grid_size, mode, random=Mulberry32(seed), placement="client") for mode, seed in zip(modes, seeds)]
+    turns = random.Random(grid_size)
+
+    for i, game in enumerate(games):
+        assert_same(batch, i, game)
+    for _ in range(400):
+        picked = [i for i in range(count) if turns.random() < 0.3]
+        directions = [turns.randrange(4) for _ in picked]
+        accepted = batch.set_directions(np.array(picked, dtype=np.int64), np.array(directions))
+        assert accepted.tolist() == [games[i].set_direction(d) for i, d in zip(picked, directions)]
+
+        moved = batch.step()
+        assert moved.tolist() == [game.tick() for game in games]
+        for i, game in enumerate(games):
+            assert_same(batch, i, game)
+        if batch.game_over.all():
+            break
+
+
+# A Hamiltonian cycle of the 4x4 board: following it, a snake only dies
+# once it fills the board
+CYCLE = [
+    (0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (2, 1), (1, 1), (1, 2),
+    (2, 2), (3, 2), (3, 3), (2, 3), (1, 3), (0, 3), (0, 2), (0, 1),
+]
+NEXT_TURN = {
+    a: {(1, 0): 1, (-1, 0): 3, (0, 1): 2, (0, -1): 0}[(b[0] - a[0], b[1] - a[1])]
+    for a, b in zip(CYCLE, CYCLE[1:] + CYCLE[:1])
+}
+
+
+def test_full_board_food_under_the_snake():
+    # Food ends up under the snake once the board is nearly full, and the
+    # body can outgrow the ring
+    count = 100
+    seeds = list(range(count))
+    batch = BatchGames(count, 4, "passthrough", seeds=seeds)
+    games = [Game(4, "passthrough", random=Mulberry32(seed), placement="client") for seed in seeds]
+    for _ in range(1500):
+        turns = [NEXT_TURN[game.snake()[0]] for game in games]
+        batch.set_directions(np.arange(count), np.array(turns))
+        for game, turn in zip(games, turns):
+            game.set_direction(turn)
+        batch.step()
+        for game in games:
+            game.tick()
+    for i, game in enumerate(games):
+        assert_same(batch, i, game)
+    assert batch.length.max() > 16
+
+
+def test_restart_reuses_ended_games():
+    batch = BatchGames(3, 4, "walls", seeds=[1, 2, 3])
+    while not batch.game_over.all():
+        batch.step()
+    batch.restart(np.array([0, 2]), seeds=[7, 8])
+    assert batch.game_over.tolist() == [False, True, False]
+    assert_same(batch, 0, Game(4, "walls", random=Mulberry32(7), placement="client"))
+    assert_same(batch, 2, Game(4, "walls", random=Mulberry32(8), placement="client"))
+    assert batch.step().tolist() == [True, False, True]
+
+
+def test_rejects_bad_arguments():
+    with pytest.raises(ValueError):
+        BatchGames(2, 3)
+    with pytest.raises(ValueError):
+        BatchGames(2, 20, "teleport")
+    with pytest.raises(ValueError):
+        BatchGames(2, 20, ["walls"])
+    with pytest.raises(ValueError):
+        BatchGames(2, 20, seeds=[1])
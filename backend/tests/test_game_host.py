@@ -0,0 +1,325 @@
+"""Tests for the batched tick scheduler and the sharded game host."""
+import asyncio
+import json
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from main import create_app
+from app.database import Base, get_db
+from app.engine import Game, TickScheduler
+from app.engine.scheduler import step
+from app.game_host import GameHost, GameHostError, GameLimitError, shard_of
+from app.pubsub import LOBBY_TOPIC, PubSubHub
+from app.snake_codec import SnakeDelta, apply_delta, encode_snake
+
+
+def test_games_due_together_are_stepped_in_one_batch():
+    scheduler = TickScheduler()
+    a, b = Game(20, "passthrough"), Game(20, "passthrough")
+    scheduler.add("a", a, now=0.001)
+    scheduler.add("b", b, now=0.004)  # rounded up to the same slot
+
+    assert scheduler.next_due() == pytest.approx(0.155)
+    assert scheduler.run_due(0.15) == []
+    [batch] = scheduler.run_due(0.157)
+    assert [game_id for game_id, _ in batch.updates] == ["a", "b"]
+    assert batch.lag == pytest.approx(0.002)
+    assert a.ticks == b.ticks == 1
+    assert scheduler.next_due() == pytest.approx(0.305)
+
+
+def test_each_game_keeps_its_own_speed():
+    scheduler = TickScheduler()
+    slow, fast = Game(20, "passthrough"), Game(20, "passthrough")
+    fast.speed = 50
+    scheduler.add("slow", slow, now=0.0)
+    scheduler.add("fast", fast, now=0.0)
+
+    for now in range(0, 301, 5):
+        scheduler.run_due(now / 1000)
+    assert (slow.ticks, fast.ticks) == (2, 6)
+
+
+def test_removed_and_finished_games_leave_the_wheel():
+    scheduler = TickScheduler()
+    doomed = Game(4, "walls")  # one move from the right wall
+    doomed.food = 0  # out of its way, in the top left corner
+    gone = Game(20, "passthrough")
+    scheduler.add("doomed", doomed, now=0.0)
+    scheduler.add("gone", gone, now=0.0)
+    scheduler.remove("gone")
+
+    updates, ended = [], []
+    for now in range(0, 1001, 5):
+        for batch in scheduler.run_due(now / 1000):
+            updates += batch.updates
+            ended += batch.ended
+    assert gone.ticks == 0
+    assert [game_id for game_id, _ in updates] == ["doomed"] * 2
+    assert updates[-1][1] == {"direction": "RIGHT", "is_playing": False}
+    assert ended == [("doomed", 0)]
+    assert len(scheduler) == 0 and scheduler.next_due() is None
+
+
+def test_falling_behind_slows_games_instead_of_bursting():
+    scheduler = TickScheduler()
+    game = Game(20, "passthrough")
+    scheduler.add("g", game, now=0.0)
+
+    [batch] = scheduler.run_due(1.0)
+    assert batch.lag == pytest.approx(0.85)
+    assert game.ticks == 1
+    assert scheduler.next_due() == pytest.approx(1.005)
+
+
+def test_step_changes_replay_the_game():
+    rng = random.Random(7)
+    for seed in range(20):
+        game = Game(8, "passthrough", random=random.Random(seed).random)
+        snake, score, food = game.snake_data(), game.score, game.food_position()
+        while not game.game_over and game.ticks < 300:
+            if rng.random() < 0.3:
+                game.set_direction(rng.randrange(4))
+            changes = step(game)
+            if not game.game_over:
+                delta = changes["snake_delta"]
+                snake = apply_delta(snake, SnakeDelta(encode_snake(delta["heads"]), delta["trim"]))
+                score = changes.get("current_score", score)
+                if "food" in changes:
+                    food = (changes["food"]["x"], changes["food"]["y"])
+                assert snake == game.snake_data()
+                assert (score, food) == (game.score, game.food_position())
+
+
+def test_shards_are_picked_by_game_id():
+    assert shard_of("abc", 4) == shard_of("abc", 4)
+    assert {shard_of(str(i), 4) for i in range(100)} == {0, 1, 2, 3}
+
+
+@pytest.fixture(params=[0, 2], ids=["thread", "processes"])
+def host(request):
+    host = GameHost(PubSubHub(), processes=request.param)
+    host.start()
+    yield host
+    host.close()
+
+
+def test_host_publishes_ticks_and_reports_lag(host):
+    async def scenario():
+        lobby = host.hub.subscribe(LOBBY_TOPIC)
+        game = await host.create_game("u1", "alice", "passthrough", seed=42)
+        assert game["username"] == "alice"
+        assert game["snake"] == [{"x": 10, "y": 10}, {"x": 9, "y": 10}, {"x": 8, "y": 10}]
+        started = json.loads(await asyncio.wait_for(lobby.get(), 2))
+        assert started["type"] == "update" and started["id"] == game["id"]
+        assert started["changes"]["snake"] == game["snake"]
+
+        state, subscription = await host.watch(game["id"])
+        first = json.loads(await asyncio.wait_for(subscription.get(), 2))
+        assert first["id"] == game["id"]
+        assert first["changes"]["snake_delta"]["heads"][0]["x"] == state["snake"][0]["x"] + 1
+
+        assert host.turn(game["id"], 0)  # UP
+        for _ in range(10):
+            changes = json.loads(await asyncio.wait_for(subscription.get(), 2))["changes"]
+            if changes.get("direction") == "UP":
+                break
+        else:
+            pytest.fail("turn never applied")
+
+        assert host.stop_game(game["id"])
+        while (message := json.loads(await asyncio.wait_for(subscription.get(), 2)))["type"] != "removed":
+            pass
+        assert message == {"type": "removed", "id": game["id"]}
+        assert host.get(game["id"]) is None
+        assert await host.snapshot(game["id"]) is None
+        subscription.close()
+        lobby.close()
+
+    asyncio.run(scenario())
+    stats = host.stats()
+    assert stats["games"] == 0
+    shard = next(s for s in stats["shards"] if s["ticks"])
+    assert shard["moves"] >= 2 and shard["lag_ms_max"] >= shard["lag_ms_p50"] >= 0
+
+
+def test_lobby_hears_hosted_scores_and_lists_live_games(host):
+    async def scenario():
+        lobby = host.hub.subscribe(LOBBY_TOPIC)
+        # Seed 33 puts the first food straight ahead, at (18, 10)
+        game = await host.create_game("u1", "alice", "passthrough", seed=33)
+        started = json.loads(await asyncio.wait_for(lobby.get(), 2))
+        assert started["id"] == game["id"]
+        [row] = host.lobby()
+        assert (row["id"], row["username"], row["mode"], row["current_score"], row["is_playing"]) == (
+            game["id"], "alice", "passthrough", 0, True,
+        )
+
+        scored = json.loads(await asyncio.wait_for(lobby.get(), 3))
+        assert scored == {"type": "update", "id": game["id"], "changes": {"current_score": 10}}
+        assert host.lobby()[0]["current_score"] == 10
+
+        host.stop_game(game["id"])
+        assert json.loads(await asyncio.wait_for(lobby.get(), 2))["type"] == "removed"
+        assert host.lobby() == []
+        lobby.close()
+
+    asyncio.run(scenario())
+
+
+def test_host_refuses_games_when_full_or_stopped():
+    host = GameHost(PubSubHub(), processes=0, max_games=1)
+    with pytest.raises(GameHostError):
+        host.start_game("u1", "alice", "walls")
+    host.start()
+    try:
+        asyncio.run(host.create_game("u1", "alice", "walls"))
+        with pytest.raises(GameHostError):
+            host.start_game("u1", "alice", "walls")
+    finally:
+        host.close()
+    assert len(host) == 0
+
+
+def test_host_caps_games_per_user_and_stops_idle_and_revoked_ones():
+    host = GameHost(PubSubHub(), processes=0, max_games_per_user=2, idle_seconds=60)
+    host.start()
+    try:
+        first, _ = host.start_game("u1", "alice", "passthrough", session="t1")
+        second, _ = host.start_game("u1", "alice", "passthrough", session="t2")
+        with pytest.raises(GameLimitError):
+            host.start_game("u1", "alice", "passthrough", session="t1")
+        other, _ = host.start_game("u2", "bob", "passthrough", session="t3")
+
+        # A turn keeps a game alive; a passthrough game without turns never ends
+        assert host.turn(second, 0)
+        now = host._last_turn[second]
+        for game_id in (first, other):
+            host._last_turn[game_id] -= 30
+        assert host.stop_idle(now) == 0
+        assert host.stop_idle(now + 30) == 2
+        assert [host.get(g) is None for g in (first, second, other)] == [True, False, True]
+
+        # Stopped games free the user's slots
+        host.start_game("u1", "alice", "passthrough", session="t1")
+        assert host.stop_session("t1") == 1
+        assert host.stop_session("t2") == 1
+        assert len(host) == 0
+    finally:
+        host.close()
+
+
+def test_turn_on_a_dead_shard_is_a_host_error(monkeypatch):
+    host = GameHost(PubSubHub(), processes=0)
+    host.start()
+    try:
+        game_id, _ = host.start_game("u1", "alice", "passthrough")
+
+        def broken(*command):
+            raise BrokenPipeError(32, "Broken pipe")
+
+        monkeypatch.setattr(host._shards[0], "send", broken)
+        with pytest.raises(GameHostError):
+            host.turn(game_id, 0)
+        monkeypatch.undo()
+    finally:
+        host.close()
+
+
+@pytest.fixture
+def client():
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(bind=engine)
+    app = create_app()
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        yield client
+    engine.dispose()
+
+
+def signup(client, name):
+    resp = client.post("/auth/signup", json={"username": name, "email": f"{name}@example.com", "password": "pwd"})
+    return {"Authorization": f"Bearer {resp.json()['token']}"}
+
+
+def test_games_api_and_spectating(client):
+    alice, bob = signup(client, "alice"), signup(client, "bob")
+    assert client.post("/games", json={"mode": "walls"}).status_code == 401
+
+    resp = client.post("/games", json={"mode": "walls", "grid_size": 30, "seed": 1}, headers=alice)
+    assert resp.status_code == 201
+    game = resp.json()
+    assert game["username"] == "alice" and game["mode"] == "walls" and game["is_playing"]
+
+    assert client.get(f"/games/{game['id']}").json()["id"] == game["id"]
+    assert client.get(f"/players/{game['id']}").json()["username"] == "alice"
+    assert client.get("/games/missing").status_code == 404
+
+    with client.websocket_connect(f"/players/{game['id']}/stream") as ws:
+        snapshot = ws.receive_json()
+        assert snapshot["type"] == "snapshot"
+        snake = encode_snake(snapshot["player"]["snake"])
+        # Deltas continue exactly from the snapshot
+        for _ in range(3):
+            delta = ws.receive_json()["changes"]["snake_delta"]
+            snake = apply_delta(snake, SnakeDelta(encode_snake(delta["heads"]), delta["trim"]))
+        current = client.get(f"/games/{game['id']}").json()
+        assert len(current["snake"]) == len(snake) // 2
+
+        direction = "UP"
+        assert client.post(f"/games/{game['id']}/direction", json={"direction": direction}, headers=bob).status_code == 403
+        assert client.post(f"/games/{game['id']}/direction", json={"direction": direction}, headers=alice).status_code == 204
+        assert client.delete(f"/games/{game['id']}", headers=bob).status_code == 403
+        assert client.delete(f"/games/{game['id']}", headers=alice).status_code == 204
+        while (message := ws.receive_json())["type"] != "removed":
+            pass
+    assert client.get(f"/games/{game['id']}").status_code == 404
+
+    stats = client.get("/games/stats").json()
+    assert stats["running"] and stats["games"] == 0
+    assert stats["shards"][0]["ticks"] >= 3
+    assert 'game_ticks_total{shard="0"}' in client.get("/metrics").text
+
+
+def test_games_end_with_their_session_and_are_capped_per_user(client, monkeypatch):
+    from app.game_host import game_host
+
+    monkeypatch.setattr(game_host, "max_games_per_user", 1)
+    alice = signup(client, "alice")
+    game = client.post("/games", json={"mode": "passthrough"}, headers=alice).json()
+    resp = client.post("/games", json={"mode": "passthrough"}, headers=alice)
+    assert resp.status_code == 429
+
+    assert client.post("/auth/logout", headers=alice).status_code == 204
+    assert game_host.get(game["id"]) is None
+    assert client.get(f"/games/{game['id']}").status_code == 404
+    assert client.get("/games/stats").json()["max_games_per_user"] == 1
+
+
+def test_hosted_games_are_listed_for_late_spectators(client):
+    alice = signup(client, "alice")
+    game = client.post("/games", json={"mode": "passthrough"}, headers=alice).json()
+
+    [listed] = client.get("/players/active").json()
+    assert (listed["id"], listed["username"], listed["is_playing"]) == (game["id"], "alice", True)
+    with client.websocket_connect("/players/stream") as ws:
+        snapshot = ws.receive_json()
+        assert [player["id"] for player in snapshot["players"]] == [game["id"]]
+    assert client.delete(f"/games/{game['id']}", headers=alice).status_code == 204
+    assert client.get("/players/active").json() == []
@@ -4,42 +4,21 @@ These tests set `DATABASE_URL` to a temporary SQLite file and then
 create the FastAPI app and database schema. They exercise the full
 request path via `TestClient` (signup, submit score, leaderboard).
 """
-import os
-import importlib
-import sys
-from pathlib import Path
-
 import pytest
 from fastapi.testclient import TestClient
 
 
-def create_app_with_sqlite(tmp_path: Path):
-    # Prepare a temporary sqlite file and set env var before importing app modules
-    db_file = tmp_path / "integration.db"
-    os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
-    # Make sure the backend package is importable (tests run from backend/)
-    repo_root = Path(__file__).resolve().parents[1]
-    backend_path = repo_root / "backend"
-    if str(backend_path) not in sys.path:
-        sys.path.insert(0, str(backend_path))
-
-    # Reload database module so it picks up the env var and creates an engine
-    import app.database as dbmod
-    importlib.reload(dbmod)
-    # Import/create the app after the database module has been reloaded
-    import main as main_mod
-
-    importlib.reload(main_mod)
-    app = main_mod.create_app()
-
-    # Ensure tables exist in the sqlite file
-    dbmod.Base.metadata.create_all(bind=dbmod.engine)
-
+@pytest.fixture
+def sqlite_app(tmp_path, fresh_app_modules):
+    """The app and database module against a temporary SQLite file"""
+    modules = fresh_app_modules(f"sqlite:///{tmp_path / 'integration.db'}")
+    dbmod = modules["app.database"]
+    app = modules["main"].create_app()
     return app, dbmod
 
 
-def test_signup_submit_and_leaderboard(tmp_path):
-    app, dbmod = create_app_with_sqlite(tmp_path)
+def test_signup_submit_and_leaderboard(sqlite_app):
+    app, dbmod = sqlite_app
     client = TestClient(app)
 
     # Signup a new user
@@ -71,8 +50,8 @@ def test_signup_submit_and_leaderboard(tmp_path):
     assert any(e["username"] == "integuser" and e["score"] == 250 for e in entries)
 
 
-def test_login_and_logout_flow(tmp_path):
-    app, dbmod = create_app_with_sqlite(tmp_path)
+def test_login_and_logout_flow(sqlite_app):
+    app, dbmod = sqlite_app
     client = TestClient(app)
 
     # Create user via signup
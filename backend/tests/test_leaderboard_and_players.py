@@ -1,28 +1,14 @@
 """Integration tests for leaderboard ranking and active players endpoints."""
-import os
-import importlib
-import sys
-from pathlib import Path
-
 from fastapi.testclient import TestClient
 import pytest
 
 
-def create_app_with_sqlite(tmp_path: Path):
-    db_file = tmp_path / "integration2.db"
-    os.environ["DATABASE_URL"] = f"sqlite:///{db_file}"
-    repo_root = Path(__file__).resolve().parents[1]
-    backend_path = repo_root / "backend"
-    if str(backend_path) not in sys.path:
-        sys.path.insert(0, str(backend_path))
-
-    import app.database as dbmod
-    importlib.reload(dbmod)
-
-    import main as main_mod
-    importlib.reload(main_mod)
-    app = main_mod.create_app()
-    dbmod.Base.metadata.create_all(bind=dbmod.engine)
+@pytest.fixture
+def sqlite_app(tmp_path, fresh_app_modules):
+    """The app and database module against a temporary SQLite file"""
+    modules = fresh_app_modules(f"sqlite:///{tmp_path / 'integration2.db'}")
+    dbmod = modules["app.database"]
+    app = modules["main"].create_app()
     return app, dbmod
 
 
@@ -32,8 +18,8 @@ def signup_user(client: TestClient, username: str, email: str, password: str = "
     return resp.json()["token"]
 
 
-def test_leaderboard_ranking_multiuser(tmp_path):
-    app, dbmod = create_app_with_sqlite(tmp_path)
+def test_leaderboard_ranking_multiuser(sqlite_app):
+    app, dbmod = sqlite_app
     client = TestClient(app)
 
     users = [
@@ -57,8 +43,8 @@ def test_leaderboard_ranking_multiuser(tmp_path):
     assert entries[2]["username"] == "u1"
 
 
-def test_active_players_endpoint(tmp_path):
-    app, dbmod = create_app_with_sqlite(tmp_path)
+def test_active_players_endpoint(sqlite_app):
+    app, dbmod = sqlite_app
     client = TestClient(app)
 
     # Insert an active player directly using the DB session
@@ -0,0 +1,109 @@
+"""Unit tests for the serialized leaderboard cache."""
+import json
+import time
+from datetime import datetime
+
+from app.leaderboard_cache import LeaderboardCache, serialize_board
+from app.schemas import LeaderboardEntrySchema
+
+
+def make_entries(*scores, mode="walls"):
+    return [
+        LeaderboardEntrySchema(
+            id=f"e{i}", user_id="u1", username="u1", score=score, mode=mode,
+            date=datetime(2025, 1, 1, 12, 0, i),
+        )
+        for i, score in enumerate(scores)
+    ]
+
+
+def test_serialize_board_body_and_etag():
+    board = serialize_board(make_entries(300, 200), limit=10)
+    data = json.loads(board.body)
+    assert [e["score"] for e in data] == [300, 200]
+    assert data[0]["date"] == "2025-01-01T12:00:00"
+    assert board.min_score == 200
+    assert board.etag == serialize_board(make_entries(300, 200), limit=10).etag
+    assert board.etag != serialize_board(make_entries(300), limit=10).etag
+
+
+def test_if_none_match_parsing():
+    board = serialize_board(make_entries(100), limit=1)
+    assert board.matches(board.etag)
+    assert board.matches(f'"other", {board.etag}')
+    assert board.matches(f"W/{board.etag}")
+    assert board.matches("*")
+    assert not board.matches('"other"')
+    assert not board.matches(None)
+
+
+def load_board(cache, key, *scores, mode="walls"):
+    cache.put(key, serialize_board(make_entries(*scores, mode=mode), key[1]), cache.generation)
+
+
+def test_get_after_put():
+    cache = LeaderboardCache()
+    assert cache.get(("walls", 2)) is None
+    load_board(cache, ("walls", 2), 300, 200)
+    assert cache.get(("walls", 2)).min_score == 200
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_invalidate_score_only_drops_boards_it_changes():
+    cache = LeaderboardCache()
+    load_board(cache, ("walls", 2), 300, 200)
+    load_board(cache, (None, 2), 300, 200)
+    load_board(cache, ("passthrough", 2), 900, 800, mode="passthrough")
+    load_board(cache, ("walls", 10), 300, 200)
+
+    # Below the walls top-2: only the not-yet-full top-10 board changes
+    cache.invalidate_score("walls", 100)
+    assert cache.get(("walls", 2)) is not None
+    assert cache.get((None, 2)) is not None
+    assert cache.get(("walls", 10)) is None
+
+    # Ties with the lowest entry push it out, so the board changes
+    cache.invalidate_score("walls", 200)
+    assert cache.get(("walls", 2)) is None
+    assert cache.get((None, 2)) is None
+    assert cache.get(("passthrough", 2)) is not None
+
+
+def test_load_racing_with_invalidation_is_not_stored():
+    cache = LeaderboardCache()
+    generation = cache.generation
+    cache.invalidate_score("walls", 500)
+    cache.put(("walls", 5), serialize_board(make_entries(300), 5), generation)
+    assert cache.get(("walls", 5)) is None
+
+
+def test_lru_bound():
+    cache = LeaderboardCache(max_entries=2)
+    for limit in (1, 2, 3):
+        load_board(cache, ("walls", limit), 100)
+    assert cache.get(("walls", 1)) is None
+    assert cache.get(("walls", 3)) is not None
+
+
+def test_boards_expire_after_ttl():
+    cache = LeaderboardCache(ttl=0.01)
+    load_board(cache, ("walls", 2), 300, 200)
+    assert cache.get(("walls", 2)) is not None
+    time.sleep(0.02)
+    assert cache.get(("walls", 2)) is None
+
+
+def test_invalidate_windows_and_all():
+    cache = LeaderboardCache()
+    window_key = ("walls", 2, False, "day", datetime(2025, 1, 1))
+    load_board(cache, ("walls", 2, False), 300, 200)
+    load_board(cache, window_key, 300, 200)
+
+    generation = cache.generation
+    cache.invalidate_windows()
+    assert cache.get(window_key) is None
+    assert cache.get(("walls", 2, False)) is not None
+    assert cache.generation != generation
+
+    cache.invalidate_all()
+    assert cache.get(("walls", 2, False)) is None
@@ -0,0 +1,130 @@
+"""Unit tests for the in-memory leaderboard rank index."""
+import random
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, User, LeaderboardEntry
+from app.leaderboard_index import LeaderboardIndex, ScoreCounts
+
+
+@pytest.fixture(scope="function")
+def db():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id="u1", username="u1", email="u1@example.com", password_hash="pw"))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def add_entries(db, mode, scores):
+    for score in scores:
+        db.add(LeaderboardEntry(user_id="u1", username="u1", score=score, mode=mode))
+    db.commit()
+
+
+def test_score_counts_matches_linear_scan():
+    rng = random.Random(42)
+    scores = [rng.randrange(-50, 5000) for _ in range(2000)]
+    counts = ScoreCounts()
+    for score in scores:
+        counts.add(score)
+
+    assert counts.total == len(scores)
+    for probe in [-100, -50, -1, 0, 10, 2500, 4999, 5000, 10**6]:
+        assert counts.count_greater(probe) == sum(1 for s in scores if s > probe)
+
+
+def test_score_counts_sized_by_distinct_scores():
+    counts = ScoreCounts({0: 1})
+    counts.add(10**6)
+    counts.add(-10**5)
+    assert counts.rank(10**6) == 1
+    assert counts.rank(0) == 2
+    assert counts.rank(-10**5) == 3
+    assert counts.rank(-10**6) == 4
+
+    counts.add(2**40)
+    counts.add(-2**40)
+    assert len(counts._tree) == 6
+    assert counts.rank(0) == 3 and counts.rank(-2**40) == 5
+
+
+def test_failed_add_leaves_counts_unchanged(monkeypatch):
+    counts = ScoreCounts({10: 2, 20: 1})
+
+    def broken(keys, counts):
+        raise MemoryError()
+
+    monkeypatch.setattr(counts, "_build", broken)
+    with pytest.raises(MemoryError):
+        counts.add(15)
+    assert counts.total == 3 and dict(counts.counts) == {10: 2, 20: 1}
+    assert counts.rank(15) == 2
+
+
+def test_ensure_warms_mode_from_table(db):
+    add_entries(db, "walls", [100, 200, 300])
+    add_entries(db, "passthrough", [1000])
+
+    index = LeaderboardIndex()
+    index.ensure(db, "walls")
+    assert index.is_warm("walls")
+    assert not index.is_warm("passthrough")
+    assert index.rank("walls", 250) == 2
+    assert index.rank("walls", 50) == 4
+    assert index.rank("passthrough", 10) is None
+
+
+def test_reconcile_fixes_drift(db):
+    add_entries(db, "walls", [100, 200])
+    index = LeaderboardIndex()
+    index.warm(db)
+
+    # Rows written behind the index's back (other worker, bulk import)
+    add_entries(db, "walls", [500, 600])
+    add_entries(db, "passthrough", [50])
+    assert index.rank("walls", 150) == 2
+
+    assert sorted(index.reconcile(db)) == ["passthrough", "walls"]
+    assert index.rank("walls", 150) == 4
+    assert index.rank("passthrough", 0) == 2
+    assert index.reconcile(db) == []
+
+
+def test_reconcile_skips_modes_with_writes_in_flight(db):
+    index = LeaderboardIndex()
+    index.ensure(db, "walls")
+
+    with index.writing("walls"):
+        add_entries(db, "walls", [100])
+        assert index.reconcile(db) == []
+        index.add("walls", 100)
+
+    assert index.rank("walls", 0) == 2
+    assert index.reconcile(db) == []
+
+
+def test_ensure_retries_load_that_overlapped_a_write(db):
+    add_entries(db, "walls", [100])
+
+    class RacingIndex(LeaderboardIndex):
+        loads = 0
+
+        def _load_counts(self, db, mode=None):
+            counts = super()._load_counts(db, mode)
+            if not self.loads:
+                # Another request commits while our first load is running
+                with self.writing("walls"):
+                    add_entries(db, "walls", [200])
+            self.loads += 1
+            return counts
+
+    index = RacingIndex()
+    index.ensure(db, "walls")
+    assert index.loads == 2
+    assert index.rank("walls", 0) == 3
@@ -0,0 +1,166 @@
+"""Tests for the per-window top-K leaderboard buckets."""
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import leaderboard_windows
+from app.database import Base, LeaderboardEntry, User
+from app.leaderboard_cache import LeaderboardCache, serialize_board
+from app.leaderboard_windows import (
+    LeaderboardWindows,
+    next_rollover,
+    refresh_windows_periodically,
+    window_start,
+)
+
+NOW = datetime(2026, 10, 14, 15, 30)  # a Wednesday
+
+
+@pytest.fixture(scope="function")
+def db():
+    engine = create_engine("sqlite:///:memory:", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(User(id="u1", username="u1", email="u1@example.com", password_hash="pw"))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+def entry(id, score, date, mode="walls"):
+    return {"id": id, "user_id": "u1", "username": "u1", "score": score, "mode": mode, "date": date}
+
+
+def add_entries(db, *entries):
+    db.add_all(LeaderboardEntry(**e) for e in entries)
+    db.commit()
+
+
+def scores(entries):
+    return [e.score for e in entries]
+
+
+def test_window_starts():
+    assert window_start("day", NOW) == datetime(2026, 10, 14)
+    assert window_start("week", NOW) == datetime(2026, 10, 12)
+    assert window_start("month", NOW) == datetime(2026, 10, 1)
+    assert next_rollover(NOW) == datetime(2026, 10, 15)
+    with pytest.raises(ValueError):
+        window_start("year", NOW)
+
+
+def test_buckets_load_only_their_period(db):
+    add_entries(
+        db,
+        entry("a", 500, datetime(2026, 9, 30)),
+        entry("b", 400, datetime(2026, 10, 2)),
+        entry("c", 300, datetime(2026, 10, 13)),
+        entry("d", 200, datetime(2026, 10, 14, 9)),
+        entry("e", 100, datetime(2026, 10, 14, 10), mode="passthrough"),
+    )
+    windows = LeaderboardWindows(top_k=10)
+    assert windows.top("walls", "day", 5, NOW) is None
+
+    for mode in ("walls", "passthrough", None):
+        for window in ("day", "week", "month"):
+            windows.ensure(db, mode, window, NOW)
+    assert scores(windows.top("walls", "day", 5, NOW)) == [200]
+    assert scores(windows.top("walls", "week", 5, NOW)) == [300, 200]
+    assert scores(windows.top("walls", "month", 5, NOW)) == [400, 300, 200]
+    assert scores(windows.top(None, "day", 5, NOW)) == [200, 100]
+    # Modes outside the game's have no buckets
+    windows.ensure(db, "unknown", "day", NOW)
+    assert windows.top("unknown", "day", 5, NOW) is None
+    # Beyond the bucket size the caller has to go to the table
+    assert windows.top("walls", "day", 11, NOW) is None
+
+
+def test_add_keeps_top_k(db):
+    windows = LeaderboardWindows(top_k=3)
+    windows.ensure(db, "walls", "day", NOW)
+    windows.add([entry(str(i), score, NOW) for i, score in enumerate([10, 50, 30, 20, 40])])
+    # Stale entries and repeats are ignored
+    windows.add([entry("old", 999, datetime(2026, 10, 13)), entry("1", 50, NOW)])
+    assert scores(windows.top("walls", "day", 3, NOW)) == [50, 40, 30]
+
+
+def test_rolls_over_to_the_next_period(db):
+    add_entries(db, entry("a", 100, NOW))
+    windows = LeaderboardWindows()
+    windows.refresh(db, NOW)
+    tomorrow = datetime(2026, 10, 15, 0, 5)
+    assert scores(windows.top("walls", "day", 5, NOW)) == [100]
+    assert windows.top("walls", "day", 5, tomorrow) is None
+    windows.refresh(db, tomorrow)
+    assert windows.top("walls", "day", 5, tomorrow) == []
+    assert scores(windows.top("walls", "week", 5, tomorrow)) == [100]
+
+
+def test_entries_added_during_a_load_are_kept(db, monkeypatch):
+    windows = LeaderboardWindows()
+    real_load = leaderboard_windows.load_window
+
+    def racing_load(db, mode, start, limit):
+        loaded = real_load(db, mode, start, limit)
+        # Committed and added after the read, before the bucket is installed
+        windows.add([entry("late", 70, NOW)])
+        return loaded
+
+    monkeypatch.setattr(leaderboard_windows, "load_window", racing_load)
+    windows.ensure(db, "walls", "day", NOW)
+    assert scores(windows.top("walls", "day", 5, NOW)) == [70]
+
+
+def test_periodic_refresh_drops_cached_window_boards():
+    cache = LeaderboardCache()
+    key = ("walls", 5, False, "day", window_start("day"))
+    cache.put(key, serialize_board([], 5), cache.generation)
+    refreshed = []
+
+    class Windows:
+        def refresh(self, db):
+            refreshed.append(db)
+
+    class Session:
+        def close(self):
+            pass
+
+    async def scenario():
+        task = asyncio.create_task(refresh_windows_periodically(Windows(), Session, 0.01, cache))
+        while cache.get(key) is not None:
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(asyncio.wait_for(scenario(), 2))
+    assert refreshed
+
+
+def test_other_modes_and_all_modes_board(db):
+    add_entries(
+        db,
+        entry("a", 100, datetime(2026, 10, 14, 9)),
+        entry("b", 300, datetime(2026, 10, 14, 9), mode="speedrun"),
+    )
+    windows = LeaderboardWindows(top_k=10)
+    windows.refresh(db, NOW)
+    assert scores(windows.top(None, "day", 5, NOW)) == [300, 100]
+    assert scores(leaderboard_windows.load_window(db, "speedrun", window_start("day", NOW), 5)) == [300]
+
+    windows.add([entry("c", 200, NOW, mode="speedrun")])
+    assert scores(windows.top(None, "day", 5, NOW)) == [300, 200, 100]
+    assert scores(windows.top("walls", "day", 5, NOW)) == [100]
+
+
+def test_ties_are_ordered_by_id(db):
+    add_entries(db, *(entry(id, 100, NOW) for id in ("x1", "x3")))
+    windows = LeaderboardWindows(top_k=2)
+    windows.ensure(db, "walls", "day", NOW)
+    add_entries(db, entry("x2", 100, NOW))
+    windows.add([entry("x2", 100, NOW)])
+    # Same order as the table query: newest, then highest id, first
+    expected = [e.id for e in leaderboard_windows.load_window(db, "walls", window_start("day", NOW), 2)]
+    assert [e.id for e in windows.top("walls", "day", 2, NOW)] == expected == ["x3", "x2"]
@@ -1,4 +1,10 @@
 """Tests for Snake Duel API with SQLAlchemy"""
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine, event
@@ -6,7 +12,26 @@ from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 
 from main import create_app
-from app.database import Base, get_db
+from app import routes_auth, routes_export, routes_leaderboard
+from app.database import Base, LeaderboardEntry, User, get_db
+from app.engine import DIRECTIONS, DOWN, LEFT, RIGHT, UP, Game
+from app.engine.replay import Mulberry32
+from app.leaderboard_windows import leaderboard_windows
+from app.score_queue import score_queue
+from app.session_cache import session_cache
+
+
+def play_to_food(seed, mode, foods):
+    """Steer an engine game to ``foods`` pieces of food; returns (score, replay)"""
+    game = Game(20, mode, random=Mulberry32(seed), placement="client")
+    inputs = []
+    while game.score < foods * 10:
+        (x, y), (fx, fy) = game.snake()[0], game.food_position()
+        wanted = RIGHT if fx > x else LEFT if fx < x else DOWN if fy > y else UP
+        if wanted != game.direction and game.set_direction(wanted):
+            inputs.append([game.ticks, DIRECTIONS[wanted]])
+        assert game.tick()
+    return game.score, {"seed": seed, "ticks": game.ticks, "inputs": inputs}
 
 
 # Create a temporary database for testing
@@ -74,6 +99,15 @@ class TestHealth:
         assert data["status"] == "healthy"
 
 
+    def test_pool_stats(self, client):
+        """Test connection pool statistics endpoint"""
+        response = client.get("/health/pool")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["pool"]["pool_class"]
+        assert "pool_size" in data["config"]
+
+
 class TestAuth:
     """Authentication tests"""
 
@@ -254,6 +288,50 @@ class TestAuth:
         assert data["username"] == "currentuser"
         assert data["email"] == "current@example.com"
 
+    def test_logout_revokes_cached_token(self, client, monkeypatch):
+        """Test a token served from the session cache stops working after logout"""
+        signup_response = client.post(
+            "/auth/signup",
+            json={
+                "username": "cachedlogout",
+                "email": "cachedlogout@example.com",
+                "password": "password123",
+            },
+        )
+        headers = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+
+        assert client.get("/auth/me", headers=headers).status_code == 200
+        assert client.get("/auth/me", headers=headers).status_code == 200
+        assert client.get("/auth/session-cache").status_code == 403
+        monkeypatch.setattr(routes_auth, "SERVICE_TOKEN", "s3cret")
+        stats = client.get("/auth/session-cache", headers={"X-Service-Token": "s3cret"}).json()
+        assert stats["hits"] >= 1
+
+        client.post("/auth/logout", headers=headers)
+        assert client.get("/auth/me", headers=headers).status_code == 401
+
+    def test_get_current_user_high_score_after_submission(self, client):
+        """Test cached user snapshot reflects a new high score"""
+        signup_response = client.post(
+            "/auth/signup",
+            json={
+                "username": "highscorer",
+                "email": "highscorer@example.com",
+                "password": "password123",
+            },
+        )
+        headers = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+        client.post("/leaderboard/score", json={"score": 400, "mode": "walls"}, headers=headers)
+        client.post("/leaderboard/score", json={"score": 100, "mode": "walls"}, headers=headers)
+
+        response = client.get("/auth/me", headers=headers)
+        assert response.json()["high_score"] == 400
+
+        # And the database agrees once the snapshot is gone
+        session_cache.clear()
+        response = client.get("/auth/me", headers=headers)
+        assert response.json()["high_score"] == 400
+
     def test_get_current_user_invalid_token(self, client):
         """Test get current user with invalid token"""
         response = client.get(
@@ -337,6 +415,29 @@ class TestLeaderboard:
         assert data[0]["score"] > data[1]["score"]
         assert data[1]["score"] > data[2]["score"]
 
+    def test_submit_score_rank(self, client):
+        """Test ranks returned on submission reflect earlier scores in the mode"""
+        ranks = []
+        for i, score in enumerate([300, 100, 200, 300]):
+            signup_response = client.post(
+                "/auth/signup",
+                json={
+                    "username": f"ranker{i}",
+                    "email": f"ranker{i}@example.com",
+                    "password": "password123",
+                },
+            )
+            token = signup_response.json()["token"]
+            response = client.post(
+                "/leaderboard/score",
+                json={"score": score, "mode": "walls"},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            ranks.append(response.json()["rank"])
+
+        # Ties share the rank of the best equal score
+        assert ranks == [1, 2, 2, 1]
+
     def test_leaderboard_filter_by_mode(self, client):
         """Test leaderboard filtering by mode"""
         # Create user
@@ -371,6 +472,321 @@ class TestLeaderboard:
         assert data[0]["score"] == 100
 
 
+    def test_leaderboard_distinct_players(self, client):
+        """Test distinct_players lists each player's best once"""
+        for name, scores in (("grinder", [50, 300, 120, 300]), ("casual", [200])):
+            signup_response = client.post(
+                "/auth/signup",
+                json={"username": name, "email": f"{name}@example.com", "password": "password123"},
+            )
+            headers = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+            for score in scores:
+                client.post("/leaderboard/score", json={"score": score, "mode": "walls"}, headers=headers)
+
+        entries = client.get("/leaderboard?mode=walls&limit=3").json()
+        assert [e["username"] for e in entries] == ["grinder", "grinder", "casual"]
+
+        players = client.get("/leaderboard?mode=walls&limit=3&distinct_players=true").json()
+        assert [(p["username"], p["score"]) for p in players] == [("grinder", 300), ("casual", 200)]
+        # The best is the first entry to reach it
+        first_300 = [e for e in entries if e["score"] == 300][-1]
+        assert players[0]["id"] == first_300["id"]
+
+    def test_leaderboard_windows(self, client, db_session, monkeypatch):
+        """Test window boards only show the current period"""
+        signup_response = client.post(
+            "/auth/signup",
+            json={"username": "windowed", "email": "windowed@example.com", "password": "password123"},
+        )
+        user_id = signup_response.json()["user"]["id"]
+        headers = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+        db_session.add(LeaderboardEntry(
+            user_id=user_id, username="windowed", score=900, mode="walls", date=datetime(2000, 1, 1),
+        ))
+        db_session.commit()
+
+        assert client.get("/leaderboard?mode=walls&window=day").json() == []
+        client.post("/leaderboard/score", json={"score": 40, "mode": "walls"}, headers=headers)
+        client.post("/leaderboard/score", json={"score": 60, "mode": "passthrough"}, headers=headers)
+
+        assert [e["score"] for e in client.get("/leaderboard?mode=walls&window=day").json()] == [40]
+        assert [e["score"] for e in client.get("/leaderboard?window=month").json()] == [60, 40]
+        # Modes without buckets come from the table
+        client.post("/leaderboard/score", json={"score": 50, "mode": "speedrun"}, headers=headers)
+        assert [e["score"] for e in client.get("/leaderboard?mode=speedrun&window=day").json()] == [50]
+        assert [e["score"] for e in client.get("/leaderboard?window=day").json()] == [60, 50, 40]
+        # Past the bucket size the board comes from the table
+        monkeypatch.setattr(leaderboard_windows, "top_k", 1)
+        assert [e["score"] for e in client.get("/leaderboard?window=week&limit=5").json()] == [60, 50, 40]
+        assert [e["score"] for e in client.get("/leaderboard?mode=walls").json()] == [900, 40]
+        assert client.get("/leaderboard?window=year").status_code == 422
+        assert client.get("/leaderboard?window=day&distinct_players=true").status_code == 422
+
+    def test_leaderboard_cursor_pagination(self, client, db_session):
+        """Test following X-Next-Cursor walks the board without gaps or repeats"""
+        signup_response = client.post(
+            "/auth/signup",
+            json={"username": "pager", "email": "pager@example.com", "password": "password123"},
+        )
+        user_id = signup_response.json()["user"]["id"]
+        tie = datetime(2026, 1, 1)
+        scores = [50, 40, 40, 40, 30, 20, 20, 10]
+        for i, score in enumerate(scores):
+            db_session.add(LeaderboardEntry(
+                id=f"entry-{i}", user_id=user_id, username="pager", score=score, mode="walls",
+                # Several entries share both score and date; the id orders them
+                date=tie if score == 40 else datetime(2026, 1, 2 + i),
+            ))
+        db_session.commit()
+
+        full = client.get("/leaderboard?mode=walls&limit=100").json()
+        pages, cursor = [], None
+        while True:
+            url = "/leaderboard?mode=walls&limit=3" + (f"&cursor={cursor}" if cursor else "")
+            response = client.get(url)
+            pages.append([e["id"] for e in response.json()])
+            cursor = response.headers.get("x-next-cursor")
+            if cursor is None:
+                break
+        assert [len(page) for page in pages] == [3, 3, 2]
+        assert [entry_id for page in pages for entry_id in page] == [e["id"] for e in full]
+        assert [e["score"] for e in full] == sorted(scores, reverse=True)
+
+        assert client.get("/leaderboard?mode=walls&cursor=bogus").status_code == 422
+        assert client.get(f"/leaderboard?cursor={cursor or 'x'}").status_code == 422
+        assert client.get("/leaderboard?limit=101").status_code == 422
+
+    def test_leaderboard_around_player(self, client):
+        """Test around-me returns neighbours of the player's best entry with ranks"""
+        user_ids = {}
+        for i, score in enumerate([100, 200, 300, 400, 500]):
+            signup_response = client.post(
+                "/auth/signup",
+                json={"username": f"near{i}", "email": f"near{i}@example.com", "password": "password123"},
+            )
+            headers = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+            user_ids[score] = signup_response.json()["user"]["id"]
+            client.post("/leaderboard/score", json={"score": score, "mode": "walls"}, headers=headers)
+            if score == 300:
+                client.post("/leaderboard/score", json={"score": 50, "mode": "walls"}, headers=headers)
+
+        response = client.get(f"/leaderboard/around/{user_ids[300]}?mode=walls&n=2")
+        assert response.status_code == 200
+        assert [(e["score"], e["rank"]) for e in response.json()] == [
+            (500, 1), (400, 2), (300, 3), (200, 4), (100, 5),
+        ]
+        response = client.get(f"/leaderboard/around/{user_ids[500]}?mode=walls&n=1")
+        assert [e["score"] for e in response.json()] == [500, 400]
+
+        assert client.get(f"/leaderboard/around/{user_ids[500]}?mode=passthrough").status_code == 404
+        assert client.get(f"/leaderboard/around/{user_ids[500]}").status_code == 422
+
+    def test_leaderboard_etag_not_modified(self, client):
+        """Test unchanged leaderboard is answered with 304 for a matching ETag"""
+        response = client.get("/leaderboard?mode=walls")
+        assert response.status_code == 200
+        etag = response.headers["etag"]
+
+        response = client.get("/leaderboard?mode=walls", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.headers["etag"] == etag
+
+    def test_leaderboard_cache_invalidated_by_submission(self, client):
+        """Test a submitted score shows up on a previously cached board"""
+        signup_response = client.post(
+            "/auth/signup",
+            json={
+                "username": "cacheuser",
+                "email": "cacheuser@example.com",
+                "password": "password123",
+            },
+        )
+        token = signup_response.json()["token"]
+        etag = client.get("/leaderboard?mode=walls").headers["etag"]
+
+        client.post(
+            "/leaderboard/score",
+            json={"score": 700, "mode": "walls"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+        response = client.get("/leaderboard?mode=walls", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["etag"] != etag
+        assert response.json()[0]["score"] == 700
+
+    def test_submit_score_with_replay(self, client, monkeypatch):
+        """Test replays are re-simulated and must reproduce the score"""
+        signup_response = client.post(
+            "/auth/signup",
+            json={
+                "username": "replayer",
+                "email": "replayer@example.com",
+                "password": "password123",
+            },
+        )
+        headers = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+        score, replay = play_to_food(2024, "passthrough", 3)
+
+        response = client.post(
+            "/leaderboard/score",
+            json={"score": score, "mode": "passthrough", "replay": replay},
+            headers=headers,
+        )
+        assert response.status_code == 200
+
+        response = client.post(
+            "/leaderboard/score",
+            json={"score": score + 10, "mode": "passthrough", "replay": replay},
+            headers=headers,
+        )
+        assert response.status_code == 422
+
+        # A replay that runs the snake into the wall is invalid
+        response = client.post(
+            "/leaderboard/score",
+            json={"score": 0, "mode": "walls", "replay": {"seed": 1, "ticks": 50}},
+            headers=headers,
+        )
+        assert response.status_code == 422
+
+        monkeypatch.setattr(routes_leaderboard, "REQUIRE_SCORE_REPLAY", True)
+        response = client.post(
+            "/leaderboard/score",
+            json={"score": score, "mode": "passthrough"},
+            headers=headers,
+        )
+        assert response.status_code == 422
+
+        board = client.get("/leaderboard?mode=passthrough").json()
+        assert [entry["score"] for entry in board] == [score]
+
+    def test_submit_scores_batch(self, client, monkeypatch):
+        """Test batch ingestion writes all entries, high scores and ranks"""
+        monkeypatch.setattr(routes_auth, "SERVICE_TOKEN", "s3cret")
+        users, headers = {}, {}
+        for name in ("alpha", "beta"):
+            signup_response = client.post(
+                "/auth/signup",
+                json={"username": name, "email": f"{name}@example.com", "password": "password123"},
+            )
+            users[name] = signup_response.json()["user"]["id"]
+            headers[name] = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+        client.post("/leaderboard/score", json={"score": 250, "mode": "walls"}, headers=headers["beta"])
+
+        items = [
+            {"user_id": users["alpha"], "score": 100, "mode": "walls"},
+            {"user_id": users["beta"], "score": 300, "mode": "walls"},
+            {"user_id": users["alpha"], "score": 400, "mode": "walls"},
+            {"user_id": users["beta"], "score": 50, "mode": "passthrough"},
+        ]
+        response = client.post(
+            "/leaderboard/scores:batch",
+            json={"items": items},
+            headers={"X-Service-Token": "s3cret"},
+        )
+        assert response.status_code == 200
+        assert response.json() == {"success": True, "ranks": [4, 2, 1, 1]}
+
+        board = client.get("/leaderboard?mode=walls").json()
+        assert [entry["score"] for entry in board] == [400, 300, 250, 100]
+        # High scores are each user's best, including scores from before the batch
+        assert client.get("/auth/me", headers=headers["alpha"]).json()["high_score"] == 400
+        assert client.get("/auth/me", headers=headers["beta"]).json()["high_score"] == 300
+
+    def test_submit_score_write_behind(self, client, db_engine, monkeypatch):
+        """Test write-behind submissions are acknowledged before they are written"""
+        monkeypatch.setattr(score_queue, "enabled", True)
+        signup_response = client.post(
+            "/auth/signup",
+            json={"username": "queued", "email": "queued@example.com", "password": "password123"},
+        )
+        headers = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+
+        response = client.post("/leaderboard/score", json={"score": 90, "mode": "walls"}, headers=headers)
+        assert response.json() == {"success": True, "rank": 1, "provisional": True}
+        assert client.get("/auth/me", headers=headers).json()["high_score"] == 90
+        assert client.get("/leaderboard?mode=walls").json() == []
+
+        asyncio.run(score_queue.flush(sessionmaker(bind=db_engine)))
+        assert [e["score"] for e in client.get("/leaderboard?mode=walls").json()] == [90]
+
+        monkeypatch.setattr(score_queue, "max_size", 0)
+        response = client.post("/leaderboard/score", json={"score": 5, "mode": "walls"}, headers=headers)
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+    def test_submit_scores_batch_requires_service_token(self, client, monkeypatch):
+        """Test batch ingestion is disabled without a token and rejects bad ones"""
+        body = {"items": [{"user_id": "nobody", "score": 1, "mode": "walls"}]}
+        assert client.post("/leaderboard/scores:batch", json=body).status_code == 403
+
+        monkeypatch.setattr(routes_auth, "SERVICE_TOKEN", "s3cret")
+        response = client.post("/leaderboard/scores:batch", json=body, headers={"X-Service-Token": "nope"})
+        assert response.status_code == 401
+        response = client.post("/leaderboard/scores:batch", json=body, headers={"X-Service-Token": "s3cret"})
+        assert response.status_code == 422
+
+
+class TestExport:
+    """Streaming export tests"""
+
+    def test_export_leaderboard_and_users(self, client, monkeypatch):
+        """Test exports stream every row as NDJSON or CSV behind the service token"""
+        assert client.get("/leaderboard/export").status_code == 403
+        monkeypatch.setattr(routes_auth, "SERVICE_TOKEN", "s3cret")
+        headers = {"X-Service-Token": "s3cret"}
+
+        for name, scores in (("exporter", [30, 10]), ("other", [20])):
+            signup_response = client.post(
+                "/auth/signup",
+                json={"username": name, "email": f"{name}@example.com", "password": "password123"},
+            )
+            auth = {"Authorization": f"Bearer {signup_response.json()['token']}"}
+            for score in scores:
+                client.post("/leaderboard/score", json={"score": score, "mode": "walls"}, headers=auth)
+        client.post("/leaderboard/score", json={"score": 99, "mode": "passthrough"}, headers=auth)
+
+        response = client.get("/leaderboard/export", headers=headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        rows = [json.loads(line) for line in response.text.splitlines()]
+        assert [(r["mode"], r["score"]) for r in rows] == [
+            ("passthrough", 99), ("walls", 30), ("walls", 20), ("walls", 10),
+        ]
+        assert set(rows[0]) == {"id", "user_id", "username", "score", "mode", "date"}
+
+        response = client.get("/leaderboard/export?format=csv&mode=walls", headers=headers)
+        assert response.headers["content-type"].startswith("text/csv")
+        assert 'filename="leaderboard.csv"' in response.headers["content-disposition"]
+        records = list(csv.DictReader(io.StringIO(response.text)))
+        assert [(r["username"], int(r["score"])) for r in records] == [("exporter", 30), ("other", 20), ("exporter", 10)]
+
+        users = [json.loads(line) for line in client.get("/users/export", headers=headers).text.splitlines()]
+        assert sorted(u["username"] for u in users) == ["exporter", "other"]
+        assert "password_hash" not in users[0]
+
+    def test_export_streams_in_chunks(self, db_session, monkeypatch):
+        """Test the export is produced chunk by chunk from the cursor"""
+        monkeypatch.setattr(routes_export, "EXPORT_CHUNK_ROWS", 2)
+        db_session.add(User(id="bulk", username="bulk", email="bulk@example.com", password_hash="pw"))
+        db_session.add_all(
+            LeaderboardEntry(user_id="bulk", username="bulk", score=i, mode="walls") for i in range(5)
+        )
+        db_session.commit()
+
+        async def drain():
+            response = await routes_export.export_leaderboard(format="csv", mode=None, db=db_session)
+            return [chunk async for chunk in response.body_iterator]
+
+        chunks = asyncio.run(drain())
+        # Header, then partitions of 2, 2 and 1 rows
+        assert [chunk.count(b"\n") for chunk in chunks] == [1, 2, 2, 1]
+        lines = b"".join(chunks).decode().splitlines()
+        assert lines[0] == "id,user_id,username,score,mode,date"
+        assert [line.split(",")[3] for line in lines[1:]] == ["4", "3", "2", "1", "0"]
+
+
 class TestPlayers:
     """Players/watch mode tests"""
 
@@ -0,0 +1,113 @@
+"""Tests for the request metrics middleware and /metrics."""
+import logging
+
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from main import create_app
+from app.database import Base, User, get_db, run_db
+from app.metrics import Metrics, MetricsMiddleware, instrument_engine, metrics
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    instrument_engine(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def client(engine):
+    """A small app with one query-per-row route, behind the middleware"""
+    SessionLocal = sessionmaker(bind=engine)
+    registry = Metrics(n_plus_one_threshold=3)
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, metrics=registry)
+
+    def get_session():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def _names(db: Session, n: int) -> list[str]:
+        # One lookup per row: the pattern the detector is for
+        return [db.execute(select(User.username).where(User.id == str(i))).scalar() for i in range(n)]
+
+    @app.get("/names/{n}")
+    async def names(n: int, db: Session = Depends(get_session)):
+        return await run_db(db, _names, n)
+
+    @app.get("/sync")
+    def sync_route(db: Session = Depends(get_session)):
+        return db.execute(text("SELECT 1")).scalar()
+
+    with TestClient(app) as client:
+        client.registry = registry
+        yield client
+
+
+def test_counts_queries_per_route(client):
+    client.get("/names/2")
+    client.get("/names/1")
+    client.get("/sync")
+    client.get("/nope")
+    text_ = client.registry.render()
+    assert 'http_requests_total{method="GET",route="/names/{n}",status="200"} 2' in text_
+    assert 'http_requests_total{method="GET",route="/sync",status="200"} 1' in text_
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in text_
+    # 2 + 1 queries over two requests
+    assert 'http_request_db_queries_sum{method="GET",route="/names/{n}"} 3.000000' in text_
+    assert 'http_request_db_queries_bucket{method="GET",route="/names/{n}",le="1"} 1' in text_
+    assert 'http_request_db_queries_bucket{method="GET",route="/names/{n}",le="2"} 2' in text_
+    assert 'http_request_duration_seconds_count{method="GET",route="/sync"} 1' in text_
+    assert 'http_request_db_seconds_total{method="GET",route="/sync"}' in text_
+
+
+def test_flags_repeated_statements_once(client, caplog):
+    with caplog.at_level(logging.WARNING, logger="app.metrics"):
+        client.get("/names/2")
+        client.get("/names/5")
+        client.get("/names/5")
+    assert client.registry.n_plus_one("GET", "/names/{n}") == 2
+    warnings = [r for r in caplog.records if "Possible N+1" in r.getMessage()]
+    assert len(warnings) == 1
+    assert "ran 5 times" in warnings[0].getMessage()
+
+
+def test_queries_outside_requests_are_ignored(engine, client):
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert "http_request_db_queries_sum" not in client.registry.render()
+
+
+def test_metrics_endpoint(engine):
+    app = create_app()
+    SessionLocal = sessionmaker(bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    with TestClient(app) as client:
+        client.post("/auth/signup", json={"username": "m", "email": "m@example.com", "password": "pwd"})
+        client.get("/leaderboard?limit=5")
+        resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_requests_total{method="POST",route="/auth/signup",status="201"} 1' in resp.text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/leaderboard",le="+Inf"} 1' in resp.text
+    assert metrics.n_plus_one("POST", "/auth/signup") == 0
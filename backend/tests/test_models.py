@@ -53,7 +53,23 @@ def test_activeplayer_to_dict_and_snake_json(db):
     fetched = db.query(ActivePlayer).filter(ActivePlayer.id == "p1").first()
     d = fetched.to_dict()
     assert d["username"] == "player1"
-    assert isinstance(d["snake"], list)
+    assert d["snake"] == snake
+
+
+def test_activeplayer_packed_snake_has_no_length_cap(db):
+    snake = [{"x": i % 40, "y": i // 40} for i in range(400)]
+    ap = ActivePlayer(
+        id="p2", user_id="u1", username="player2", mode="walls",
+        food_x=0, food_y=0, direction="UP",
+    )
+    ap.set_snake(snake)
+    db.add(ap)
+    db.commit()
+
+    fetched = db.query(ActivePlayer).filter(ActivePlayer.id == "p2").first()
+    assert fetched.snake_json is None
+    assert len(fetched.snake_data) == 800
+    assert fetched.to_dict()["snake"] == snake
 
 
 def test_session_and_leaderboard_entry(db):
@@ -71,3 +87,31 @@ def test_session_and_leaderboard_entry(db):
     assert fetched_sess is not None
     fetched_entry = db.query(LeaderboardEntry).filter(LeaderboardEntry.user_id == "u2").first()
     assert fetched_entry.score == 123
+
+
+def test_leaderboard_composite_index_used_for_top_n(engine):
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM leaderboard_entries "
+            "WHERE mode = 'walls' ORDER BY score DESC, date DESC LIMIT 10"
+        )).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_leaderboard_entries_mode_score_date" in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_leaderboard_keyset_page_is_an_index_seek(engine):
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        plan = conn.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM leaderboard_entries "
+            "WHERE mode = 'walls' AND (score, date, id) < (100, '2026-01-01', 'x') "
+            "ORDER BY score DESC, date DESC, id DESC LIMIT 10"
+        )).fetchall()
+    details = " ".join(row[-1] for row in plan)
+    assert "ix_leaderboard_entries_mode_score_date_id" in details
+    assert "(score,date,id)<" in details
+    assert "TEMP B-TREE" not in details
@@ -0,0 +1,244 @@
+"""Tests for coalesced player state updates and their bulk write-back."""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from main import create_app
+from app import routes_auth, routes_players
+from app.database import ActivePlayer, Base, get_db
+from app.player_states import PlayerStates, player_states
+from app.pubsub import PlayerFeed, PubSubHub, player_topic
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for i in (1, 2):
+        db.add(ActivePlayer(
+            id=f"p{i}", user_id=f"u{i}", username=f"player{i}", current_score=0, mode="walls",
+            snake_json='[{"x":3,"y":2},{"x":2,"y":2}]', food_x=5, food_y=5,
+            direction="RIGHT", is_playing=True,
+        ))
+    db.commit()
+    db.close()
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(bind=engine)
+
+
+def row(session_factory, player_id):
+    db = session_factory()
+    try:
+        player = db.get(ActivePlayer, player_id)
+        return player.to_dict(), player.snake_data, player.snake_json
+    finally:
+        db.close()
+
+
+async def _drain(subscription):
+    while (message := await subscription.get()) is not None:
+        yield message
+
+
+def remember(states, session_factory, *player_ids):
+    db = session_factory()
+    for player_id in player_ids:
+        player = db.get(ActivePlayer, player_id)
+        states.remember(player.to_dict(), player.snake_bytes)
+    db.close()
+
+
+def test_updates_coalesce_into_one_update_per_flush(engine, session_factory):
+    hub = PubSubHub()
+    states = PlayerStates(PlayerFeed(hub))
+    remember(states, session_factory, "p1", "p2")
+
+    async def publish():
+        watched = hub.subscribe(player_topic("p1"))
+        assert states.submit([{"id": "p1", "snake": [{"x": 3, "y": 2}, {"x": 2, "y": 2}], "direction": "DOWN"}]) == 1
+        assert states.submit([
+            {"id": "p1", "snake": [{"x": 3, "y": 3}, {"x": 3, "y": 2}], "direction": "RIGHT"},
+            {"id": "p2", "current_score": 10},
+            {"id": "p1", "snake": [{"x": 4, "y": 3}, {"x": 3, "y": 3}], "food": {"x": 9, "y": 9}},
+        ]) == 2
+        watched.close()
+        return [json.loads(message) async for message in _drain(watched)]
+
+    # The first update carries the whole state; p1's next two moves make one message
+    first, message = asyncio.run(publish())
+    assert first["changes"]["direction"] == "DOWN"
+    assert message["changes"] == {
+        "direction": "RIGHT",
+        "food": {"x": 9, "y": 9},
+        # Both moves replace the whole two-cell snake, so no delta
+        "snake": [{"x": 4, "y": 3}, {"x": 3, "y": 3}],
+    }
+    assert states.get("p1")["snake"] == [{"x": 4, "y": 3}, {"x": 3, "y": 3}]
+    assert states.submit([{"id": "p2", "current_score": 10}]) == 0
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    assert asyncio.run(states.flush(session_factory)) == 2
+    assert [s.split()[0] for s in statements] == ["UPDATE"]
+    assert len(states) == 0
+
+    player, snake_data, snake_json = row(session_factory, "p1")
+    assert player == states.get("p1")
+    assert snake_data == bytes([4, 3, 3, 3]) and snake_json is None
+    assert row(session_factory, "p2")[0]["current_score"] == 10
+    assert asyncio.run(states.flush(session_factory)) == 0
+
+
+def test_reads_overlay_unflushed_states(session_factory):
+    states = PlayerStates(PlayerFeed(PubSubHub()))
+    remember(states, session_factory, "p1", "p2")
+    rows = [row(session_factory, player_id)[0] for player_id in ("p1", "p2")]
+    states.submit([{"id": "p1", "current_score": 20}, {"id": "p2", "is_playing": False}])
+
+    assert [p["current_score"] for p in states.overlay(rows)] == [20, 0]
+    assert [p["id"] for p in states.active(rows)] == ["p1"]
+
+    # Finished games are dropped once written; playing ones stay for later updates
+    asyncio.run(states.flush(session_factory))
+    assert states.unknown(["p1", "p2"]) == {"p2"}
+
+
+def test_failed_flush_keeps_states(session_factory):
+    states = PlayerStates(PlayerFeed(PubSubHub()))
+    remember(states, session_factory, "p1")
+    states.submit([{"id": "p1", "current_score": 30}])
+
+    def broken_factory():
+        raise RuntimeError("database down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(states.flush(broken_factory))
+    assert len(states) == 1
+    assert asyncio.run(states.flush(session_factory)) == 1
+    assert row(session_factory, "p1")[0]["current_score"] == 30
+
+
+def test_rejected_states_are_isolated_and_dropped(engine, session_factory):
+    db = session_factory()
+    for i in range(3, 8):
+        db.add(ActivePlayer(
+            id=f"p{i}", user_id=f"u{i}", username=f"player{i}", current_score=0, mode="walls",
+            snake_json='[{"x":3,"y":2}]', food_x=5, food_y=5, direction="RIGHT", is_playing=True,
+        ))
+    db.commit()
+    db.close()
+    states = PlayerStates(PlayerFeed(PubSubHub()), batch_size=8)
+    player_ids = [f"p{i}" for i in range(1, 8)]
+    remember(states, session_factory, *player_ids)
+    # A direction the NOT NULL constraint rejects
+    states.submit([
+        {"id": player_id, "current_score": 10, **({"direction": None} if player_id in ("p3", "p6") else {})}
+        for player_id in player_ids
+    ])
+
+    assert asyncio.run(states.flush(session_factory)) == 7
+    assert (states.flushed, states.dropped, len(states)) == (5, 2, 0)
+    assert [row(session_factory, player_id)[0]["current_score"] for player_id in player_ids] == [10, 10, 0, 10, 10, 0, 10]
+    # Dropped players are reloaded from their rows before the next update
+    assert states.unknown(player_ids) == {"p3", "p6"}
+
+
+def test_failure_while_isolating_leaves_only_unwritten_states_dirty(session_factory):
+    states = PlayerStates(PlayerFeed(PubSubHub()))
+    remember(states, session_factory, "p1", "p2")
+    states.submit([{"id": "p1", "current_score": 10}, {"id": "p2", "direction": None}])
+    calls = []
+
+    def flaky_factory():
+        calls.append(None)
+        # The pair fails, p1 is written, then the database goes away
+        if len(calls) == 3:
+            raise RuntimeError("database down")
+        return session_factory()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(states.flush(flaky_factory))
+    assert list(states._dirty) == ["p2"] and states.flushed == 1
+    assert asyncio.run(states.flush(session_factory)) == 1
+    assert (states.flushed, states.dropped, len(states)) == (1, 1, 0)
+
+
+def test_bad_snake_changes_nothing(session_factory):
+    states = PlayerStates(PlayerFeed(PubSubHub()))
+    remember(states, session_factory, "p1")
+    with pytest.raises(ValueError):
+        states.submit([
+            {"id": "p1", "current_score": 10},
+            {"id": "p1", "snake": [{"x": 300, "y": 0}]},
+        ])
+    assert states.get("p1")["current_score"] == 0
+    assert len(states) == 0
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    monkeypatch.setattr(routes_auth, "SERVICE_TOKEN", "s3cret")
+    app = create_app()
+    SessionLocal = sessionmaker(bind=engine)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    # No lifespan: flushes are driven by the test
+    return TestClient(app)
+
+
+def test_states_batch_api(client, session_factory, monkeypatch):
+    service = {"X-Service-Token": "s3cret"}
+    updates = [
+        {"id": "p1", "snake": [{"x": 4, "y": 2}, {"x": 3, "y": 2}], "current_score": 10},
+        {"id": "p2", "is_playing": False},
+        {"id": "nobody", "current_score": 5},
+    ]
+    assert client.post("/players/states:batch", json={"updates": updates}).status_code == 401
+
+    resp = client.post("/players/states:batch", json={"updates": updates}, headers=service)
+    assert resp.status_code == 200
+    assert resp.json() == {"changed": 2, "unknown": ["nobody"]}
+
+    # Reads see the new state before it is written
+    assert client.get("/players/p1").json()["current_score"] == 10
+    assert [p["id"] for p in client.get("/players/active").json()] == ["p1"]
+    assert row(session_factory, "p1")[0]["current_score"] == 0
+    with client.websocket_connect("/players/p1/stream") as ws:
+        assert ws.receive_json()["player"]["snake"] == [{"x": 4, "y": 2}, {"x": 3, "y": 2}]
+
+    asyncio.run(player_states.flush(session_factory))
+    assert row(session_factory, "p1")[0]["current_score"] == 10
+    assert row(session_factory, "p2")[0]["is_playing"] is False
+
+    for bad in (
+        {"id": "p1", "snake": [{"x": 256, "y": 0}]},
+        {"id": "p1", "food": {"x": 0, "y": -1}},
+        {"id": "p1", "current_score": 2**31},
+    ):
+        resp = client.post("/players/states:batch", json={"updates": [bad]}, headers=service)
+        assert resp.status_code == 422
+    monkeypatch.setattr(routes_players, "STATE_BATCH_MAX_ITEMS", 1)
+    resp = client.post("/players/states:batch", json={"updates": updates[:2]}, headers=service)
+    assert resp.status_code == 413
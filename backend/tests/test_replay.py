@@ -0,0 +1,131 @@
+"""Tests for replay verification against the engine."""
+import random
+
+import pytest
+
+from app.engine import DOWN, LEFT, RIGHT, UP, Game
+from app.engine.replay import (
+    MAX_GRID_SIZE,
+    MIN_GRID_SIZE,
+    Mulberry32,
+    ReplayError,
+    _step_tables,
+    simulate_replay,
+)
+
+
+def record(seed, mode, moves, grid_size=20, turn_rate=0.1):
+    """Play a random game with the engine, logging accepted turns"""
+    turns = random.Random(seed)
+    game = Game(grid_size, mode, random=Mulberry32(seed), placement="client")
+    inputs = []
+    while game.ticks < moves:
+        if turns.random() < turn_rate:
+            direction = turns.randrange(4)
+            if game.set_direction(direction):
+                inputs.append((game.ticks, direction))
+        if not game.tick():
+            break
+    return game, inputs
+
+
+def test_mulberry32_matches_javascript():
+    # Reference values from mulberry32 in game-logic.ts under Node
+    rng = Mulberry32(12345)
+    assert [rng() for _ in range(3)] == [0.9797282677609473, 0.3067522644996643, 0.484205421525985]
+    rng = Mulberry32(4294967295)
+    assert rng() == 0.8964226141106337
+
+
+@pytest.mark.parametrize("mode", ["passthrough", "walls"])
+@pytest.mark.parametrize("grid_size", [5, 20])
+def test_replay_reproduces_engine_games(mode, grid_size):
+    for seed in range(60):
+        game, inputs = record(seed, mode, 3000, grid_size)
+        result = simulate_replay(seed, inputs, game.ticks, mode, grid_size)
+        assert result.score == game.score
+        assert result.length == game.length
+
+        # Claiming the fatal move too is rejected
+        if game.game_over:
+            with pytest.raises(ReplayError):
+                simulate_replay(seed, inputs, game.ticks + 1, mode, grid_size)
+
+
+def test_ignored_turns_match_set_direction():
+    # LEFT at tick 0 reverses RIGHT; LEFT after DOWN in the same tick is still
+    # checked against the last move (RIGHT) so DOWN stands; UP reverses DOWN.
+    # The snake heads down column 12 and hits the bottom wall on move 12.
+    inputs = [(0, LEFT), (2, DOWN), (2, LEFT), (5, UP)]
+
+    game = Game(20, "walls", random=Mulberry32(7), placement="client")
+    game.food = 0
+    for tick in range(12):
+        for at, direction in inputs:
+            if at == tick:
+                game.set_direction(direction)
+        game.tick()
+    assert game.game_over and game.ticks == 11
+
+    assert simulate_replay(7, inputs, 11, "walls").ticks == 11
+    with pytest.raises(ReplayError, match="move 12"):
+        simulate_replay(7, inputs, 12, "walls")
+
+
+def test_malformed_inputs_rejected():
+    with pytest.raises(ReplayError):
+        simulate_replay(1, [(5, UP), (3, DOWN)], 10, "walls")
+    with pytest.raises(ReplayError):
+        simulate_replay(1, [(11, UP)], 10, "walls")
+    with pytest.raises(ReplayError):
+        simulate_replay(1, [(1, 7)], 10, "walls")
+    with pytest.raises(ReplayError):
+        simulate_replay(1, [], 10, "classic")
+    with pytest.raises(ReplayError, match="Grid size"):
+        simulate_replay(1, [], 10, "walls", 65)
+
+
+def test_step_tables_cached_for_every_grid_size():
+    _step_tables.cache_clear()
+    for grid_size in range(MIN_GRID_SIZE, MAX_GRID_SIZE + 1):
+        simulate_replay(1, [], 1, "walls", grid_size)
+        simulate_replay(1, [], 1, "passthrough", grid_size)
+    simulate_replay(1, [], 1, "walls", 20)
+    info = _step_tables.cache_info()
+    assert info.currsize == 2 * (MAX_GRID_SIZE - MIN_GRID_SIZE + 1)
+    assert info.hits == 1
+
+
+# A Hamiltonian cycle of the 4x4 board (as in test_engine_batch): following
+# it, the snake fills the board and food ends up placed under it
+CYCLE = [
+    (0, 0), (1, 0), (2, 0), (3, 0), (3, 1), (2, 1), (1, 1), (1, 2),
+    (2, 2), (3, 2), (3, 3), (2, 3), (1, 3), (0, 3), (0, 2), (0, 1),
+]
+NEXT_TURN = {
+    a: {(1, 0): RIGHT, (-1, 0): LEFT, (0, 1): DOWN, (0, -1): UP}[(b[0] - a[0], b[1] - a[1])]
+    for a, b in zip(CYCLE, CYCLE[1:] + CYCLE[:1])
+}
+
+
+def test_full_board_replays_match_engine():
+    for seed in range(40):
+        game = Game(4, "passthrough", random=Mulberry32(seed), placement="client")
+        inputs = []
+        while not game.game_over and game.ticks < 1500:
+            turn = NEXT_TURN[game.snake()[0]]
+            if game.set_direction(turn):
+                inputs.append((game.ticks, turn))
+            game.tick()
+        result = simulate_replay(seed, inputs, game.ticks, "passthrough", 4)
+        assert (result.score, result.length) == (game.score, game.length)
+        if game.game_over:
+            with pytest.raises(ReplayError):
+                simulate_replay(seed, inputs, game.ticks + 1, "passthrough", 4)
+
+
+def test_walls_replay_dies_at_the_edge():
+    # Heading right from the centre of a 20 grid hits the wall on move 10
+    assert simulate_replay(3, [], 9, "walls").ticks == 9
+    with pytest.raises(ReplayError, match="move 10"):
+        simulate_replay(3, [], 10, "walls")
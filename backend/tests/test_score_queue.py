@@ -0,0 +1,161 @@
+"""Tests for the write-behind score queue."""
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.database import Base, LeaderboardEntry, User
+from app.leaderboard_cache import LeaderboardCache
+from app.leaderboard_index import LeaderboardIndex
+from app.score_queue import ScoreQueue, ScoreQueueFull, ScoreRow
+
+
+@pytest.fixture
+def session_factory():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add_all([
+        User(id="u1", username="one", email="one@example.com", password_hash="pw", high_score=150),
+        User(id="u2", username="two", email="two@example.com", password_hash="pw"),
+    ])
+    db.commit()
+    db.close()
+    yield factory
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def index(session_factory):
+    index = LeaderboardIndex()
+    db = session_factory()
+    index.ensure(db, "walls")
+    db.close()
+    return index
+
+
+def make_queue(index, **options):
+    return ScoreQueue(index=index, cache=LeaderboardCache(), enabled=True, **options)
+
+
+def test_provisional_ranks_then_flush(session_factory, index):
+    queue = make_queue(index, batch_size=2)
+    assert queue.submit(ScoreRow("u1", "one", "walls", 100)) == 1
+    assert queue.submit(ScoreRow("u2", "two", "walls", 300)) == 1
+    assert queue.submit(ScoreRow("u1", "one", "walls", 200)) == 2
+
+    # Queued scores keep the mode busy, so reconciliation can't drop them
+    db = session_factory()
+    assert index.reconcile(db) == []
+    db.close()
+
+    async def flush_all():
+        written = []
+        while len(queue):
+            written.append(await queue.flush(session_factory))
+        return written
+
+    assert asyncio.run(flush_all()) == [2, 1]
+    db = session_factory()
+    assert sorted(score for (score,) in db.query(LeaderboardEntry.score)) == [100, 200, 300]
+    assert {u.id: u.high_score for u in db.query(User)} == {"u1": 200, "u2": 300}
+    assert index.reconcile(db) == []
+    db.close()
+
+
+def test_full_queue_rejects(index):
+    queue = make_queue(index, max_size=1)
+    queue.submit(ScoreRow("u1", "one", "walls", 1))
+    with pytest.raises(ScoreQueueFull):
+        queue.submit(ScoreRow("u1", "one", "walls", 2))
+
+
+def test_close_drains_queue(session_factory, index):
+    queue = make_queue(index, interval=60)
+
+    async def scenario():
+        queue.start(session_factory)
+        for score in (10, 20, 30):
+            queue.submit(ScoreRow("u2", "two", "walls", score))
+        await queue.close(timeout=5)
+        with pytest.raises(ScoreQueueFull):
+            queue.submit(ScoreRow("u2", "two", "walls", 40))
+
+    asyncio.run(scenario())
+    db = session_factory()
+    assert db.query(LeaderboardEntry).count() == 3
+    db.close()
+    assert queue.flushed == 3
+
+
+def test_failed_flush_keeps_scores(index):
+    queue = make_queue(index)
+    queue.submit(ScoreRow("u1", "one", "walls", 10))
+
+    def broken_factory():
+        raise RuntimeError("database is down")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(queue.flush(broken_factory))
+    assert len(queue) == 1
+
+
+def test_rejected_scores_are_isolated_and_dropped(session_factory, index):
+    queue = make_queue(index, batch_size=8)
+    scores = [10, 20, 30, 40, 50, 60, 70]
+    for score in scores:
+        # A username the NOT NULL constraint rejects
+        queue.submit(ScoreRow("u2", None if score in (30, 60) else "two", "walls", score))
+    assert index.rank("walls", 25) == 6
+
+    assert asyncio.run(queue.flush(session_factory)) == 7
+    assert (queue.flushed, queue.dropped, len(queue)) == (5, 2, 0)
+    db = session_factory()
+    assert sorted(score for (score,) in db.query(LeaderboardEntry.score)) == [10, 20, 40, 50, 70]
+    # Dropped scores left the index and released the mode
+    assert index.rank("walls", 25) == 4
+    assert index.reconcile(db) == []
+    db.close()
+
+
+def test_failure_while_isolating_requeues_only_unwritten_scores(session_factory, index):
+    queue = make_queue(index, batch_size=4)
+    for score in (10, 20, 30, 40):
+        queue.submit(ScoreRow("u2", "two" if score != 40 else None, "walls", score))
+    calls = []
+
+    def flaky_factory():
+        calls.append(None)
+        # The whole batch fails, then its first half is written, then the
+        # database goes away
+        if len(calls) == 3:
+            raise RuntimeError("database is down")
+        return session_factory()
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(queue.flush(flaky_factory))
+    assert [row.score for row in queue._pending] == [30, 40]
+    assert queue.flushed == 2
+
+    assert asyncio.run(queue.flush(session_factory)) == 2
+    assert (queue.flushed, queue.dropped) == (3, 1)
+
+
+def test_failed_index_add_releases_the_mode(index, monkeypatch):
+    queue = make_queue(index)
+
+    def broken_add(mode, score, n=1):
+        raise MemoryError
+
+    monkeypatch.setattr(index, "add", broken_add)
+    with pytest.raises(MemoryError):
+        queue.submit(ScoreRow("u1", "one", "walls", 10))
+    assert len(queue) == 0
+    assert not index._write_marks()[1]
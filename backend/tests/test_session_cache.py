@@ -0,0 +1,86 @@
+"""Unit tests for the token -> user session cache."""
+import time
+from datetime import datetime, timedelta
+
+from app.session_cache import CurrentUser, SessionCache
+
+
+def make_user(user_id="u1", high_score=0):
+    return CurrentUser(
+        id=user_id, username=user_id, email=f"{user_id}@example.com",
+        created_at=datetime(2025, 1, 1), high_score=high_score,
+    )
+
+
+def test_hit_and_miss_counters():
+    cache = SessionCache(max_size=10, ttl=60)
+    assert cache.get("tok") is None
+    cache.put("tok", make_user())
+    assert cache.get("tok") == make_user()
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_lru_eviction():
+    cache = SessionCache(max_size=2, ttl=60)
+    cache.put("a", make_user("a"))
+    cache.put("b", make_user("b"))
+    cache.get("a")
+    cache.put("c", make_user("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = SessionCache(max_size=10, ttl=0.01)
+    cache.put("tok", make_user())
+    time.sleep(0.02)
+    assert cache.get("tok") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_session_expiry_caps_ttl():
+    cache = SessionCache(max_size=10, ttl=60)
+    cache.put("expired", make_user(), expires_at=datetime.now() - timedelta(seconds=1))
+    assert cache.get("expired") is None
+    cache.put("soon", make_user(), expires_at=datetime.now() + timedelta(milliseconds=10))
+    time.sleep(0.02)
+    assert cache.get("soon") is None
+
+
+def test_evict_and_update_by_user():
+    cache = SessionCache(max_size=10, ttl=60)
+    cache.put("t1", make_user("u1"))
+    cache.put("t2", make_user("u1"))
+    cache.put("t3", make_user("u2"))
+
+    cache.update_user("u1", high_score=300)
+    assert cache.get("t1").high_score == 300
+    assert cache.get("t2").high_score == 300
+    assert cache.get("t3").high_score == 0
+
+    cache.evict("t1")
+    assert cache.get("t1") is None
+    cache.evict_user("u1")
+    assert cache.get("t2") is None
+    assert cache.get("t3") is not None
+
+
+def test_evicted_token_is_not_cached_again():
+    cache = SessionCache(max_size=10, ttl=60)
+    cache.put("tok", make_user())
+    cache.evict("tok")
+    # A lookup that read the session before logout deleted it
+    cache.put("tok", make_user())
+    assert cache.get("tok") is None
+    cache.put("other", make_user())
+    assert cache.get("other") is not None
+
+
+def test_eviction_tombstones_expire():
+    cache = SessionCache(max_size=10, ttl=0.01)
+    cache.evict("tok")
+    time.sleep(0.02)
+    cache.put("tok", make_user())
+    assert cache.get("tok") is not None
@@ -0,0 +1,150 @@
+"""Tests for session expiry, sliding renewal, the per-user cap and the purge."""
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from main import create_app
+from app import sessions
+from app.database import Base, Session as SessionModel, User, get_db
+from app.session_cache import session_cache
+
+
+@pytest.fixture
+def SessionLocal():
+    engine = create_engine(
+        "sqlite:///:memory:", connect_args={"check_same_thread": False}, poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def client(SessionLocal):
+    app = create_app()
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    return TestClient(app)
+
+
+def signup(client, name="alice"):
+    resp = client.post("/auth/signup", json={"username": name, "email": f"{name}@example.com", "password": "pwd"})
+    return resp.json()["token"]
+
+
+def me(client, token):
+    session_cache.clear()
+    return client.get("/auth/me", headers={"Authorization": f"Bearer {token}"}).status_code
+
+
+def set_session(SessionLocal, token, **values):
+    db = SessionLocal()
+    db.query(SessionModel).filter(SessionModel.token == token).update(values)
+    db.commit()
+    db.close()
+
+
+def get_session(SessionLocal, token):
+    db = SessionLocal()
+    session = db.get(SessionModel, token)
+    db.close()
+    return session
+
+
+def test_new_sessions_expire_after_ttl(client, SessionLocal):
+    token = signup(client)
+    session = get_session(SessionLocal, token)
+    assert session.expires_at - session.created_at == timedelta(seconds=sessions.SESSION_TTL)
+    assert me(client, token) == 200
+
+    set_session(SessionLocal, token, expires_at=datetime.now() - timedelta(seconds=1))
+    assert me(client, token) == 401
+
+
+def test_legacy_sessions_expire_from_creation(client, SessionLocal):
+    old, recent = signup(client, "old"), signup(client, "recent")
+    long_ago = datetime.now() - timedelta(seconds=sessions.SESSION_TTL + 60)
+    set_session(SessionLocal, old, expires_at=None, created_at=long_ago)
+    due = datetime.now() - timedelta(seconds=sessions.RENEW_AFTER * 2)
+    set_session(SessionLocal, recent, expires_at=None, created_at=due)
+
+    assert me(client, old) == 401
+    assert me(client, recent) == 200
+    # Renewing a legacy session gives it an expiry
+    assert get_session(SessionLocal, recent).expires_at is not None
+
+
+def test_sliding_renewal(client, SessionLocal):
+    token = signup(client)
+    ttl = timedelta(seconds=sessions.SESSION_TTL)
+    renew_after = timedelta(seconds=sessions.RENEW_AFTER)
+
+    # Renewed a moment ago: left alone
+    fresh = datetime.now() + ttl - renew_after / 2
+    set_session(SessionLocal, token, expires_at=fresh)
+    assert me(client, token) == 200
+    assert get_session(SessionLocal, token).expires_at == fresh
+
+    # Due for renewal: pushed out to a full TTL
+    stale = datetime.now() + ttl - renew_after * 2
+    set_session(SessionLocal, token, expires_at=stale)
+    assert me(client, token) == 200
+    assert get_session(SessionLocal, token).expires_at > datetime.now() + ttl - timedelta(minutes=1)
+
+
+def test_ttl_zero_disables_expiry(client, SessionLocal, monkeypatch):
+    monkeypatch.setattr(sessions, "SESSION_TTL", 0)
+    token = signup(client)
+    set_session(SessionLocal, token, created_at=datetime(2000, 1, 1))
+    assert get_session(SessionLocal, token).expires_at is None
+    assert me(client, token) == 200
+
+
+def test_login_revokes_sessions_beyond_cap(client, SessionLocal, monkeypatch):
+    monkeypatch.setattr(sessions, "MAX_PER_USER", 2)
+    first = signup(client)
+    assert me(client, first) == 200
+    # Cached, as a request would leave it, so revocation has to evict it
+    client.get("/auth/me", headers={"Authorization": f"Bearer {first}"})
+
+    tokens = [
+        client.post("/auth/login", json={"email": "alice@example.com", "password": "pwd"}).json()["token"]
+        for _ in range(2)
+    ]
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {first}"}).status_code == 401
+    assert [me(client, token) for token in tokens] == [200, 200]
+
+    db = SessionLocal()
+    assert db.query(SessionModel).count() == 2
+    db.close()
+
+
+def test_purge_deletes_expired_in_batches(SessionLocal):
+    now = datetime(2026, 6, 1)
+    ttl = timedelta(seconds=sessions.SESSION_TTL)
+    db = SessionLocal()
+    db.add(User(id="u1", username="u", email="u@example.com", password_hash="x"))
+    for i in range(25):
+        db.add(SessionModel(token=f"expired-{i}", user_id="u1", created_at=now - ttl * 2, expires_at=now - timedelta(seconds=i)))
+    for i in range(5):
+        db.add(SessionModel(token=f"live-{i}", user_id="u1", created_at=now, expires_at=now + ttl))
+    db.add(SessionModel(token="legacy-old", user_id="u1", created_at=now - ttl * 2))
+    db.add(SessionModel(token="legacy-new", user_id="u1", created_at=now))
+    db.commit()
+
+    assert sessions.purge_expired_sessions(db, batch_size=10, now=now) == 26
+    left = {token for (token,) in db.query(SessionModel.token)}
+    assert left == {f"live-{i}" for i in range(5)} | {"legacy-new"}
+    assert sessions.purge_expired_sessions(db, batch_size=10, now=now) == 0
+    db.close()
@@ -0,0 +1,305 @@
+"""Tests for the shared-state backends and the caches sharing through them.
+
+The Redis-protocol backend runs against a small in-test stand-in server
+speaking the commands it uses. Two backend instances on the same file or
+server play two workers.
+"""
+import asyncio
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.leaderboard_cache import LeaderboardCache, serialize_board
+from app.pubsub import PubSubHub
+from app.schemas import LeaderboardEntrySchema
+from app.session_cache import CurrentUser, SessionCache
+from app.shared_state import MemoryState, SharedStateError, create_state
+from app.shared_state.resp import RESPState
+from app.shared_state.sqlite import SQLiteState
+
+
+class _RESPHandler(socketserver.StreamRequestHandler):
+    def _read(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _bulk(self, value):
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        server = self.server
+        while (args := self._read()) is not None:
+            command = args[0].upper()
+            with server.lock:
+                now = time.monotonic()
+                if command == b"PING":
+                    reply = b"+PONG\r\n"
+                elif command == b"GET":
+                    value, deadline = server.data.get(args[1], (None, None))
+                    reply = self._bulk(None if deadline is not None and deadline <= now else value)
+                elif command == b"SET":
+                    deadline = now + int(args[4]) / 1000 if len(args) > 3 else None
+                    server.data[args[1]] = (args[2], deadline)
+                    reply = b"+OK\r\n"
+                elif command == b"DEL":
+                    removed = sum(server.data.pop(key, None) is not None for key in args[1:])
+                    reply = b":%d\r\n" % removed
+                elif command == b"INCR":
+                    value, deadline = server.data.get(args[1], (b"0", None))
+                    number = int(value) + 1
+                    server.data[args[1]] = (str(number).encode(), deadline)
+                    reply = b":%d\r\n" % number
+                elif command == b"PUBLISH":
+                    receivers = list(server.channels.get(args[1], ()))
+                    message = b"*3\r\n" + self._bulk(b"message") + self._bulk(args[1]) + self._bulk(args[2])
+                    for receiver in receivers:
+                        receiver.wfile.write(message)
+                    reply = b":%d\r\n" % len(receivers)
+                elif command == b"SUBSCRIBE":
+                    reply = b""
+                    for channel in args[1:]:
+                        server.channels.setdefault(channel, set()).add(self)
+                        reply += b"*3\r\n" + self._bulk(b"subscribe") + self._bulk(channel) + b":1\r\n"
+                elif command == b"UNSUBSCRIBE":
+                    reply = b""
+                    for channel in args[1:]:
+                        server.channels.get(channel, set()).discard(self)
+                        reply += b"*3\r\n" + self._bulk(b"unsubscribe") + self._bulk(channel) + b":0\r\n"
+                else:
+                    reply = b"-ERR unknown command\r\n"
+                self.wfile.write(reply)
+
+    def finish(self):
+        with self.server.lock:
+            for receivers in self.server.channels.values():
+                receivers.discard(self)
+        super().finish()
+
+
+class _RESPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RESPHandler)
+        self.lock = threading.Lock()
+        self.data = {}
+        self.channels = {}
+
+
+@pytest.fixture
+def resp_url():
+    server = _RESPServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"redis://127.0.0.1:{server.server_address[1]}/0"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(params=["sqlite", "resp"])
+def workers(request, tmp_path):
+    """Two backend instances sharing one store, like two workers"""
+    if request.param == "sqlite":
+        url = f"sqlite:///{tmp_path / 'state.db'}"
+    else:
+        url = request.getfixturevalue("resp_url")
+    states = [create_state(url), create_state(url)]
+    yield states
+    for state in states:
+        state.close()
+
+
+def eventually(check, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not check():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.01)
+
+
+def test_create_state_picks_backend(tmp_path):
+    assert isinstance(create_state("memory://"), MemoryState)
+    assert isinstance(create_state(f"sqlite:///{tmp_path / 's.db'}"), SQLiteState)
+    assert isinstance(create_state("redis://localhost:6379/0"), RESPState)
+    with pytest.raises(ValueError):
+        create_state("memcached://localhost")
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite", "resp"])
+def test_key_value_operations(backend, tmp_path, request):
+    if backend == "memory":
+        state = MemoryState()
+    elif backend == "sqlite":
+        state = SQLiteState(str(tmp_path / "state.db"))
+    else:
+        state = RESPState(request.getfixturevalue("resp_url"))
+    try:
+        assert state.get("missing") is None
+        state.set("k", b"v")
+        assert state.get("k") == b"v"
+        state.set("short", b"x", ttl=0.05)
+        assert state.get("short") == b"x"
+        time.sleep(0.1)
+        assert state.get("short") is None
+        assert [state.incr("n") for _ in range(3)] == [1, 2, 3]
+        assert state.get("n") == b"3"
+        state.delete("k", "n", "never-set")
+        assert state.get("k") is None and state.get("n") is None
+    finally:
+        state.close()
+
+
+def test_pubsub_between_workers(workers):
+    a, b = workers
+    received = []
+    unsubscribe = b.subscribe("chan", received.append)
+    time.sleep(0.1)  # let the listener connect
+    a.publish("chan", b"one")
+    a.publish("other", b"ignored")
+    a.publish("chan", b"two")
+    eventually(lambda: received == [b"one", b"two"])
+
+    unsubscribe()
+    time.sleep(0.1)
+    a.publish("chan", b"three")
+    time.sleep(0.2)
+    assert received == [b"one", b"two"]
+
+
+def test_broadcasts_skip_the_sender(workers):
+    a, b = workers
+    seen_a, seen_b = [], []
+    a.on_broadcast("chan", seen_a.append)
+    b.on_broadcast("chan", seen_b.append)
+    time.sleep(0.1)
+    a.broadcast("chan", {"n": 1})
+    eventually(lambda: seen_b == [{"n": 1}])
+    time.sleep(0.1)
+    assert seen_a == []
+
+
+def test_unreachable_server_raises_shared_state_error():
+    state = RESPState("redis://127.0.0.1:1/0", timeout=0.2)
+    with pytest.raises(SharedStateError):
+        state.get("k")
+
+
+def make_user(user_id="u1", high_score=0):
+    return CurrentUser(
+        id=user_id, username=user_id, email=f"{user_id}@example.com",
+        created_at=datetime(2025, 1, 1), high_score=high_score,
+    )
+
+
+def test_session_cache_shares_lookups_and_evictions(workers):
+    a, b = workers
+    cache_a, cache_b = SessionCache(max_size=10, ttl=60), SessionCache(max_size=10, ttl=60)
+    cache_a.attach(a)
+    cache_b.attach(b)
+    time.sleep(0.1)
+
+    cache_a.put("tok", make_user(), datetime.now() + timedelta(hours=1))
+    a.flush()
+    assert cache_b.get("tok") is None
+    assert cache_b.get_shared("tok") == make_user()
+    assert cache_b.get("tok") == make_user()  # now cached locally too
+    assert cache_b.stats()["shared_hits"] == 1
+
+    # A high score change reaches B's local copy, and the shared copy is dropped
+    cache_a.update_user("u1", high_score=50)
+    eventually(lambda: cache_b.get("tok").high_score == 50)
+    assert cache_a.get_shared("tok") is None
+
+    cache_a.evict("tok")
+    eventually(lambda: cache_b.get("tok") is None)
+    assert cache_b.get_shared("tok") is None
+
+    # A lookup racing the logout doesn't put the token back for the others
+    cache_a.put("tok", make_user(), datetime.now() + timedelta(hours=1))
+    a.flush()
+    assert cache_b.get_shared("tok") is None
+
+
+def test_session_cache_memory_backend_stays_local():
+    cache = SessionCache(max_size=10, ttl=60)
+    cache.attach(MemoryState())
+    assert not cache.shared
+    cache.put("tok", make_user())
+    assert cache.get_shared("tok") is None
+    assert cache.get("tok") == make_user()
+
+
+def board(*scores, limit=10):
+    entries = [
+        LeaderboardEntrySchema(
+            id=f"e{i}", user_id="u", username="u", score=score, mode="walls", date=datetime(2025, 1, 1),
+        )
+        for i, score in enumerate(scores)
+    ]
+    return serialize_board(entries, limit)
+
+
+def test_leaderboard_cache_shares_boards_and_invalidations(workers):
+    a, b = workers
+    cache_a, cache_b = LeaderboardCache(), LeaderboardCache()
+    cache_a.attach(a)
+    cache_b.attach(b)
+    time.sleep(0.1)
+    key = ("walls", 2, False)
+
+    cache_a.put(key, board(300, 200, limit=2), cache_a.generation)
+    a.flush()
+    shared = cache_b.get_shared(key)
+    assert shared == board(300, 200, limit=2)
+    assert cache_b.get(key) == shared
+
+    # A new score in A drops B's copy and retires the shared one
+    generation = cache_b.generation
+    cache_a.invalidate_score("walls", 250)
+    eventually(lambda: cache_b.get(key) is None)
+    assert cache_b.generation != generation
+    assert cache_b.get_shared(key) is None
+
+    # A board loaded before the invalidation is not stored anywhere
+    cache_b.put(key, board(300, 200, limit=2), generation)
+    assert cache_b.get(key) is None
+
+    # So does a bulk import run elsewhere
+    cache_b.put(key, board(300, 200, limit=2), cache_b.generation)
+    cache_a.invalidate_all()
+    eventually(lambda: cache_b.get(key) is None)
+
+
+def test_hub_delivers_messages_from_other_workers(workers):
+    a, b = workers
+    hub_a, hub_b = PubSubHub(), PubSubHub()
+    hub_a.attach(a)
+    hub_b.attach(b)
+    time.sleep(0.1)
+
+    async def scenario():
+        local = hub_a.subscribe("players")
+        remote = hub_b.subscribe("players")
+        assert hub_a.publish("players", {"type": "removed", "id": "p1"}) == 1
+        assert await asyncio.wait_for(local.get(), 1) == '{"type":"removed","id":"p1"}'
+        assert await asyncio.wait_for(remote.get(), 2) == '{"type":"removed","id":"p1"}'
+        # The sender doesn't get its own message twice
+        await asyncio.sleep(0.2)
+        assert local._queue.empty()
+        local.close()
+        remote.close()
+
+    asyncio.run(scenario())
+    hub_a.detach()
+    hub_b.detach()
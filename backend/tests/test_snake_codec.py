@@ -0,0 +1,47 @@
+"""Tests for the packed snake encoding and move deltas."""
+import pytest
+
+from app.snake_codec import (
+    SnakeDelta, apply_delta, decode_snake, diff_snake, encode_snake, snake_from_json,
+)
+
+
+def test_round_trip():
+    snake = [{"x": 5, "y": 5}, {"x": 4, "y": 5}, {"x": 255, "y": 0}]
+    data = encode_snake(snake)
+    assert data == bytes([5, 5, 4, 5, 255, 0])
+    assert decode_snake(data) == snake
+    assert encode_snake([(5, 5), (4, 5), (255, 0)]) == data
+    assert snake_from_json('[{"x":5,"y":5},{"x":4,"y":5},{"x":255,"y":0}]') == data
+
+
+def test_out_of_range_rejected():
+    with pytest.raises(ValueError):
+        encode_snake([(256, 0)])
+    with pytest.raises(ValueError):
+        encode_snake([(0, -1)])
+
+
+@pytest.mark.parametrize("old, new, expected", [
+    # Plain move: one new head, one tail cell dropped
+    ([(3, 2), (2, 2), (1, 2)], [(4, 2), (3, 2), (2, 2)], SnakeDelta(bytes([4, 2]), 1)),
+    # Ate food: grows, nothing trimmed
+    ([(3, 2), (2, 2)], [(4, 2), (3, 2), (2, 2)], SnakeDelta(bytes([4, 2]), 0)),
+    # Two coalesced moves
+    ([(3, 2), (2, 2), (1, 2)], [(4, 3), (4, 2), (3, 2)], SnakeDelta(bytes([4, 3, 4, 2]), 2)),
+    ([(3, 2)], [(3, 2)], SnakeDelta(b"", 0)),
+])
+def test_diff_and_apply(old, new, expected):
+    old_data, new_data = encode_snake(old), encode_snake(new)
+    delta = diff_snake(old_data, new_data)
+    assert delta == expected
+    assert apply_delta(old_data, delta) == new_data
+
+
+def test_diff_of_unrelated_bodies_is_none():
+    assert diff_snake(encode_snake([(3, 2), (2, 2)]), encode_snake([(10, 10), (10, 11)])) is None
+
+
+def test_apply_rejects_overlong_trim():
+    with pytest.raises(ValueError):
+        apply_delta(bytes([1, 1]), SnakeDelta(bytes([2, 1]), 2))
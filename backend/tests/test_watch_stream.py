@@ -0,0 +1,137 @@
+"""Tests for the watch-mode pub/sub hub and WebSocket streams."""
+import asyncio
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.websockets import WebSocketDisconnect
+
+from main import create_app
+from app.database import Base, ActivePlayer, get_db
+from app.pubsub import PubSubHub, hub, player_feed, player_topic
+
+
+@pytest.fixture
+def db_session():
+    engine = create_engine(
+        "sqlite:///:memory:",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine, autoflush=False, autocommit=False)()
+    session.add(ActivePlayer(
+        id="p1", user_id="u1", username="watched", current_score=30, mode="walls",
+        snake_json='[{"x":3,"y":2},{"x":2,"y":2}]', food_x=5, food_y=5,
+        direction="RIGHT", is_playing=True,
+    ))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(db_session):
+    app = create_app()
+    app.dependency_overrides[get_db] = lambda: db_session
+    return TestClient(app)
+
+
+def player_state(**changes):
+    state = {
+        "id": "p1", "username": "watched", "current_score": 30, "mode": "walls",
+        "snake": [{"x": 3, "y": 2}, {"x": 2, "y": 2}], "food": {"x": 5, "y": 5},
+        "direction": "RIGHT", "is_playing": True,
+    }
+    state.update(changes)
+    return state
+
+
+def test_lobby_stream_snapshot_then_updates(client):
+    player_feed.publish_state(player_state())
+
+    with client.websocket_connect("/players/stream") as ws:
+        snapshot = ws.receive_json()
+        assert snapshot["type"] == "snapshot"
+        assert [p["id"] for p in snapshot["players"]] == ["p1"]
+
+        player_feed.publish_state(player_state(
+            snake=[{"x": 4, "y": 2}, {"x": 3, "y": 2}], direction="RIGHT",
+        ))
+        # Unchanged state is not re-sent
+        player_feed.publish_state(player_state(snake=[{"x": 4, "y": 2}, {"x": 3, "y": 2}]))
+        player_feed.publish_removed("p1")
+
+        # A move is sent as a delta, not the whole body
+        update = ws.receive_json()
+        assert update == {
+            "type": "update", "id": "p1",
+            "changes": {"snake_delta": {"heads": [{"x": 4, "y": 2}], "trim": 1}},
+        }
+        assert ws.receive_json() == {"type": "removed", "id": "p1"}
+
+
+def test_snake_sent_in_full_when_not_a_move(client):
+    player_feed.publish_state(player_state())
+
+    with client.websocket_connect("/players/p1/stream") as ws:
+        ws.receive_json()
+        # Packed bodies can be published without re-encoding
+        player_feed.publish_state(player_state(), snake_data=bytes([9, 9, 9, 8]))
+        assert ws.receive_json()["changes"] == {"snake": [{"x": 9, "y": 9}, {"x": 9, "y": 8}]}
+
+
+def test_player_stream(client):
+    with client.websocket_connect("/players/p1/stream") as ws:
+        snapshot = ws.receive_json()
+        assert snapshot["player"]["username"] == "watched"
+        assert hub.subscriber_count(player_topic("p1")) == 1
+
+        player_feed.publish_state(player_state(current_score=40))
+        message = ws.receive_json()
+        assert message["id"] == "p1"
+        assert message["changes"]["current_score"] == 40
+
+
+def test_player_stream_unknown_player(client):
+    with client.websocket_connect("/players/nope/stream") as ws:
+        with pytest.raises(WebSocketDisconnect) as exc:
+            ws.receive_json()
+    assert exc.value.code == 4404
+
+
+def test_slow_subscriber_is_ended_rather_than_skipping_messages():
+    async def scenario():
+        local_hub = PubSubHub()
+        subscription = local_hub.subscribe("t", maxsize=2)
+        for i in range(2):
+            assert local_hub.publish("t", {"n": i}) == 1
+        assert not subscription.overflowed
+        # The third message doesn't fit: nothing more is delivered
+        assert local_hub.publish("t", {"n": 2}) == 1
+        assert subscription.overflowed
+        assert local_hub.subscriber_count("t") == 0
+        assert local_hub.publish("t", {"n": 3}) == 0
+        assert await subscription.get() is None
+        return subscription.dropped
+
+    assert asyncio.run(scenario()) == 3
+
+
+def test_stream_that_falls_behind_is_closed_for_resync(client):
+    with client.websocket_connect("/players/p1/stream") as ws:
+        ws.receive_json()
+        subscription = next(iter(hub._topics[player_topic("p1")]))
+        # Overfill the queue in one callback, before the pump can drain it
+        burst = range(subscription._queue.maxsize + 1)
+        subscription.loop.call_soon_threadsafe(
+            lambda: [subscription._deliver(f'{{"n":{i}}}') for i in burst]
+        )
+        with pytest.raises(WebSocketDisconnect) as exc:
+            while True:
+                ws.receive_json()
+    assert exc.value.code == 4409
@@ -13,6 +13,7 @@ import {
   togglePause,
   resetGame,
   getDirectionFromKey,
+  getReplay,
   type GameState,
   type GameMode,
   type Direction,
@@ -90,13 +91,13 @@ export default function SnakeGame({ isModalOpen = false }: SnakeGameProps) {
   useEffect(() => {
     if (gameState.isGameOver && !hasSubmittedScore && user && gameState.score > 0) {
       setHasSubmittedScore(true);
-      api.leaderboard.submitScore(gameState.score, gameState.mode).then(result => {
+      api.leaderboard.submitScore(gameState.score, gameState.mode, getReplay(gameState)).then(result => {
         if (result.success && result.rank) {
           toast.success(`Score submitted! Rank #${result.rank}`);
         }
       });
     }
-  }, [gameState.isGameOver, gameState.score, gameState.mode, hasSubmittedScore, user]);
+  }, [gameState, hasSubmittedScore, user]);
   
   const handleTogglePause = useCallback(() => {
     setGameState(prev => togglePause(prev));
@@ -1,58 +1,76 @@
-import React, { useState, useEffect, useRef } from 'react';
+import React, { useState, useEffect } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
 import { Eye, Users, Loader2, ArrowLeft } from 'lucide-react';
-import api, { ActivePlayer } from '@/lib/api';
+import api, { ActivePlayer, PlayerStreamMessage, applyPlayerChanges } from '@/lib/api';
 import GameBoard from '@/components/Game/GameBoard';
 import { cn } from '@/lib/utils';
 
 const GRID_SIZE = 20;
-const SIMULATION_SPEED = 200;
+// Fallback polling interval when the lobby stream is unavailable
+const POLL_INTERVAL = 10000;
 
 export default function WatchMode() {
   const [players, setPlayers] = useState<ActivePlayer[]>([]);
   const [selectedPlayer, setSelectedPlayer] = useState<ActivePlayer | null>(null);
   const [isLoading, setIsLoading] = useState(true);
-  const simulationRef = useRef<number | null>(null);
 
-  // Fetch active players
+  // Live player list over the lobby stream, polling only if it drops
   useEffect(() => {
+    let pollInterval: number | null = null;
+
     const fetchPlayers = async () => {
-      setIsLoading(true);
       const data = await api.players.getActivePlayers();
       setPlayers(data);
       setIsLoading(false);
     };
-    
-    fetchPlayers();
-    
-    // Refresh player list periodically
-    const interval = setInterval(fetchPlayers, 10000);
-    return () => clearInterval(interval);
+
+    const handleMessage = (msg: PlayerStreamMessage) => {
+      if (msg.type === 'snapshot' && 'players' in msg) {
+        setPlayers(msg.players);
+        setIsLoading(false);
+      } else if (msg.type === 'update') {
+        setPlayers(prev => {
+          const existing = prev.find(p => p.id === msg.id);
+          const updated = applyPlayerChanges(existing, msg.id, msg.changes);
+          const next = existing
+            ? prev.map(p => (p.id === msg.id ? updated : p))
+            : [...prev, updated];
+          return next.filter(p => p.isPlaying);
+        });
+      } else if (msg.type === 'removed') {
+        setPlayers(prev => prev.filter(p => p.id !== msg.id));
+      }
+    };
+
+    const closeStream = api.players.streamLobby(handleMessage, () => {
+      fetchPlayers();
+      pollInterval = window.setInterval(fetchPlayers, POLL_INTERVAL);
+    });
+
+    return () => {
+      closeStream();
+      if (pollInterval) {
+        clearInterval(pollInterval);
+      }
+    };
   }, []);
 
-  // Simulate selected player's movement
+  // Follow the selected player's game in real time
   useEffect(() => {
     if (!selectedPlayer) {
-      if (simulationRef.current) {
-        clearInterval(simulationRef.current);
-        simulationRef.current = null;
-      }
       return;
     }
 
-    simulationRef.current = window.setInterval(() => {
-      setSelectedPlayer(prev => {
-        if (!prev) return null;
-        return api.players.simulatePlayerMove(prev, GRID_SIZE);
-      });
-    }, SIMULATION_SPEED);
-
-    return () => {
-      if (simulationRef.current) {
-        clearInterval(simulationRef.current);
+    return api.players.streamPlayer(selectedPlayer.id, (msg) => {
+      if (msg.type === 'snapshot' && 'player' in msg) {
+        setSelectedPlayer(msg.player);
+      } else if (msg.type === 'update') {
+        setSelectedPlayer(prev => (prev ? applyPlayerChanges(prev, msg.id, msg.changes) : prev));
+      } else if (msg.type === 'removed') {
+        setSelectedPlayer(prev => (prev ? { ...prev, isPlaying: false } : prev));
       }
-    };
+    });
   }, [selectedPlayer?.id]);
 
   const handleSelectPlayer = (player: ActivePlayer) => {
@@ -105,11 +123,11 @@ export default function WatchMode() {
               food={selectedPlayer.food}
               gridSize={GRID_SIZE}
               mode={selectedPlayer.mode}
-              isGameOver={false}
+              isGameOver={!selectedPlayer.isPlaying}
             />
             
             <p className="text-center text-muted-foreground text-sm mt-4">
-              Live simulation • Updates every 200ms
+              {selectedPlayer.isPlaying ? 'Live • Streaming from the server' : 'Game over'}
             </p>
           </CardContent>
         </Card>
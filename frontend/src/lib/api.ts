@@ -5,6 +5,8 @@
  * `http://localhost:4000` (matches `openapi.yaml` server for local development).
  */
 
+import type { Replay } from './game-logic';
+
 export interface User {
   id: string;
   username: string;
@@ -79,6 +81,101 @@ function mapUser(u: any): User {
   };
 }
 
+function mapActivePlayer(p: any): ActivePlayer {
+  return {
+    id: p.id,
+    username: p.username,
+    currentScore: p.current_score ?? p.currentScore,
+    mode: p.mode,
+    snake: p.snake.map((s: any) => ({ x: s.x, y: s.y })),
+    food: { x: p.food.x, y: p.food.y },
+    direction: p.direction,
+    isPlaying: p.is_playing ?? p.isPlaying,
+  };
+}
+
+/**
+ * Messages pushed by the watch-mode WebSocket streams. `update` carries only
+ * the fields that changed (snake_case, as sent by the backend).
+ */
+export type PlayerStreamMessage =
+  | { type: 'snapshot'; players: ActivePlayer[] }
+  | { type: 'snapshot'; player: ActivePlayer }
+  | { type: 'update'; id: string; changes: Record<string, any> }
+  | { type: 'removed'; id: string };
+
+/**
+ * Apply a `snake_delta` (new head cells, newest first, plus tail cells
+ * trimmed). A delta whose newest head is already ours was covered by the
+ * snapshot and is skipped.
+ */
+function applySnakeDelta(snake: ActivePlayer['snake'], delta: { heads: ActivePlayer['snake']; trim: number }): ActivePlayer['snake'] {
+  const [head] = delta.heads;
+  if (head && snake.length > 0 && snake[0].x === head.x && snake[0].y === head.y) {
+    return snake;
+  }
+  return [...delta.heads, ...snake.slice(0, Math.max(0, snake.length - delta.trim))];
+}
+
+/** Apply an incremental `update` message to a player (or create it). */
+export function applyPlayerChanges(player: ActivePlayer | undefined, id: string, changes: Record<string, any>): ActivePlayer {
+  const { snake_delta: snakeDelta, ...rest } = changes;
+  if (snakeDelta) {
+    rest.snake = applySnakeDelta(player?.snake ?? [], snakeDelta);
+  }
+  const raw: any = {
+    id,
+    username: player?.username,
+    current_score: player?.currentScore,
+    mode: player?.mode,
+    snake: player?.snake ?? [],
+    food: player?.food ?? { x: 0, y: 0 },
+    direction: player?.direction,
+    is_playing: player?.isPlaying,
+    ...rest,
+  };
+  return mapActivePlayer(raw);
+}
+
+function streamUrl(path: string): string {
+  const base = API_BASE.startsWith('http')
+    ? API_BASE.replace(/^http/, 'ws')
+    : `${window.location.protocol === 'https:' ? 'wss' : 'ws'}://${window.location.host}${API_BASE}`;
+  return `${base}${path}`;
+}
+
+// Close code of a stream that fell behind; reopening it starts from a fresh snapshot
+const RESYNC_CLOSE_CODE = 4409;
+
+function openPlayerStream(path: string, onMessage: (msg: PlayerStreamMessage) => void, onClose?: () => void): () => void {
+  let socket: WebSocket;
+  const open = () => {
+    socket = new WebSocket(streamUrl(path));
+    socket.onmessage = (event) => {
+      const msg = JSON.parse(event.data);
+      if (msg.type === 'snapshot' && msg.players) {
+        onMessage({ type: 'snapshot', players: msg.players.map(mapActivePlayer) });
+      } else if (msg.type === 'snapshot' && msg.player) {
+        onMessage({ type: 'snapshot', player: mapActivePlayer(msg.player) });
+      } else {
+        onMessage(msg);
+      }
+    };
+    socket.onclose = (event) => {
+      if (event.code === RESYNC_CLOSE_CODE) {
+        open();
+      } else {
+        onClose?.();
+      }
+    };
+  };
+  open();
+  return () => {
+    socket.onclose = null;
+    socket.close();
+  };
+}
+
 function mapLeaderboardEntry(e: any): LeaderboardEntry {
   return {
     id: e.id,
@@ -155,11 +252,11 @@ export const api = {
       return (body as any[]).map(mapLeaderboardEntry);
     },
 
-    async submitScore(score: number, mode: 'passthrough' | 'walls'): Promise<{ success: boolean; rank?: number }> {
+    async submitScore(score: number, mode: 'passthrough' | 'walls', replay?: Replay): Promise<{ success: boolean; rank?: number }> {
       try {
         const body = await request<{ success: boolean; rank?: number }>('/leaderboard/score', {
           method: 'POST',
-          body: JSON.stringify({ score, mode }),
+          body: JSON.stringify({ score, mode, replay }),
         });
         return { success: body.success, rank: body.rank };
       } catch (err: any) {
@@ -171,73 +268,26 @@ export const api = {
   players: {
     async getActivePlayers(): Promise<ActivePlayer[]> {
       const body = await request<any>('/players/active', { method: 'GET' });
-      return (body as any[]).map((p) => ({
-        id: p.id,
-        username: p.username,
-        currentScore: p.current_score ?? p.currentScore,
-        mode: p.mode,
-        snake: p.snake.map((s: any) => ({ x: s.x, y: s.y })),
-        food: { x: p.food.x, y: p.food.y },
-        direction: p.direction,
-        isPlaying: p.is_playing ?? p.isPlaying,
-      }));
+      return (body as any[]).map(mapActivePlayer);
     },
 
     async getPlayerState(playerId: string): Promise<ActivePlayer | null> {
       try {
         const body = await request<any>(`/players/${playerId}`, { method: 'GET' });
-        return {
-          id: body.id,
-          username: body.username,
-          currentScore: body.current_score ?? body.currentScore,
-          mode: body.mode,
-          snake: body.snake.map((s: any) => ({ x: s.x, y: s.y })),
-          food: { x: body.food.x, y: body.food.y },
-          direction: body.direction,
-          isPlaying: body.is_playing ?? body.isPlaying,
-        };
+        return mapActivePlayer(body);
       } catch (_) {
         return null;
       }
     },
-    // Client-side simulation helper (keeps previous behavior)
-    simulatePlayerMove(player: ActivePlayer, gridSize: number): ActivePlayer {
-      const newPlayer = { ...player } as ActivePlayer;
-      const head = { ...player.snake[0] };
-
-      // Randomly change direction occasionally
-      if (Math.random() < 0.1) {
-        const directions: ('UP' | 'DOWN' | 'LEFT' | 'RIGHT')[] = ['UP', 'DOWN', 'LEFT', 'RIGHT'];
-        const opposite: Record<string, string> = { UP: 'DOWN', DOWN: 'UP', LEFT: 'RIGHT', RIGHT: 'LEFT' };
-        const validDirections = directions.filter(d => d !== (opposite as any)[player.direction]);
-        newPlayer.direction = validDirections[Math.floor(Math.random() * validDirections.length)];
-      }
-
-      // Move head
-      switch (newPlayer.direction) {
-        case 'UP': head.y -= 1; break;
-        case 'DOWN': head.y += 1; break;
-        case 'LEFT': head.x -= 1; break;
-        case 'RIGHT': head.x += 1; break;
-      }
 
-      // Wrap around
-      head.x = (head.x + gridSize) % gridSize;
-      head.y = (head.y + gridSize) % gridSize;
-
-      newPlayer.snake = [head, ...player.snake.slice(0, -1)];
-
-      // Check if ate food
-      if (head.x === player.food.x && head.y === player.food.y) {
-        newPlayer.snake = [head, ...player.snake];
-        newPlayer.food = {
-          x: Math.floor(Math.random() * gridSize),
-          y: Math.floor(Math.random() * gridSize),
-        };
-        newPlayer.currentScore += 10;
-      }
+    /** Live stream of all active players; returns a function that closes it. */
+    streamLobby(onMessage: (msg: PlayerStreamMessage) => void, onClose?: () => void): () => void {
+      return openPlayerStream('/players/stream', onMessage, onClose);
+    },
 
-      return newPlayer;
+    /** Live stream of one player's game; returns a function that closes it. */
+    streamPlayer(playerId: string, onMessage: (msg: PlayerStreamMessage) => void, onClose?: () => void): () => void {
+      return openPlayerStream(`/players/${playerId}/stream`, onMessage, onClose);
     },
   },
 };
@@ -11,6 +11,17 @@ export interface Position {
   y: number;
 }
 
+/** Direction changes as (moves made before the change, direction) pairs. */
+export type ReplayInput = [number, Direction];
+
+/** Everything the server needs to re-simulate a game and verify its score. */
+export interface Replay {
+  seed: number;
+  ticks: number;
+  grid_size: number;
+  inputs: ReplayInput[];
+}
+
 export interface GameState {
   snake: Position[];
   food: Position;
@@ -22,6 +33,10 @@ export interface GameState {
   mode: GameMode;
   gridSize: number;
   speed: number;
+  seed: number;
+  rngState: number;
+  tick: number;
+  inputs: ReplayInput[];
 }
 
 export const INITIAL_SNAKE_LENGTH = 3;
@@ -29,7 +44,40 @@ export const INITIAL_SPEED = 150;
 export const SPEED_INCREMENT = 5;
 export const MIN_SPEED = 50;
 
-export function createInitialState(gridSize: number = 20, mode: GameMode = 'passthrough'): GameState {
+/**
+ * One step of the mulberry32 PRNG: returns a float in [0, 1) and the next
+ * state. Food placement draws from it so that the server can replay a game
+ * from its seed (`app/engine/replay.py` has the same generator).
+ */
+export function mulberry32(state: number): [number, number] {
+  const a = (state + 0x6D2B79F5) | 0;
+  let t = Math.imul(a ^ (a >>> 15), a | 1);
+  t = (t + Math.imul(t ^ (t >>> 7), t | 61)) ^ t;
+  return [((t ^ (t >>> 14)) >>> 0) / 4294967296, a];
+}
+
+/** A `random()` drawing from mulberry32, plus its state after the draws. */
+function seededRandom(state: number): { random: () => number; state: () => number } {
+  let current = state;
+  return {
+    random: () => {
+      const [value, next] = mulberry32(current);
+      current = next;
+      return value;
+    },
+    state: () => current,
+  };
+}
+
+export function randomSeed(): number {
+  return Math.floor(Math.random() * 4294967296);
+}
+
+export function createInitialState(
+  gridSize: number = 20,
+  mode: GameMode = 'passthrough',
+  seed: number = randomSeed(),
+): GameState {
   const centerX = Math.floor(gridSize / 2);
   const centerY = Math.floor(gridSize / 2);
   
@@ -38,9 +86,12 @@ export function createInitialState(gridSize: number = 20, mode: GameMode = 'pass
     snake.push({ x: centerX - i, y: centerY });
   }
   
+  const rng = seededRandom(seed);
+  const food = generateFood(snake, gridSize, rng.random);
+
   return {
     snake,
-    food: generateFood(snake, gridSize),
+    food,
     direction: 'RIGHT',
     nextDirection: 'RIGHT',
     score: 0,
@@ -49,10 +100,18 @@ export function createInitialState(gridSize: number = 20, mode: GameMode = 'pass
     mode,
     gridSize,
     speed: INITIAL_SPEED,
+    seed,
+    rngState: rng.state(),
+    tick: 0,
+    inputs: [],
   };
 }
 
-export function generateFood(snake: Position[], gridSize: number): Position {
+export function generateFood(
+  snake: Position[],
+  gridSize: number,
+  random: () => number = Math.random,
+): Position {
   const snakeSet = new Set(snake.map(p => `${p.x},${p.y}`));
   
   let food: Position;
@@ -61,8 +120,8 @@ export function generateFood(snake: Position[], gridSize: number): Position {
   
   do {
     food = {
-      x: Math.floor(Math.random() * gridSize),
-      y: Math.floor(Math.random() * gridSize),
+      x: Math.floor(random() * gridSize),
+      y: Math.floor(random() * gridSize),
     };
     attempts++;
   } while (snakeSet.has(`${food.x},${food.y}`) && attempts < maxAttempts);
@@ -134,12 +193,15 @@ export function moveSnake(state: GameState): GameState {
   let newScore = state.score;
   let newFood = food;
   let newSpeed = state.speed;
+  let newRngState = state.rngState;
   
   if (ateFood) {
     // Grow snake
     newSnake = [newHead, ...snake];
     newScore += 10;
-    newFood = generateFood(newSnake, gridSize);
+    const rng = seededRandom(state.rngState);
+    newFood = generateFood(newSnake, gridSize, rng.random);
+    newRngState = rng.state();
     
     // Increase speed
     newSpeed = Math.max(MIN_SPEED, state.speed - SPEED_INCREMENT);
@@ -155,6 +217,8 @@ export function moveSnake(state: GameState): GameState {
     score: newScore,
     direction: nextDirection,
     speed: newSpeed,
+    rngState: newRngState,
+    tick: state.tick + 1,
   };
 }
 
@@ -171,7 +235,21 @@ export function setDirection(state: GameState, newDirection: Direction): GameSta
     return state;
   }
   
-  return { ...state, nextDirection: newDirection };
+  return {
+    ...state,
+    nextDirection: newDirection,
+    inputs: [...state.inputs, [state.tick, newDirection]],
+  };
+}
+
+/** The replay log of a game, to submit alongside its score. */
+export function getReplay(state: GameState): Replay {
+  return {
+    seed: state.seed,
+    ticks: state.tick,
+    grid_size: state.gridSize,
+    inputs: state.inputs,
+  };
 }
 
 export function togglePause(state: GameState): GameState {
@@ -11,6 +11,8 @@ import {
   resetGame,
   getDirectionFromKey,
   calculateScore,
+  getReplay,
+  mulberry32,
   INITIAL_SNAKE_LENGTH,
   type GameState,
   type Position,
@@ -230,6 +232,29 @@ describe('setDirection', () => {
   });
 });
 
+describe('replay log', () => {
+  it('mulberry32 matches the server generator', () => {
+    // Same reference values as backend/tests/test_replay.py
+    const [first, next] = mulberry32(12345);
+    expect(first).toBe(0.9797282677609473);
+    expect(mulberry32(next)[0]).toBe(0.3067522644996643);
+  });
+
+  it('places food deterministically from the seed', () => {
+    expect(createInitialState(20, 'walls', 42).food).toEqual(createInitialState(20, 'walls', 42).food);
+  });
+
+  it('records accepted direction changes with the move count', () => {
+    let state = createInitialState(20, 'passthrough', 1);
+    state = moveSnake(state);
+    state = setDirection(state, 'LEFT'); // reversal, not recorded
+    state = setDirection(state, 'UP');
+    state = moveSnake(state);
+
+    expect(getReplay(state)).toEqual({ seed: 1, ticks: 2, grid_size: 20, inputs: [[1, 'UP']] });
+  });
+});
+
 describe('togglePause', () => {
   it('should toggle pause state', () => {
     const state = createInitialState();